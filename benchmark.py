@@ -0,0 +1,204 @@
+# benchmark.py
+"""Benchmark suite for the physics, node dispatch, bus and server hot paths.
+
+Run `python benchmark.py` to measure every benchmark and write the results
+as JSON (default bench_results.json) so runs on different commits can be
+compared. Each benchmark is repeated and the best repeat is reported, which
+keeps the numbers stable on a busy machine.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+
+RELAY_WINDOW = 128  # Messages each relay sender may have in flight, below the server's lane capacity
+
+def best_rate(func, operations, repeats):
+    """Runs func repeats times and returns the best operations per second."""
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return operations / best
+
+def percentile(sorted_values, fraction):
+    """Returns the value at fraction (0-1) of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+def bench_train_update(ticks, repeats):
+    """Train.update ticks per second while cruising between stations."""
+    from train import Train
+    from sim_clock import SimulatedClock
+
+    clock = SimulatedClock()
+    train = Train(clock)
+    train.target_speed = 22.22
+
+    def run():
+        for _ in range(ticks):
+            train.update(1/60)
+            clock.advance(1/60)
+
+    return {"ticks_per_sec": best_rate(run, ticks, repeats)}
+
+def bench_control_unit_receive(messages, repeats):
+    """ControlUnitNode.receive_message parse and dispatch rate on a realistic message mix."""
+    from nodes import ControlUnitNode
+    from sim_clock import SimulatedClock
+
+    control_unit = ControlUnitNode("Control", SimulatedClock())
+    mix = [f"Speed:{i % 23}.{i % 10}" for i in range(40)] + [
+        "Door0:Open", "Door1:Closed", "Passengers:120", "Station:Yes", "Station:No"
+    ]
+    batch = (mix * (messages // len(mix) + 1))[:messages]
+
+    def run():
+        for message in batch:
+            control_unit.receive_message(message)
+
+    return {"messages_per_sec": best_rate(run, messages, repeats)}
+
+def bench_process_network_messages(node_counts, messages, repeats):
+    """process_network_messages throughput for registries of increasing size."""
+    import queue
+    import simulation
+    from nodes import ActuatorNode
+    from registry import NodeRegistry
+    from messages import MessageDispatcher
+
+    class QueueBus:
+        def __init__(self):
+            self.received_messages = queue.Queue()
+
+    results = {}
+    for node_count in node_counts:
+        nodes = NodeRegistry(ActuatorNode(f"Node{i}", MessageDispatcher()) for i in range(node_count))
+        frames = [{"sender": "Speed", "target": "SimulationBus", "real_target": f"Node{i % node_count}",
+                   "message": f"Set Target Speed:{i % 30}"} for i in range(messages)]
+        bus = QueueBus()
+
+        def run():
+            for frame in frames:
+                bus.received_messages.put(frame)
+            simulation.process_network_messages(bus, nodes)
+
+        results[str(node_count)] = {"messages_per_sec": best_rate(run, messages, repeats)}
+    return results
+
+async def relay_round(port, clients, messages_per_client):
+    """Sends messages between clients through a local server and measures delivery."""
+    import websockets
+
+    sockets = []
+    for i in range(clients):
+        websocket = await websockets.connect(f"ws://localhost:{port}")
+        await websocket.send(json.dumps({"register": f"Bench{i}"}))
+        sockets.append(websocket)
+    await asyncio.sleep(0.05)  # Let the server finish registering everyone
+
+    latencies = []
+    expected = clients * messages_per_client
+    # Sender i may have at most RELAY_WINDOW messages to Bench{i+1} in flight.
+    # The server's outbox lanes are bounded, so an unpaced burst would be
+    # dropped rather than timed.
+    in_flight = [asyncio.Semaphore(RELAY_WINDOW) for _ in range(clients)]
+
+    async def receive(i, websocket):
+        window = in_flight[(i - 1) % clients]
+        for _ in range(messages_per_client):
+            data = json.loads(await websocket.recv())
+            latencies.append(time.perf_counter() - data["sent"])
+            window.release()
+
+    async def send(i, websocket):
+        # Commands, not readings: the server coalesces queued readings from one
+        # sender, and every message sent here must arrive to be timed
+        target = f"Bench{(i + 1) % clients}"
+        for n in range(messages_per_client):
+            await in_flight[i].acquire()
+            await websocket.send(json.dumps({"sender": f"Bench{i}", "target": target,
+                                             "message": f"Set Target Speed:{n % 30}.0",
+                                             "sent": time.perf_counter()}))
+
+    started = time.perf_counter()
+    receivers = [asyncio.create_task(receive(i, ws)) for i, ws in enumerate(sockets)]
+    await asyncio.gather(*(send(i, ws) for i, ws in enumerate(sockets)))
+    await asyncio.wait_for(asyncio.gather(*receivers), timeout=60)
+    elapsed = time.perf_counter() - started
+
+    for websocket in sockets:
+        await websocket.close()
+    latencies.sort()
+    return {
+        "clients": clients,
+        "messages": expected,
+        "messages_per_sec": expected / elapsed,
+        "latency_p50_ms": percentile(latencies, 0.50) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000
+    }
+
+def bench_server_relay(client_counts, messages_per_client, port):
+    """mvb_server relay throughput and latency with loss and delay turned off."""
+    import websockets
+    import mvb_server
+
+    mvb_server.PACKET_LOSS_PROB = 0.0
+    mvb_server.MIN_DELAY = mvb_server.MAX_DELAY = 0.0
+
+    async def run():
+        results = {}
+        async with websockets.serve(mvb_server.handler, "localhost", port):
+            for clients in client_counts:
+                results[str(clients)] = await relay_round(port, clients, messages_per_client)
+        return results
+
+    return asyncio.run(run())
+
+def git_commit():
+    """Returns the current commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(quick=False, port=8799):
+    """Runs every benchmark and returns the results dict."""
+    scale = 10 if quick else 1
+    repeats = 3 if quick else 5
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        benchmarks = {
+            "train_update": bench_train_update(100_000 // scale, repeats),
+            "control_unit_receive": bench_control_unit_receive(100_000 // scale, repeats),
+            "process_network_messages": bench_process_network_messages([16, 256, 4096], 50_000 // scale, repeats),
+            "server_relay": bench_server_relay([2, 16, 64], 2_000 // scale, port),
+        }
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": benchmarks
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TCMS benchmark suite")
+    parser.add_argument("--output", default="bench_results.json", help="file to write JSON results to")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads for a fast smoke run")
+    parser.add_argument("--port", type=int, default=8799, help="port for the local benchmark server")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.quick, args.port)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results["benchmarks"], indent=2))
@@ -0,0 +1,236 @@
+# bus_model.py
+"""The parts of the MVB bus model that need no network.
+
+Holds the packet loss and delay parameters shared by every transport, the
+in-process LoopbackMVB_Bus that headless runs use, and the cyclic
+BusMaster. Nothing here imports asyncio, websockets or pygame, so a
+headless run or a sweep worker loads only this module; network_bus builds
+the websocket and shared-memory transports on top of it.
+"""
+
+import collections
+import heapq
+import itertools
+import json
+import logging
+import math
+import queue
+import random
+from log_pipeline import get_logger, parse_level
+from mvb_codec import encode_frame, process_data_label
+from latency import new_stamps, SEND, SERVER_RECEIVE, SERVER_DELIVER, RECEIVE
+
+# Client hop loss and delay
+PACKET_LOSS_PROB = 0.05
+MIN_DELAY = 0.1
+MAX_DELAY = 0.5
+
+# Server hop parameters, mirrored from mvb_server for in-process runs
+SERVER_PACKET_LOSS_PROB = 0.1
+SERVER_MIN_DELAY = 0.1
+SERVER_MAX_DELAY = 0.5
+
+# Bus-master timing, following MVB's basic period scheme
+BASIC_PERIOD = 0.016  # Seconds per basic cycle
+MVB_BIT_RATE = 1_500_000  # Bits per second
+
+def process_data_frame(target, ports):
+    """Builds the frame for one bus-master cycle."""
+    return {
+        "sender": "BusMaster",
+        "target": "SimulationBus",
+        "real_target": target,
+        "message": process_data_label(len(ports)),
+        "ports": ports
+    }
+
+def frame_size(data):
+    """Returns a frame's size on the wire: its binary telegram, or its JSON text if it has none."""
+    frame = encode_frame(data)
+    return len(frame) if frame is not None else len(json.dumps(data))
+
+class LoopbackMVB_Bus:
+    """In-process bus for headless runs driven by a simulated clock.
+
+    Applies the client and server packet loss and delay model of the
+    websocket path, but queues frames by delivery time instead of sleeping,
+    so a run is bounded only by CPU.
+    """
+
+    def __init__(self, node_name, clock, debug_level=None, rng=None, instrument=False):
+        self.node_name = node_name
+        self.clock = clock
+        self.rng = rng if rng is not None else random.Random()
+        self.instrument = instrument  # Stamp frames with simulated hop times
+        self.transmissions = []  # Kept for interface parity; never animated
+        self.received_messages = queue.Queue()
+        self.pending = []  # Heap of (deliver_time, seq, data)
+        self._seq = itertools.count()
+        self.sent = collections.Counter()  # Frames put on the bus, by sender
+        self.lost = collections.Counter()  # Frames dropped by the loss model, by sender
+
+        self.logger = get_logger(f"loopback.{node_name}")
+        self.set_debug_level(debug_level)
+
+    def set_debug_level(self, level):
+        """Set the debug level for this instance (None to follow the log pipeline)."""
+        self.logger.setLevel(logging.NOTSET if level is None else parse_level(level))
+
+    @property
+    def debug_enabled(self):
+        """True if debug records are kept; guards building debug arguments on hot paths."""
+        return self.logger.isEnabledFor(logging.DEBUG)
+
+    def now_ns(self):
+        """Returns the simulated time used for latency stamps, in nanoseconds."""
+        return int(self.clock.now() * 1e9)
+
+    def send_message(self, sender, target, message, real_target=None, emitted_at=None):
+        """Queues a message for delivery after the simulated network delay."""
+        effective_target = real_target if real_target is not None else target
+        data = {
+            "sender": sender,
+            "target": "SimulationBus",
+            "real_target": effective_target,
+            "message": message
+        }
+
+        if sender not in ["Speed", "Station", "Pass"]:
+            self.received_messages.put(data.copy())
+
+        self._schedule(data)
+
+    def send_process_data(self, frame):
+        """Queues one bus-master cycle, built by process_data_frame, as a single frame."""
+        self._schedule(frame)
+
+    def _schedule(self, data):
+        self.sent[data["sender"]] += 1
+        if self.rng.random() < PACKET_LOSS_PROB or self.rng.random() < SERVER_PACKET_LOSS_PROB:
+            self.lost[data["sender"]] += 1
+            self.logger.debug("Packet lost: %s", data)
+            return
+
+        client_delay = self.rng.uniform(MIN_DELAY, MAX_DELAY)
+        server_delay = self.rng.uniform(SERVER_MIN_DELAY, SERVER_MAX_DELAY)
+        if self.instrument:
+            now = self.now_ns()
+            stamps = data["stamps"] = new_stamps(now)
+            stamps[SEND] = now
+            stamps[SERVER_RECEIVE] = now + int(client_delay * 1e9)
+            stamps[SERVER_DELIVER] = stamps[SERVER_RECEIVE] + int(server_delay * 1e9)
+        heapq.heappush(self.pending, (self.clock.now() + client_delay + server_delay, next(self._seq), data))
+
+    def deliver_due(self):
+        """Moves every frame whose delivery time has passed to received_messages."""
+        now = self.clock.now()
+        while self.pending and self.pending[0][0] <= now:
+            _, _, data = heapq.heappop(self.pending)
+            if "stamps" in data:
+                data["stamps"][RECEIVE] = self.now_ns()
+            self.received_messages.put(data)
+
+    def update_transmissions(self, delta_time):
+        """No-op; headless runs have nothing to animate."""
+
+
+class ProcessDataPort:
+    """A process-data source polled by the bus master every period."""
+
+    def __init__(self, name, read_state_func, period, cycles):
+        self.name = name
+        self.read_state_func = read_state_func
+        self.period = period
+        self.cycles = cycles  # Basic cycles between polls
+
+class BusMaster:
+    """Cyclic process-data scheduler modelled on an MVB bus master.
+
+    Ports are polled every 2^k basic periods. Each basic cycle, every due
+    port is read and all readings go out together in one frame, so bus load
+    depends on the port table and not on how often values change.
+    send_process_data_func receives each cycle's frame.
+    """
+
+    def __init__(self, send_process_data_func, target="Control", basic_period=BASIC_PERIOD, bit_rate=MVB_BIT_RATE):
+        self.send_process_data_func = send_process_data_func
+        self.target = target
+        self.basic_period = basic_period
+        self.bit_rate = bit_rate
+        self.ports = []
+        self.start_time = None
+        self.cycle = -1
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.peak_frame_bytes = 0
+
+    def register_port(self, name, read_state_func, period):
+        """Registers a port polled every period seconds (a power-of-two multiple of the basic period)."""
+        cycles = round(period / self.basic_period)
+        if cycles < 1 or cycles & (cycles - 1) or abs(cycles * self.basic_period - period) > 1e-9:
+            raise ValueError(f"Period {period} s is not a power-of-two multiple of {self.basic_period} s")
+        port = ProcessDataPort(name, read_state_func, period, cycles)
+        self.ports.append(port)
+        return port
+
+    def poll(self, current_time):
+        """Runs the current basic cycle if it has not run yet.
+
+        Cycles missed between polls are folded into one frame rather than
+        replayed, so a slow caller never causes a burst.
+        """
+        if self.start_time is None:
+            self.start_time = current_time
+        # The tolerance keeps a poll right on a cycle boundary from rounding down into the previous cycle
+        cycle = int((current_time - self.start_time) / self.basic_period + 1e-9)
+        if cycle <= self.cycle:
+            return None
+        last_cycle, self.cycle = self.cycle, cycle
+        due = [port for port in self.ports if last_cycle < 0 or cycle // port.cycles > last_cycle // port.cycles]
+        if not due:
+            return None
+        ports = [[port.name, port.read_state_func()] for port in due]
+        frame = process_data_frame(self.target, ports)
+        # Sized before sending, since the bus may stamp the frame on another thread
+        frame_bytes = frame_size(frame)
+        self.send_process_data_func(frame)
+
+        self.frames_sent += 1
+        self.bytes_sent += frame_bytes
+        self.peak_frame_bytes = max(self.peak_frame_bytes, frame_bytes)
+        return ports
+
+    def next_poll_time(self):
+        """Returns when the next basic cycle with a port due starts (-inf before the first poll)."""
+        if self.start_time is None or self.cycle < 0:
+            return -math.inf
+        cycle = min((self.cycle // port.cycles + 1) * port.cycles for port in self.ports)
+        return self.start_time + cycle * self.basic_period
+
+    def budget(self):
+        """Returns the worst-case bus utilisation of the port table per basic cycle.
+
+        Every port is due together on the cycle that is a multiple of the
+        longest period, so that cycle's frame bounds the load.
+        """
+        ports = [[port.name, port.read_state_func()] for port in self.ports]
+        frame_bytes = frame_size(process_data_frame(self.target, ports))
+        return frame_bytes * 8 / (self.bit_rate * self.basic_period)
+
+    def utilisation(self):
+        """Returns measured bus utilisation as mean and peak fractions of each basic cycle."""
+        cycles = self.cycle + 1
+        capacity = self.bit_rate * self.basic_period
+        return {
+            "cycles": cycles,
+            "frames": self.frames_sent,
+            "mean": self.bytes_sent * 8 / (capacity * cycles) if cycles > 0 else 0.0,
+            "peak": self.peak_frame_bytes * 8 / capacity
+        }
+
+    def report(self):
+        """Returns a one-line summary of measured utilisation against the budget."""
+        measured = self.utilisation()
+        return (f"Bus master: {measured['frames']} frames in {measured['cycles']} cycles of "
+                f"{self.basic_period * 1000:g} ms, utilisation mean {measured['mean']:.2%} "
+                f"peak {measured['peak']:.2%}, budget {self.budget():.2%}")
@@ -0,0 +1,153 @@
+# event_engine.py
+"""Next-event time computation for the event-driven headless engine.
+
+Between events the train moves with constant acceleration, no sensor has a
+reading to send, no frame is due and no timer expires, so the engine can
+move the whole simulation across that span in one step. next_event_delay
+computes the span analytically from the train's kinematics, the track,
+the sensor intervals (or the bus master's cycle), the bus queue and the
+train's timers. The engine
+then runs ordinary fixed-step ticks around each event, so every state
+change still goes through the same code as the fixed-step loop.
+
+Speed and position thresholds are found by solving the constant-
+acceleration equations; the engine falls back to plain ticks only when
+the train cannot accelerate (a gradient steeper than traction allows).
+"""
+
+import math
+from constants import DECELERATION, EMERGENCY_DECEL, MAX_PASSENGERS
+from train import GRAVITY
+
+STATION_RADIUS = 50  # Distance within which a stopped train detects a station
+ARRIVAL_DISTANCE = 10  # handle_station_approach snaps a slow train to a stop inside this distance
+ARRIVAL_SPEED = 5
+APPROACH_MIN_SPEED = 2  # handle_station_approach only brakes above this speed
+CRUISE_TOLERANCE = 0.1  # The fixed-step loop dithers just under the target speed while cruising
+
+def train_acceleration(train):
+    """Returns the train's constant acceleration until its next event, or None if it has none."""
+    if train.emergency_stop:
+        return -EMERGENCY_DECEL if train.speed > 0 else 0.0
+    if train.brakes_applied:
+        return -DECELERATION if train.speed > 0 else 0.0
+    if train.at_station:
+        return 0.0
+    speed_limit = train.track.speed_limit_at(train.distance_traveled)
+    if train.speed > speed_limit:
+        return -DECELERATION
+    gravity = GRAVITY * train.track.gradient_at(train.distance_traveled)
+    target_speed = min(train.target_speed, speed_limit)
+    if target_speed > 0 and abs(train.speed - target_speed) < CRUISE_TOLERANCE:
+        return 0.0
+    if train.speed < target_speed:
+        acceleration = 6.0 - gravity
+        return acceleration if acceleration > 0 else None
+    acceleration = -0.01 - gravity
+    if train.speed == 0 and acceleration <= 0:
+        return 0.0  # Standing still on a level or uphill section
+    return acceleration
+
+def time_to_travel(distance, speed, acceleration):
+    """Returns the time to cover distance from speed at constant acceleration (inf if never)."""
+    if distance <= 0:
+        return 0.0
+    discriminant = speed * speed + 2 * acceleration * distance
+    if discriminant < 0:
+        return math.inf
+    root = speed + math.sqrt(discriminant)
+    return 2 * distance / root if root > 0 else math.inf
+
+def time_to_envelope(distance, speed, acceleration, buffer):
+    """Returns when the stopping distance plus buffer first reaches the next station.
+
+    Solves d - x(t) = v(t)^2 / (2 * DECELERATION) + buffer for the smallest
+    t >= 0 under constant acceleration.
+    """
+    c0 = distance - buffer - speed * speed / (2 * DECELERATION)
+    if c0 <= 0:
+        return 0.0
+    c1 = speed * (1 + acceleration / DECELERATION)
+    c2 = acceleration / 2 * (1 + acceleration / DECELERATION)
+    if c2 == 0:
+        return c0 / c1 if c1 > 0 else math.inf
+    discriminant = c1 * c1 + 4 * c2 * c0
+    if discriminant < 0:
+        return math.inf
+    root = c1 + math.sqrt(discriminant)
+    return 2 * c0 / root if root > 0 else math.inf
+
+def next_event_delay(train, control_unit, sensors, network_bus, now, next_press_time=math.inf,
+                     approach_buffer=20, bus_master=None):
+    """Returns the time from now until something other than steady motion can happen.
+
+    With a bus_master the sensors are polled by it rather than sending on
+    their own, so its next due cycle replaces the sensor intervals.
+    """
+    if not network_bus.received_messages.empty():
+        return 0.0
+    acceleration = train_acceleration(train)
+    if acceleration is None:
+        return 0.0
+
+    delays = [next_press_time - now]
+    if network_bus.pending:
+        delays.append(network_bus.pending[0][0] - now)
+
+    if bus_master is not None:
+        # Every due port is read and sent whether or not its value changed
+        delays.append(bus_master.next_poll_time() - now)
+    else:
+        # A sensor sends at its next check if its reading differs from the last one sent
+        speed_sensor = sensors[0]
+        for sensor in sensors:
+            if sensor.read_state_func() != sensor.last_value or (sensor is speed_sensor and acceleration):
+                delays.append(sensor.last_send_time + sensor.interval - now)
+
+    # Train timers
+    if train.leaving_station:
+        delays.append(train.leaving_station_time + train.LEAVING_COOLDOWN - now)
+    if train.station_stop_time is not None and not train.at_station and not train.leaving_station:
+        delays.append(train.station_stop_time + train.DWELL_TIME - now)
+    if train.at_station and train.passengers < MAX_PASSENGERS:
+        delays.append(0.0)  # Boarding changes the passenger count every tick
+
+    speed = train.speed
+    if speed == 0 and acceleration == 0:
+        if (not train.leaving_station and train.station_stop_time is None
+                and train.track.nearest_station_distance(train.distance_traveled) < STATION_RADIUS):
+            delays.append(0.0)  # Stopped next to a station; the dwell timer starts on the next tick
+        return max(0.0, min(delays))
+
+    # Speed changes: reaching the target or the limit, stopping, crossing the approach thresholds
+    if acceleration > 0:
+        target_speed = min(train.target_speed, train.track.speed_limit_at(train.distance_traveled))
+        delays.append((target_speed - speed) / acceleration)
+        if speed <= APPROACH_MIN_SPEED:
+            delays.append((APPROACH_MIN_SPEED - speed) / acceleration)
+    elif acceleration < 0:
+        delays.append(speed / -acceleration)
+        if speed > train.track.speed_limit_at(train.distance_traveled):
+            delays.append((speed - train.track.speed_limit_at(train.distance_traveled)) / -acceleration)
+        if speed >= ARRIVAL_SPEED:
+            delays.append((speed - ARRIVAL_SPEED) / -acceleration)
+
+    # Position events: section boundaries, the braking envelope, arriving slowly
+    section = train.track.distance_to_next_section(train.distance_traveled)
+    if section is not None:
+        delays.append(time_to_travel(section, speed, acceleration))
+    next_stop = train.track.distance_to_next_station(train.distance_traveled)
+    if next_stop is not None and not train.leaving_station and not train.at_station and not train.emergency_stop:
+        if speed > APPROACH_MIN_SPEED and not control_unit.approaching_station:
+            delays.append(time_to_envelope(next_stop, speed, acceleration, approach_buffer))
+        if speed < ARRIVAL_SPEED:
+            delays.append(time_to_travel(next_stop - ARRIVAL_DISTANCE, speed, acceleration))
+    return max(0.0, min(delays))
+
+def advance_train(train, acceleration, span, ticks):
+    """Moves the train across a quiet span of ticks fixed steps lasting span seconds."""
+    speed = train.speed
+    train.distance_traveled += speed * span + acceleration * span * span / 2
+    train.speed = max(0.0, speed + acceleration * span)
+    if train.at_station:
+        train.passengers = min(MAX_PASSENGERS, train.passengers + ticks)
@@ -0,0 +1,156 @@
+# fleet.py
+"""Vectorized fleet engine stepping many trains at once with NumPy."""
+
+import numpy as np
+from constants import ACCELERATION, DECELERATION, EMERGENCY_DECEL
+from sim_clock import WallClock
+from track import Track, default_track
+from train import GRAVITY
+
+class TrackArrays:
+    """A Track's stations and sections as arrays, looked up with np.searchsorted.
+
+    Each lookup takes an array of distances travelled and answers for all of
+    them at once, the same way the matching Track method answers for one.
+    """
+
+    def __init__(self, track):
+        self.length = track.length
+        self.loop = track.loop
+        positions = track.station_positions
+        # Stations padded with a neighbour beyond each end: the next lap's on a
+        # loop, none (infinitely far) on an open line
+        if track.loop:
+            before, after = positions[-1] - track.length, positions[0] + track.length
+        else:
+            before, after = -np.inf, np.inf
+        self.padded_stations = np.array([before, *positions, after], dtype=float)
+        # Evenly spaced stations on a loop (the default track) need no lookup at all
+        spacing = track.length / len(positions)
+        evenly_spaced = track.loop and all(position == positions[0] + i * spacing
+                                           for i, position in enumerate(positions))
+        self.station_spacing = spacing if evenly_spaced else None
+        self.first_station = positions[0]
+        # Gradient and speed-limit sections merged into one table, so a single
+        # lookup finds both; the leading entry covers the line before any section
+        starts = sorted(set(track.gradient_starts) | set(track.limit_starts))
+        self.has_sections = bool(starts)
+        self.section_starts = np.array([-np.inf, *starts])
+        self.section_gradients = np.array([0.0] + [Track._section_value(track.gradient_starts, track.gradients,
+                                                                          start, 0.0) for start in starts])
+        self.section_limits = np.array([np.inf] + [Track._section_value(track.limit_starts, track.limits,
+                                                                         start, np.inf) for start in starts])
+
+    def position(self, distance):
+        return distance % self.length if self.loop else np.minimum(distance, self.length)
+
+    def nearest_station_distance(self, distance):
+        """Track.nearest_station_distance for an array of distances travelled."""
+        if self.station_spacing is not None:
+            offset = (distance - self.first_station) % self.station_spacing
+            return np.minimum(offset, self.station_spacing - offset)
+        position = self.position(distance)
+        stations = self.padded_stations
+        # The closest station is one of the two neighbours of the insertion point
+        index = np.searchsorted(stations, position)
+        ahead = stations[index] - position
+        behind = position - stations[index - 1]
+        return np.minimum(ahead, behind)
+
+    def sections_at(self, position):
+        """Returns the gradient and speed limit arrays under positions on the line."""
+        index = np.searchsorted(self.section_starts, position, side="right") - 1
+        return self.section_gradients[index], self.section_limits[index]
+
+class Fleet:
+    """Holds the state of many trains in arrays and steps them together.
+
+    Each train follows the same rules as Train.update on the same track,
+    gradients and speed limits included; per-train state that Train keeps
+    in attributes lives here in one array per attribute, and a
+    station_stop_time or leaving_station_time of NaN stands for None.
+    """
+
+    DWELL_TIME = 1  # Seconds to dwell at a station
+    LEAVING_COOLDOWN = 5.0  # Seconds before re-detecting a station
+    STATION_RADIUS = 50  # Distance within which a stopped train is at a station
+
+    def __init__(self, size, clock=None, seed=None, track=None):
+        self.size = size
+        self.clock = clock if clock is not None else WallClock()
+        self.rng = np.random.default_rng(seed)
+        self.track = track if track is not None else default_track()
+        self.line = TrackArrays(self.track)
+        self.speed = np.zeros(size)
+        self.target_speed = np.zeros(size)
+        self.brakes_applied = np.zeros(size, dtype=bool)
+        self.emergency_stop = np.zeros(size, dtype=bool)
+        self.distance_traveled = np.zeros(size)
+        self.at_station = np.zeros(size, dtype=bool)
+        self.station_stop_time = np.full(size, np.nan)
+        self.leaving_station = np.zeros(size, dtype=bool)
+        self.leaving_station_time = np.full(size, np.nan)
+
+    def update(self, delta_time):
+        """Advances every train by delta_time seconds."""
+        now = self.clock.now()
+        line = self.line
+        speed = self.speed
+        wind_effect = self.rng.uniform(-0.01, 0.01, self.size) * delta_time
+        # Sections are looked up only on tracks that have them; the default loop is flat and unlimited
+        if line.has_sections:
+            gradient, speed_limit = line.sections_at(line.position(self.distance_traveled))
+            gradient_effect = GRAVITY * gradient * delta_time
+            target_speed = np.minimum(self.target_speed, speed_limit)
+        else:
+            gradient_effect = speed_limit = None
+            target_speed = self.target_speed
+
+        # Every branch from the speed before the update, lowest precedence first
+        new_speed = speed + ACCELERATION * delta_time
+        new_speed += wind_effect
+        coasting = speed - 0.01 * delta_time
+        coasting += wind_effect
+        if gradient_effect is not None:
+            new_speed -= gradient_effect
+            coasting -= gradient_effect
+        # Like Train, an accelerating train is capped by its target but not floored at zero
+        np.minimum(new_speed, target_speed, out=new_speed)
+        np.maximum(coasting, 0.0, out=coasting)
+        new_speed = np.where(speed < target_speed, new_speed, coasting)
+        if speed_limit is not None:
+            over_limit = speed > speed_limit
+            new_speed = np.where(over_limit, np.maximum(speed_limit, speed - DECELERATION * delta_time), new_speed)
+        emergency = self.emergency_stop
+        holding = self.at_station & ~(emergency | self.brakes_applied)
+        new_speed[holding] = 0.0
+        braking = np.maximum(speed - DECELERATION * delta_time, 0.0)
+        new_speed = np.where(self.brakes_applied, braking, new_speed)
+        stopping = np.maximum(speed - EMERGENCY_DECEL * delta_time, 0.0)
+        self.speed = speed = np.where(emergency, stopping, new_speed)
+
+        self.target_speed[emergency | holding] = 0.0
+        self.emergency_stop = emergency & (speed != 0.0)
+
+        self.distance_traveled += speed * delta_time
+        nearest_distance = line.nearest_station_distance(self.distance_traveled)
+
+        cooled_down = self.leaving_station & (now - self.leaving_station_time >= self.LEAVING_COOLDOWN)
+        self.leaving_station &= ~cooled_down
+
+        departing = self.at_station & (speed > 0.1)
+        self.at_station &= ~departing
+        self.leaving_station |= departing
+        self.leaving_station_time[departing] = now
+        self.station_stop_time[departing] = np.nan
+
+        stopped_near = (nearest_distance < self.STATION_RADIUS) & (speed < 0.1) & ~self.leaving_station
+        first_stop = stopped_near & np.isnan(self.station_stop_time)
+        self.station_stop_time[first_stop] = now
+        arrived = stopped_near & (now - self.station_stop_time >= self.DWELL_TIME)
+        self.at_station |= arrived
+        self.target_speed[arrived] = 0.0
+
+        away = ~stopped_near & (nearest_distance > self.STATION_RADIUS) & ~self.leaving_station
+        self.at_station &= ~away
+        self.station_stop_time[away] = np.nan
@@ -0,0 +1,92 @@
+# frame_profiler.py
+"""Per-frame phase timing for the interactive loop.
+
+The frame code calls start() when a frame begins, mark(phase) as each
+phase ends and end() when the frame is done. Phase times, measured with
+perf_counter_ns, go into a rolling window of recent frames for the live
+overlay and into whole-run histograms for the export. A frame whose work
+takes longer than the frame budget counts as an overrun; time spent
+waiting for the next frame is not part of it.
+
+With profiling off there is no profiler at all, and the frame code pays
+one truth test per phase.
+"""
+
+import json
+from time import perf_counter_ns
+from latency import LatencyHistogram
+
+WINDOW_FRAMES = 240  # Frames in the rolling window, four seconds at 60 FPS
+FRAME_BUDGET = 1 / 60  # Seconds of work per frame before it counts as an overrun
+
+class FrameProfiler:
+    """Times the phases of each frame into a rolling window and whole-run histograms."""
+
+    def __init__(self, phases, window=WINDOW_FRAMES, budget=FRAME_BUDGET):
+        self.phases = tuple(phases)
+        self._index = {phase: i for i, phase in enumerate(self.phases)}
+        self.budget_ns = int(budget * 1e9)
+        # One row per frame: the time of each phase, then the whole frame
+        self.window = [[0] * (len(self.phases) + 1) for _ in range(window)]
+        self.histograms = [LatencyHistogram() for _ in range(len(self.phases) + 1)]
+        self.frames = 0
+        self.overruns = 0
+        self._row = [0] * (len(self.phases) + 1)
+        self._frame_start = self._last = 0
+
+    def start(self):
+        """Begins a frame."""
+        self._frame_start = self._last = perf_counter_ns()
+
+    def mark(self, phase):
+        """Charges the time since the previous mark (or start) to phase."""
+        now = perf_counter_ns()
+        self._row[self._index[phase]] += now - self._last
+        self._last = now
+
+    def end(self):
+        """Ends the frame and records its phase times."""
+        row = self._row
+        row[-1] = total = perf_counter_ns() - self._frame_start
+        slot = self.frames % len(self.window)
+        self._row = self.window[slot]
+        self.window[slot] = row
+        for i, value in enumerate(row):
+            self.histograms[i].record(value)
+            self._row[i] = 0
+        self.frames += 1
+        if total > self.budget_ns:
+            self.overruns += 1
+
+    def recent(self):
+        """Returns [(phase, mean ms, p99 ms)] over the rolling window, the whole frame last."""
+        rows = self.window[:min(self.frames, len(self.window))]
+        if not rows:
+            return []
+        stats = []
+        for i, phase in enumerate(self.phases + ("frame",)):
+            values = sorted(row[i] for row in rows)
+            p99 = values[min(len(values) - 1, round(0.99 * len(values)))]
+            stats.append((phase, sum(values) / len(values) * 1e-6, p99 * 1e-6))
+        return stats
+
+    def recent_overruns(self):
+        """Returns how many frames in the rolling window went over budget."""
+        rows = self.window[:min(self.frames, len(self.window))]
+        return sum(1 for row in rows if row[-1] > self.budget_ns)
+
+    def summary(self):
+        """Returns whole-run stats: frame count, budget overruns, and mean/p99 per phase."""
+        return {
+            "frames": self.frames,
+            "budget_ms": self.budget_ns * 1e-6,
+            "overruns": self.overruns,
+            "overrun_fraction": self.overruns / self.frames if self.frames else 0.0,
+            "phases": {phase: histogram.summary()
+                       for phase, histogram in zip(self.phases + ("frame",), self.histograms)}
+        }
+
+    def dump(self, path):
+        """Writes the whole-run summary to path as JSON."""
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
@@ -0,0 +1,376 @@
+# interactive.py
+"""Pygame display for interactive runs of the simulation.
+
+The optional rendering layer over the headless core in simulation: only
+this module (with render and the nodes' draw methods) needs pygame, and
+simulation imports it only when a window is wanted.
+"""
+
+import asyncio
+import time
+import pygame
+from sim_clock import WallClock
+from render import LayeredRenderer
+from frame_profiler import FrameProfiler
+from rng_streams import component_rng
+from simulation import (DEFAULT_URI, start_network, stop_network, attach_network, send_network_message, create_train,
+                        create_nodes, create_bus_master, handle_station_approach, update_sensors, process_network_messages,
+                        dispatch_frame, handle_station_actions, BUTTON_NAMES)
+from constants import *
+
+# Track length shown on screen at once
+VIEW_LENGTH = WIDTH - 100
+
+# Define button layout
+BUTTONS = {name: pygame.Rect(50 + i * 130, 10, 120, 30) for i, name in enumerate(BUTTON_NAMES)}
+
+# Phases of a frame, in order, as timed by the frame profiler
+FRAME_PHASES = ("approach", "events", "sensors", "network", "physics", "draw", "flip")
+PROFILER_KEY = pygame.K_F3  # Shows or hides the profiler overlay
+OVERLAY_REFRESH = 30  # Frames between updates of the overlay's figures
+
+def initialize_pygame():
+    """Initialize pygame and setup the display."""
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("TCMS with Networked MVB Communication")
+    clock = pygame.time.Clock()
+    font = pygame.font.SysFont(None, 24)
+    return screen, clock, font
+
+def position_nodes(nodes):
+    """Position all nodes along the bus line."""
+    bus_start = 50
+    bus_end = WIDTH - 50
+    spacing = (bus_end - bus_start) / (len(nodes) - 1)
+    for i, node in enumerate(nodes):
+        node.x = bus_start + i * spacing
+
+def handle_events(control_unit, train, current_time, recorder=None, key_actions=None):
+    """Handle pygame events; key_actions maps keys to functions called when pressed."""
+    message_timer = 0
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            return False, message_timer
+        elif event.type == pygame.KEYDOWN and key_actions and event.key in key_actions:
+            key_actions[event.key]()
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            pos = event.pos
+            for name, rect in BUTTONS.items():
+                if rect.collidepoint(pos):
+                    if recorder:
+                        recorder.record_button(current_time, name)
+                    control_unit.on_button_click(name, train, send_network_message)
+                    message_timer = current_time + 2
+    return True, message_timer
+
+def view_start(train):
+    """Returns the track position at the left edge of the screen.
+
+    The view pages along the line a screen at a time, so the static layer
+    only needs redrawing when the train crosses into the next page.
+    """
+    return train.track.position(train.distance_traveled) // VIEW_LENGTH * VIEW_LENGTH
+
+def update_positions(train, network_bus, nodes):
+    """Update positions of train and message transmissions."""
+    train_x = 50 + (train.track.position(train.distance_traveled) - view_start(train))
+    network_bus.update_transmissions(min(1/60, 0.1))  # Cap delta_time at 1/60 for consistent animation
+    
+    # Update transmission positions
+    control_unit = nodes.get("Control")
+    for t in network_bus.transmissions:
+        sender_node = nodes.get(t["sender"])
+        target_node = nodes.get(t["target"])
+        if sender_node and target_node:
+            t["start_x"] = sender_node.x
+            t["end_x"] = target_node.x
+        elif sender_node:
+            # Fall back to the control unit if real target not found
+            if control_unit:
+                t["start_x"] = sender_node.x
+                t["end_x"] = control_unit.x
+    
+    return train_x
+
+def draw_static_environment(screen, font, track, start=0):
+    """Draw the parts of the environment that only change with the view (track, bus, stations)."""
+    screen.fill(WHITE)
+    # Draw bus line
+    pygame.draw.line(screen, BLACK, (50, 500), (WIDTH - 50, 500), 3)
+    # Draw track
+    pygame.draw.line(screen, BLACK, (50, 600), (WIDTH - 50, 600), 5)
+
+    # Draw stations
+    for name, position in track.stations_between(start, start + VIEW_LENGTH):
+        station_x = 50 + position - start
+        pygame.draw.rect(screen, GRAY, (station_x - 10, 590, 20, 20))
+        screen.blit(font.render(name, True, BLACK), (station_x - 30, 610))
+
+def draw_environment(screen, font, train_x, train):
+    """Draw the moving parts of the environment and return the rects drawn."""
+    rects = []
+    # Highlight the station the train is stopped at
+    if train.at_station:
+        start = view_start(train)
+        position = start + train_x - 50
+        for _, station in train.track.stations_between(position - 15, position + 15):
+            station_x = 50 + station - start
+            if abs(train_x - station_x) < 15:
+                rects.append(pygame.draw.rect(screen, YELLOW, (station_x - 10, 590, 20, 20)))
+
+    # Draw train
+    rects.append(pygame.draw.rect(screen, BLACK, (train_x, 550, 200, 50)))
+    # Draw doors
+    door_positions = [train_x + 20 + i * 45 for i in range(NUM_DOORS)]
+    for i, pos in enumerate(door_positions):
+        color = RED if train.doors[i] else GREEN
+        pygame.draw.rect(screen, color, (pos, 550, 30, 50))
+    # Draw speed indicator
+    screen.blit(font.render(f"{train.speed:.1f} km/h", True, WHITE), (train_x + 50, 570))
+    return rects
+
+def draw_debug_info(screen, font, train_x, train):
+    """Draw debug information and return the rects drawn."""
+    debug_info = [
+        f"Speed: {train.speed:.2f}",
+        f"Target: {train.target_speed:.2f}",
+        f"Brakes: {'On' if train.brakes_applied else 'Off'}",
+        f"Emerg: {'On' if train.emergency_stop else 'Off'}",
+        f"At Station: {'Yes' if train.at_station else 'No'}",
+        f"Leaving Station: {'Yes' if train.leaving_station else 'No'}",
+        f"Distance: {train.distance_traveled:.2f}",
+        f"Passengers: {train.passengers}/{MAX_PASSENGERS}",
+        f"Doors: {sum(train.doors)} Open, {NUM_DOORS - sum(train.doors)} Closed"
+    ]
+    return [screen.blit(font.render(text, True, BLACK), (train_x + 50, 770 - (i+1) * 20))
+            for i, text in enumerate(debug_info)]
+
+def draw_transmissions(screen, font, network_bus):
+    """Draw the bus's animated message transmissions and return the rects drawn."""
+    bus_y = 500
+    rects = []
+    for t in network_bus.transmissions:
+        if t["start_x"] is None or t["end_x"] is None:
+            continue
+        current_x = t["start_x"] + (t["end_x"] - t["start_x"]) * t["progress"]
+        rects.append(pygame.draw.circle(screen, RED, (int(current_x), bus_y), 5))
+        label = font.render(t["message"], True, BLACK)
+        rects.append(screen.blit(label, (current_x - 20, bus_y - 20)))
+    return rects
+
+def draw_bus_health(screen, font, network_bus):
+    """Draw the bus's connection state in the bottom left corner and return the rects drawn."""
+    health = network_bus.health()
+    text = f"Bus {health['state']} ({health['codec']}), queued {sum(health['queued'].values())}"
+    if health["state"] == "reconnecting":
+        text += f", retry in {health['backoff']:.1f}s"
+        if health["last_error"]:
+            text += f": {health['last_error']}"
+    text += f", sent {health['sent']}, dropped {health['dropped']}, disconnects {health['disconnects']}"
+    return [screen.blit(font.render(text, True, BLACK), (10, HEIGHT - 20))]
+
+def draw_static_layer(screen, font, nodes, control_unit, track, start=0):
+    """Draw everything that stays put between frames: environment, nodes and buttons."""
+    draw_static_environment(screen, font, track, start)
+    for node in nodes:
+        node.draw(screen, font)
+    control_unit.draw_buttons(screen, font, BUTTONS)
+
+def draw_dynamic_layer(screen, font, train_x, train, control_unit, network_bus, overlay=None):
+    """Draw everything that changes between frames and return the rects drawn."""
+    rects = draw_environment(screen, font, train_x, train)
+    rects += draw_debug_info(screen, font, train_x, train)
+    rects += draw_transmissions(screen, font, network_bus)
+    rects += draw_bus_health(screen, font, network_bus)
+    rects += control_unit.draw_interface(screen, font)
+    if overlay is not None:
+        rects += draw_profile_overlay(screen, font, overlay)
+    return rects
+
+def profile_overlay_rows(profiler):
+    """Returns the overlay's rows: mean and p99 per phase over the rolling window, then overruns."""
+    rows = [("phase", "mean ms", "p99 ms")]
+    rows += [(phase, f"{mean:.2f}", f"{p99:.2f}") for phase, mean, p99 in profiler.recent()]
+    frames = min(profiler.frames, len(profiler.window))
+    rows.append(("over budget", f"{profiler.recent_overruns()}/{frames}", ""))
+    return rows
+
+def draw_profile_overlay(screen, font, rows):
+    """Draw the profiler overlay in the top right corner and return the rects drawn."""
+    x, y = WIDTH - 300, 50
+    rects = []
+    for i, row in enumerate(rows):
+        for column_x, text in zip((0, 130, 210), row):
+            if text:
+                rects.append(screen.blit(font.render(text, True, BLACK), (x + column_x, y + i * 20)))
+    return rects
+
+def create_interactive_frame(network_bus, use_bus_master=False, seed=None, recorder=None, instrument=False,
+                             track=None, telemetry=None, dispatch_on_arrival=False, profiler=None):
+    """Sets up an interactive run on network_bus and returns (frame, pygame clock).
+
+    frame() runs one frame and returns False once the window is closed.
+    With dispatch_on_arrival, the bus hands received frames to the nodes as
+    they arrive instead of queueing them for the next frame; the bus must
+    then run on the caller's thread. A profiler times every frame's phases;
+    PROFILER_KEY toggles its overlay, starting an unexported profiler if
+    none was given.
+    """
+    screen, clock, font = initialize_pygame()
+    sim_clock = WallClock()
+    train = create_train(sim_clock, component_rng(seed, "train"), track)
+    network_bus.rng = component_rng(seed, "bus")
+    network_bus.instrument = instrument
+
+    # Create nodes
+    sensors, control_unit, nodes = create_nodes(train, sim_clock)
+    speed_sensor, door_sensors, passenger_sensor, station_sensor = sensors
+    bus_master = create_bus_master(sensors) if use_bus_master else None
+
+    # Position nodes along the bus
+    position_nodes(nodes)
+    renderer = LayeredRenderer(screen, font)
+    current_view = None
+
+    if dispatch_on_arrival:
+        network_bus.on_message = lambda msg: dispatch_frame(network_bus, nodes, msg, recorder,
+                                                            pygame.time.get_ticks() / 1000.0, telemetry)
+
+    message_timer = 0
+    previous_at_station = False
+    last_frame_time = time.time()
+    overlay = None  # Rows shown by the profiler overlay, None while hidden
+
+    def toggle_overlay():
+        nonlocal profiler, overlay
+        if profiler is None:
+            profiler = FrameProfiler(FRAME_PHASES)
+            profiler.start()  # Toggled mid-frame; time the rest of this one
+        overlay = [] if overlay is None else None
+
+    key_actions = {PROFILER_KEY: toggle_overlay}
+
+    def frame():
+        nonlocal current_view, message_timer, previous_at_station, last_frame_time, overlay
+        if profiler:
+            profiler.start()
+        current_time = pygame.time.get_ticks() / 1000.0
+        now = time.time()
+        delta_time = min(now - last_frame_time, 0.1)  # Cap delta_time to avoid physics issues
+        last_frame_time = now
+
+        # Handle station approach logic
+        handle_station_approach(train, control_unit)
+        if profiler:
+            profiler.mark("approach")
+
+        # Handle events
+        running, new_message_timer = handle_events(control_unit, train, current_time, recorder, key_actions)
+        if new_message_timer > 0:
+            message_timer = new_message_timer
+        if profiler:
+            profiler.mark("events")
+
+        # Update sensors, either cyclically through the bus master or on change
+        if bus_master:
+            bus_master.poll(current_time)
+        else:
+            update_sensors(speed_sensor, door_sensors, passenger_sensor, station_sensor, current_time)
+        if profiler:
+            profiler.mark("sensors")
+
+        # Process network messages
+        process_network_messages(network_bus, nodes, recorder, current_time, telemetry)
+        if profiler:
+            profiler.mark("network")
+
+        # Update train and handle station actions
+        train.update(delta_time)
+        if telemetry:
+            telemetry.record_tick(current_time, train)
+        previous_at_station = handle_station_actions(train, control_unit, previous_at_station)
+
+        # Clear message display if timer expired
+        if current_time > message_timer:
+            control_unit.display_message = ""
+        if profiler:
+            profiler.mark("physics")
+
+        # Update positions of train and message transmissions
+        train_x = update_positions(train, network_bus, nodes)
+        if view_start(train) != current_view:
+            current_view = view_start(train)
+            renderer.invalidate()
+
+        # Draw the cached static layer and the dynamic elements over it
+        if overlay is not None and (not overlay or profiler.frames % OVERLAY_REFRESH == 0):
+            overlay = profile_overlay_rows(profiler)
+        renderer.draw(
+            lambda surface, font: draw_static_layer(surface, font, nodes, control_unit, train.track, current_view),
+            lambda surface, font: draw_dynamic_layer(surface, font, train_x, train, control_unit, network_bus,
+                                                     overlay)
+        )
+        if profiler:
+            profiler.mark("draw")
+        renderer.present()
+        if profiler:
+            profiler.mark("flip")
+            profiler.end()
+        return running
+
+    return frame, clock
+
+def main(use_bus_master=False, seed=None, recorder=None, instrument=False, track=None, telemetry=None,
+         profiler=None, codec="json", uri=DEFAULT_URI):
+    """Runs the TCMS simulation.
+
+    With a recorder, button presses and delivered frames are logged against
+    pygame time. Wall-clock pacing and the live server make such a log an
+    approximate script rather than a bit-exact one. instrument stamps frames
+    at every hop for the latency tracker. track is the line to run on
+    (default: the three-station loop). A telemetry recorder receives the
+    train state every frame and every delivered bus frame. A FrameProfiler
+    over FRAME_PHASES times every frame's phases. uri is the bus to join:
+    a ws:// server, or a shm:// bus for nodes on this host. codec is the
+    wire format asked of the server ("json" or mvb_codec.CODEC_NAME).
+
+    The bus runs on its own thread; each frame's sends cross to it in one
+    batch, and received frames are picked up once per frame.
+    """
+    network_bus, bus_handoff = start_network(uri, codec)
+    frame, clock = create_interactive_frame(network_bus, use_bus_master, seed, recorder, instrument, track,
+                                            telemetry, profiler=profiler)
+    try:
+        while frame():
+            bus_handoff.flush()
+            clock.tick(60)
+    finally:
+        stop_network()
+        pygame.quit()
+
+async def main_single_loop(use_bus_master=False, seed=None, recorder=None, instrument=False, track=None,
+                           telemetry=None, profiler=None, codec="json", uri=DEFAULT_URI):
+    """Runs the TCMS simulation as a task on the bus's own event loop.
+
+    Takes the same arguments as main. The bus connection, its writer and
+    listener share the running loop with the simulation, which yields to
+    them between frames. Sends start as tasks directly and received frames
+    reach the nodes as they arrive, so nothing crosses a thread and no frame
+    waits for the next poll.
+    """
+    loop = asyncio.get_running_loop()
+    network_bus, _ = attach_network(loop, uri, codec)
+    frame, _ = create_interactive_frame(network_bus, use_bus_master, seed, recorder, instrument, track, telemetry,
+                                        dispatch_on_arrival=True, profiler=profiler)
+    listener = loop.create_task(network_bus.listen())
+    frame_period = 1 / 60
+    next_frame = loop.time()
+    try:
+        while frame():
+            next_frame = max(next_frame + frame_period, loop.time())
+            await asyncio.sleep(next_frame - loop.time())
+    finally:
+        listener.cancel()
+        await network_bus.close()
+        pygame.quit()
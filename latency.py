@@ -0,0 +1,159 @@
+# latency.py
+"""End-to-end bus latency instrumentation with HDR-style histograms.
+
+An instrumented frame carries a list of nanosecond stamps, one slot per
+hop in HOPS (None where the hop did not stamp it). When the frame reaches
+its node, the tracker records the time between each pair of consecutive
+stamped hops and the end-to-end time into per-route histograms.
+"""
+
+import json
+import threading
+
+HOPS = ("emit", "send", "server_receive", "server_deliver", "receive", "dispatch")
+EMIT, SEND, SERVER_RECEIVE, SERVER_DELIVER, RECEIVE, DISPATCH = range(len(HOPS))
+SEGMENTS = [[f"{start}->{end}" for end in HOPS] for start in HOPS]
+
+def new_stamps(emitted_at):
+    """Returns the stamp list for a frame emitted at emitted_at (ns)."""
+    stamps = [None] * len(HOPS)
+    stamps[EMIT] = emitted_at
+    return stamps
+
+class LatencyHistogram:
+    """Log-linear histogram of nanosecond values, in the style of HdrHistogram.
+
+    Values below 2 * SUB_BUCKETS are counted exactly; above that, each power
+    of two is split into SUB_BUCKETS buckets, so any recorded value is
+    reported within 1/SUB_BUCKETS (under 1%) of its true value.
+    """
+
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def bucket_index(cls, value):
+        if value < 2 * cls.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS - 1
+        return cls.SUB_BUCKETS * shift + (value >> shift)
+
+    @classmethod
+    def bucket_value(cls, index):
+        """Returns the midpoint of the value range counted in bucket index."""
+        if index < 2 * cls.SUB_BUCKETS:
+            return index
+        shift = index // cls.SUB_BUCKETS - 1
+        top = index - cls.SUB_BUCKETS * shift
+        return (top << shift) + (1 << shift) // 2
+
+    def record(self, value):
+        """Counts one value in nanoseconds; negative values count as zero."""
+        value = max(0, value)
+        index = self.bucket_index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """Returns the value at fraction (0-1) of the recorded distribution."""
+        if self.count == 0:
+            return 0
+        rank = max(1, round(fraction * self.count))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+    def summary(self):
+        """Returns count, mean and percentiles in milliseconds."""
+        to_ms = 1e-6
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * to_ms if self.count else 0.0,
+            "p50_ms": self.percentile(0.50) * to_ms,
+            "p90_ms": self.percentile(0.90) * to_ms,
+            "p99_ms": self.percentile(0.99) * to_ms,
+            "max_ms": self.max * to_ms
+        }
+
+class LatencyTracker:
+    """Aggregates stamped frames into histograms per route and hop segment."""
+
+    def __init__(self):
+        self.routes = {}  # (sender, target) -> {segment: LatencyHistogram}
+        self.lock = threading.Lock()
+        self._dump_stop = None
+
+    def record(self, sender, target, stamps):
+        """Records the hop-to-hop and end-to-end times of one delivered frame."""
+        with self.lock:
+            segments = self.routes.get((sender, target))
+            if segments is None:
+                segments = self.routes[(sender, target)] = {}
+            first = previous = None
+            for hop, stamp in enumerate(stamps):
+                if stamp is None:
+                    continue
+                if previous is None:
+                    first = hop
+                else:
+                    self._histogram(segments, SEGMENTS[previous][hop]).record(stamp - stamps[previous])
+                previous = hop
+            if first is not None and previous != first:
+                self._histogram(segments, "end_to_end").record(stamps[previous] - stamps[first])
+
+    @staticmethod
+    def _histogram(segments, name):
+        histogram = segments.get(name)
+        if histogram is None:
+            histogram = segments[name] = LatencyHistogram()
+        return histogram
+
+    def snapshot(self):
+        """Returns {"sender->target": {segment: summary}} for every route seen."""
+        with self.lock:
+            return {
+                f"{sender}->{target}": {name: histogram.summary() for name, histogram in segments.items()}
+                for (sender, target), segments in self.routes.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+
+    def dump(self, path):
+        """Writes the current snapshot to path as JSON."""
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def start_periodic_dump(self, path, interval=5.0):
+        """Dumps the snapshot to path every interval seconds from a daemon thread."""
+        self.stop_periodic_dump()
+        stop = self._dump_stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.dump(path)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def stop_periodic_dump(self):
+        if self._dump_stop is not None:
+            self._dump_stop.set()
+            self._dump_stop = None
+
+# Process-wide tracker fed by process_network_messages
+tracker = LatencyTracker()
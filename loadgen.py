@@ -0,0 +1,244 @@
+# loadgen.py
+"""Synthetic load generator for mvb_server capacity planning.
+
+Opens many simulated node connections with the same registration handshake
+as NetworkMVB_Bus.connect, drives them at a fixed per-node message rate
+towards a chosen target distribution, and reports achieved throughput, drop
+rate and delivery latency percentiles.
+
+Latency is timed from a plain "sent" field, which the server relays
+untouched, so frames take its ordinary unstamped path. --stamps adds the
+per-hop latency stamps instead, to load the stamped path; binary frames
+carry no extra fields, so --codec mvb1 measures latency only with it.
+
+    python loadgen.py --nodes 2000 --rate 5 --duration 30 --spawn-server
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+import websockets
+from latency import LatencyHistogram, new_stamps, EMIT
+from mvb_codec import CODEC_NAME, encode_frame, decode_frame
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mvb_server.py")
+
+class LoadStats:
+    """Counters and latency histogram shared by every simulated node."""
+
+    def __init__(self):
+        self.connected = 0
+        self.connect_failures = 0
+        self.sent = 0
+        self.received = 0
+        self.send_errors = 0
+        self.latency = LatencyHistogram()
+
+    def report(self, elapsed):
+        latency = self.latency.summary()
+        return {
+            "connected": self.connected,
+            "connect_failures": self.connect_failures,
+            "sent": self.sent,
+            "received": self.received,
+            "send_errors": self.send_errors,
+            "offered_msgs_per_sec": self.sent / elapsed,
+            "delivered_msgs_per_sec": self.received / elapsed,
+            "drop_rate": 1 - self.received / self.sent if self.sent else 0.0,
+            "latency_samples": latency["count"],
+            "latency_p50_ms": latency["p50_ms"],
+            "latency_p90_ms": latency["p90_ms"],
+            "latency_p99_ms": latency["p99_ms"],
+            "latency_max_ms": latency["max_ms"]
+        }
+
+def make_target_picker(distribution, nodes, rng, hot_fraction=0.1):
+    """Returns a function choosing the target node index for each message.
+
+    uniform spreads load evenly, hotspot sends 80% of messages to the first
+    hot_fraction of nodes, and single sends everything to node 0.
+    """
+    if distribution == "uniform":
+        return lambda sender: rng.randrange(nodes)
+    if distribution == "hotspot":
+        hot = max(1, int(nodes * hot_fraction))
+        return lambda sender: rng.randrange(hot) if rng.random() < 0.8 else rng.randrange(nodes)
+    if distribution == "single":
+        return lambda sender: 0
+    raise ValueError(f"Unknown target distribution {distribution!r}")
+
+async def connect_node(uri, name, codec):
+    """Opens one connection and registers it the way NetworkMVB_Bus.connect does."""
+    websocket = await websockets.connect(uri, ping_interval=None)
+    if codec == CODEC_NAME:
+        await websocket.send(json.dumps({"register": name, "codec": codec}))
+        ack = json.loads(await websocket.recv())
+        binary = ack.get("codec") == CODEC_NAME
+    else:
+        await websocket.send(json.dumps({"register": name}))
+        binary = False
+    return websocket, binary
+
+async def receive_loop(websocket, stats):
+    """Counts deliveries and records their latency from the send time or emit stamp."""
+    try:
+        async for message in websocket:
+            data = decode_frame(message) if isinstance(message, bytes) else json.loads(message)
+            stats.received += 1
+            sent = data.get("sent")
+            if sent is None and "stamps" in data:
+                sent = data["stamps"][EMIT]
+            if sent is not None:
+                stats.latency.record(time.time_ns() - sent)
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+async def send_loop(websocket, binary, index, rate, duration, pick_target, stats, stamps=False):
+    """Sends messages at a steady rate until duration has elapsed, with latency stamps if stamps."""
+    interval = 1.0 / rate
+    loop = asyncio.get_running_loop()
+    next_send = loop.time() + random.uniform(0, interval)  # Spread nodes across the interval
+    end = loop.time() + duration
+    sequence = 0
+    while next_send < end:
+        await asyncio.sleep(max(0.0, next_send - loop.time()))
+        data = {
+            "sender": f"Node{index}",
+            "target": f"Node{pick_target(index)}",
+            "message": f"Speed:{sequence % 30}.0"
+        }
+        if stamps:
+            data["stamps"] = new_stamps(time.time_ns())
+        else:
+            data["sent"] = time.time_ns()
+        frame = encode_frame(data) if binary else None
+        try:
+            await websocket.send(frame if frame is not None else json.dumps(data))
+            stats.sent += 1
+        except websockets.exceptions.ConnectionClosed:
+            stats.send_errors += 1
+            return
+        sequence += 1
+        next_send += interval
+
+async def run_load(uri, nodes, rate, duration, distribution="uniform", codec="json",
+                   drain=1.5, connect_concurrency=200, seed=None, stamps=False):
+    """Runs one load test and returns its report dict."""
+    stats = LoadStats()
+    pick_target = make_target_picker(distribution, nodes, random.Random(seed))
+    semaphore = asyncio.Semaphore(connect_concurrency)
+
+    async def open_node(index):
+        async with semaphore:
+            try:
+                connection = await connect_node(uri, f"Node{index}", codec)
+            except (OSError, websockets.exceptions.WebSocketException, asyncio.TimeoutError):
+                stats.connect_failures += 1
+                return None
+        stats.connected += 1
+        return connection
+
+    connections = await asyncio.gather(*(open_node(i) for i in range(nodes)))
+    receivers = [asyncio.create_task(receive_loop(ws, stats)) for ws, _ in filter(None, connections)]
+
+    senders = []
+    for index, connection in enumerate(connections):
+        if connection:
+            websocket, binary = connection
+            senders.append(send_loop(websocket, binary, index, rate, duration, pick_target, stats, stamps))
+
+    started = time.perf_counter()
+    await asyncio.gather(*senders)
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(drain)  # Let frames still in the server's delay queue arrive
+
+    await asyncio.gather(*(ws.close() for ws, _ in filter(None, connections)), return_exceptions=True)
+    for receiver in receivers:
+        receiver.cancel()
+    report = stats.report(elapsed)
+    report.update({"nodes": nodes, "rate_per_node": rate, "duration": duration,
+                   "distribution": distribution, "codec": codec, "stamps": stamps})
+    return report
+
+def spawn_server(port, loss, min_delay, max_delay, workers=1):
+    """Starts a local mvb_server subprocess and waits until it accepts connections."""
+    server = subprocess.Popen(
+        [sys.executable, SERVER_SCRIPT, "--port", str(port), "--loss", str(loss),
+         "--min-delay", str(min_delay), "--max-delay", str(max_delay), "--workers", str(workers)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    async def wait_ready():
+        for _ in range(100):
+            try:
+                async with websockets.connect(f"ws://localhost:{port}") as probe:
+                    await probe.send(json.dumps({"register": "LoadProbe"}))
+                    return
+            except OSError:
+                await asyncio.sleep(0.1)
+        raise RuntimeError("mvb_server did not start")
+
+    asyncio.run(wait_ready())
+    return server
+
+def stop_server(server, port, timeout=10.0):
+    """Stops a spawned server the way Ctrl-C would and waits until its port is free.
+
+    SIGINT, not SIGTERM, so a sharded server stops its shards too.
+    """
+    server.send_signal(signal.SIGINT)
+    try:
+        server.wait(timeout)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("localhost", port), timeout=0.2).close()
+        except OSError:
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"mvb_server still accepting on port {port} after shutdown")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic load generator for mvb_server")
+    parser.add_argument("--uri", default=None, help="server to load (default ws://localhost:PORT)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--nodes", type=int, default=1000, help="concurrent simulated node connections")
+    parser.add_argument("--rate", type=float, default=5.0, help="messages per second per node")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of sending")
+    parser.add_argument("--distribution", choices=["uniform", "hotspot", "single"], default="uniform")
+    parser.add_argument("--codec", choices=["json", CODEC_NAME], default="json")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--stamps", action="store_true",
+                        help="carry per-hop latency stamps, loading the server's stamped path "
+                             "(needed for latency with --codec mvb1)")
+    parser.add_argument("--spawn-server", action="store_true", help="start a local mvb_server for the run")
+    parser.add_argument("--loss", type=float, default=0.0, help="packet loss of the spawned server")
+    parser.add_argument("--min-delay", type=float, default=0.0, help="minimum delay of the spawned server")
+    parser.add_argument("--max-delay", type=float, default=0.0, help="maximum delay of the spawned server")
+    parser.add_argument("--workers", type=int, default=1, help="shards of the spawned server")
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    uri = args.uri or f"ws://localhost:{args.port}"
+    server = spawn_server(args.port, args.loss, args.min_delay, args.max_delay, args.workers) if args.spawn_server else None
+    try:
+        report = asyncio.run(run_load(uri, args.nodes, args.rate, args.duration, args.distribution,
+                                      args.codec, drain=args.max_delay + 1.0, seed=args.seed,
+                                      stamps=args.stamps))
+    finally:
+        if server:
+            stop_server(server, args.port)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,179 @@
+# log_pipeline.py
+"""Logging for the bus, server and nodes that costs almost nothing when quiet.
+
+Every component logs through a child of the "tcms" logger with %-style
+arguments, so a disabled level costs one cached level check and the message
+is never built. Enabled records go two ways:
+
+- into an in-memory ring of the most recent records, so a fault can dump
+  the history leading up to it. Each record's message is rendered as it
+  goes in, so arguments changed later cannot rewrite the history, but
+  the formatting into a line waits for the dump;
+- through a QueueHandler to a listener thread that formats them and writes
+  them to the console, keeping console I/O off the hot path.
+
+Call configure() once from a program's entry point; until then records
+only reach the ring-less default (warnings and errors to stderr). A
+command-line entry point also calls install_fault_dump() so an uncaught
+exception dumps the ring; configure() itself leaves sys.excepthook alone,
+so workers and tools that configure logging keep their own.
+"""
+
+import atexit
+import logging
+import queue
+import sys
+import threading
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT_LOGGER = "tcms"
+DEFAULT_CAPACITY = 4096  # Records kept for dump_recent()
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+LEVEL_MAP = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+    "OFF": logging.CRITICAL + 10  # Higher than any standard level
+}
+
+def parse_level(level):
+    """Returns the numeric level for a name from LEVEL_MAP, or level itself if already numeric."""
+    if isinstance(level, int):
+        return level
+    return LEVEL_MAP.get(level.upper(), logging.INFO)
+
+def get_logger(name):
+    """Returns the logger for one component, under the shared "tcms" logger."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the last capacity records in memory, messages rendered but not formatted."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        # Render now: the arguments may be mutable objects the caller changes later
+        record.msg = record.getMessage()
+        record.args = None
+        self.records.append(record)  # deque.append is atomic; no lock needed
+
+    def handle(self, record):
+        # Skip Handler.handle's lock; emit is already thread-safe
+        if self.filter(record):
+            self.emit(record)
+        return record
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() formats the record in the logging thread so it can
+    be pickled; the listener here runs in the same process, so the record
+    is queued as is.
+    """
+
+    def prepare(self, record):
+        return record
+
+class LogPipeline:
+    """The ring buffer and console sink installed by configure()."""
+
+    def __init__(self, level=logging.INFO, console_level=None, capacity=DEFAULT_CAPACITY, stream=None,
+                 caller_info=False):
+        # Process-wide switches; saved so close() hands logging back as it was
+        self.saved_switches = (logging._srcfile, logging.logProcesses, logging.logMultiprocessing)
+        if not caller_info:
+            logging._srcfile = None  # Documented switch for skipping findCaller
+            logging.logProcesses = False
+            logging.logMultiprocessing = False
+        self.logger = logging.getLogger(ROOT_LOGGER)
+        self.ring = RingBufferHandler(capacity)
+        self.queue = queue.SimpleQueue()
+        console = logging.StreamHandler(stream if stream is not None else sys.stderr)
+        console.setFormatter(logging.Formatter(FORMAT, DATE_FORMAT))
+        console.setLevel(parse_level(console_level if console_level is not None else level))
+        self.listener = QueueListener(self.queue, console, respect_handler_level=True)
+        self.queue_handler = DeferredQueueHandler(self.queue)
+        self.queue_handler.setLevel(console.level)
+        self.logger.setLevel(parse_level(level))
+        self.logger.addHandler(self.ring)
+        self.logger.addHandler(self.queue_handler)
+        self.logger.propagate = False
+        self.listener.start()
+
+    def recent(self, count=None):
+        """Returns the last count records kept in the ring (all of them by default)."""
+        records = list(self.ring.records)
+        return records if count is None else records[-count:]
+
+    def close(self):
+        """Detaches the handlers, flushes the console sink and restores the logging switches."""
+        self.logger.removeHandler(self.ring)
+        self.logger.removeHandler(self.queue_handler)
+        self.logger.propagate = True
+        self.listener.stop()
+        logging._srcfile, logging.logProcesses, logging.logMultiprocessing = self.saved_switches
+
+_pipeline = None
+_lock = threading.Lock()
+
+def configure(level="INFO", console_level=None, capacity=DEFAULT_CAPACITY, stream=None, caller_info=False):
+    """Installs the logging pipeline, replacing any earlier one.
+
+    level gates which records are created at all; console_level (default:
+    level) filters what the console sink writes, so the ring can keep more
+    history than is printed. Unless caller_info is
+    set, records skip the stack walk for the calling file and line and the
+    process lookups, which are most of the cost of creating one. These
+    switches are process-wide, so they last only until the pipeline is
+    closed by shutdown() or the next configure().
+    """
+    global _pipeline
+    with _lock:
+        if _pipeline is not None:
+            _pipeline.close()
+        _pipeline = LogPipeline(level, console_level, capacity, stream, caller_info)
+    return _pipeline
+
+def install_fault_dump():
+    """Makes an uncaught exception dump the ring to stderr before its traceback.
+
+    For command-line entry points; a hook already installed is kept.
+    """
+    if sys.excepthook is sys.__excepthook__:
+        sys.excepthook = _dump_then_raise
+
+def shutdown():
+    """Stops the console sink, writing out whatever it still holds."""
+    global _pipeline
+    with _lock:
+        if _pipeline is not None:
+            _pipeline.close()
+            _pipeline = None
+
+atexit.register(shutdown)
+
+def recent(count=None):
+    """Returns the most recent records kept by the pipeline, oldest first."""
+    return _pipeline.recent(count) if _pipeline is not None else []
+
+def dump_recent(file=None, count=None):
+    """Writes the most recent records to file (default stderr)."""
+    file = file if file is not None else sys.stderr
+    formatter = logging.Formatter(FORMAT, DATE_FORMAT)
+    records = recent(count)
+    print(f"--- last {len(records)} log records ---", file=file)
+    for record in records:
+        print(formatter.format(record), file=file)
+    file.flush()
+
+def _dump_then_raise(exc_type, exc, traceback):
+    if not issubclass(exc_type, KeyboardInterrupt):
+        dump_recent()
+    sys.__excepthook__(exc_type, exc, traceback)
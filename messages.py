@@ -0,0 +1,170 @@
+# messages.py
+"""Typed bus messages and a registry-based dispatcher.
+
+Wire messages stay plain strings such as "Speed:12.3" or "Open Door2".
+decode_message parses a string once into a small immutable message object,
+and str() on that object gives back the wire text.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+@dataclass(frozen=True, slots=True)
+class SpeedReading:
+    speed: float
+
+    def __str__(self):
+        return f"Speed:{self.speed:.1f}"
+
+@dataclass(frozen=True, slots=True)
+class DoorState:
+    door: int
+    is_open: bool
+
+    def __str__(self):
+        return f"Door{self.door}:{'Open' if self.is_open else 'Closed'}"
+
+@dataclass(frozen=True, slots=True)
+class PassengerCount:
+    count: int
+
+    def __str__(self):
+        return f"Passengers:{self.count}"
+
+@dataclass(frozen=True, slots=True)
+class StationState:
+    at_station: bool
+
+    def __str__(self):
+        return f"Station:{'Yes' if self.at_station else 'No'}"
+
+@dataclass(frozen=True, slots=True)
+class SetTargetSpeed:
+    speed: float
+
+    def __str__(self):
+        return f"Set Target Speed:{self.speed}"
+
+@dataclass(frozen=True, slots=True)
+class BrakeCommand:
+    applied: bool
+
+    def __str__(self):
+        return "Apply Brakes" if self.applied else "Release Brakes"
+
+@dataclass(frozen=True, slots=True)
+class EmergencyStop:
+    count: int
+
+    def __str__(self):
+        return f"Emergency Stop {self.count}"
+
+@dataclass(frozen=True, slots=True)
+class DoorCommand:
+    door: int
+    open: bool
+
+    def __str__(self):
+        return f"{'Open' if self.open else 'Close'} Door{self.door}"
+
+@dataclass(frozen=True, slots=True)
+class TextMessage:
+    """Any message without a dedicated type."""
+    text: str
+
+    def __str__(self):
+        return self.text
+
+# "Key:value" messages, looked up by key
+VALUE_PARSERS = {
+    "Speed": lambda value: SpeedReading(float(value)),
+    "Passengers": lambda value: PassengerCount(int(value)),
+    "Station": lambda value: StationState(value == "Yes"),
+    "Set Target Speed": lambda value: SetTargetSpeed(float(value)),
+}
+
+# Fixed command strings
+COMMANDS = {
+    "Apply Brakes": BrakeCommand(True),
+    "Release Brakes": BrakeCommand(False),
+}
+
+@lru_cache(maxsize=4096)
+def decode_message(text):
+    """Parses a wire string into a typed message; unknown text becomes a TextMessage."""
+    try:
+        key, sep, value = text.partition(":")
+        if sep:
+            parser = VALUE_PARSERS.get(key)
+            if parser is not None:
+                return parser(value)
+            if key.startswith("Door") and key[4:].isdigit():
+                return DoorState(int(key[4:]), value == "Open")
+            return TextMessage(text)
+        command = COMMANDS.get(text)
+        if command is not None:
+            return command
+        if text.startswith("Emergency Stop"):
+            return EmergencyStop(int(text[len("Emergency Stop"):] or 0))
+        action, _, door = text.partition(" Door")
+        if action in ("Open", "Close") and door.isdigit():
+            return DoorCommand(int(door), action == "Open")
+    except ValueError:
+        pass
+    return TextMessage(text)
+
+class MessageDispatcher:
+    """Hands each message to the handler registered for its type."""
+
+    def __init__(self, handlers=None):
+        self.handlers = dict(handlers or {})
+
+    def register(self, message_type, handler):
+        """Registers handler(message) for messages of message_type."""
+        self.handlers[message_type] = handler
+
+    def dispatch(self, message):
+        """Calls the handler for message's type; returns False when there is none."""
+        handler = self.handlers.get(type(message))
+        if handler is None:
+            return False
+        handler(message)
+        return True
+
+    __call__ = dispatch
+
+# Priority lanes, most urgent first. Safety commands always go out before
+# other commands, and commands before cyclic process data.
+PRIORITY_SAFETY, PRIORITY_COMMAND, PRIORITY_PROCESS_DATA = range(3)
+LANE_NAMES = ("safety", "command", "process_data")
+
+MESSAGE_PRIORITIES = {
+    EmergencyStop: PRIORITY_SAFETY,
+    BrakeCommand: PRIORITY_SAFETY,
+    DoorCommand: PRIORITY_COMMAND,
+    SetTargetSpeed: PRIORITY_COMMAND,
+    TextMessage: PRIORITY_COMMAND,
+    SpeedReading: PRIORITY_PROCESS_DATA,
+    DoorState: PRIORITY_PROCESS_DATA,
+    PassengerCount: PRIORITY_PROCESS_DATA,
+    StationState: PRIORITY_PROCESS_DATA,
+}
+
+def message_priority(text):
+    """Returns the priority lane of a wire message string."""
+    return MESSAGE_PRIORITIES[type(decode_message(text))]
+
+def frame_lane(data):
+    """Returns (priority, coalesce key) for a frame dict.
+
+    Process-data readings get a key naming their source, so a newer reading
+    can replace a queued one; bus-master frames carry different ports each
+    cycle and are never coalesced.
+    """
+    if "ports" in data:
+        return PRIORITY_PROCESS_DATA, None
+    message = decode_message(data.get("message", ""))
+    priority = MESSAGE_PRIORITIES[type(message)]
+    if priority != PRIORITY_PROCESS_DATA:
+        return priority, None
+    return priority, (data["sender"], data.get("real_target"), type(message))
@@ -0,0 +1,226 @@
+# mvb_codec.py
+"""Compact binary MVB telegram format used on the bus as an alternative to JSON.
+
+A telegram is a fixed 8-byte header followed by a typed payload:
+
+    version (B) | payload type (B) | sender (H) | target (H) | real_target (H)
+
+Latency-instrumented telegrams set STAMPED in the payload type and end with
+a fixed trailer of per-hop nanosecond stamps, which relays fill in place.
+A hop that has not stamped the frame holds UNSTAMPED.
+
+Node names travel as numeric IDs, so the server can route a frame by reading
+the target field without touching the payload.
+"""
+
+import struct
+from constants import NUM_DOORS
+from latency import HOPS
+from messages import message_priority, PRIORITY_PROCESS_DATA
+
+CODEC_NAME = "mvb1"
+VERSION = 1
+
+HEADER = struct.Struct("!BBHHH")
+ROUTE_OFFSET = 2
+ROUTE_FIELDS = struct.Struct("!HH")
+
+# Payload types
+TEXT = 0
+SPEED = 1
+DOOR = 2
+PASSENGERS = 3
+STATION = 4
+PROCESS_DATA = 5  # One bus-master cycle carrying several ports
+STAMPED = 0x80  # Flag: frame ends with a latency stamp trailer
+
+SPEED_PAYLOAD = struct.Struct("!f")
+DOOR_PAYLOAD = struct.Struct("!BB")
+PASSENGERS_PAYLOAD = struct.Struct("!H")
+STATION_PAYLOAD = struct.Struct("!B")
+STAMP_TRAILER = struct.Struct(f"!{len(HOPS)}Q")
+STAMP_FIELD = struct.Struct("!Q")
+UNSTAMPED = 2**64 - 1  # Trailer value of a hop that has not stamped the frame (None when decoded)
+PORT_COUNT = struct.Struct("!B")
+PORT_HEADER = struct.Struct("!HBB")  # port id, payload type, payload length
+
+NODE_IDS = {
+    "SimulationBus": 1,
+    "Control": 2,
+    "Speed": 3,
+    "Pass": 4,
+    "Station": 5,
+    "Traction": 6,
+    "Brake": 7,
+    "Emerg": 8,
+    "BusMaster": 9,
+}
+NODE_IDS.update({f"DoorS{i}": 16 + i for i in range(NUM_DOORS)})
+NODE_IDS.update({f"DoorActuator{i}": 32 + i for i in range(NUM_DOORS)})
+NODE_NAMES = {number: name for name, number in NODE_IDS.items()}
+
+# Generated nodes (load tests, large consists) are named "Node<n>" and
+# take IDs from GENERIC_NODE_BASE upwards
+GENERIC_NODE_BASE = 0x0400
+GENERIC_NODE_LIMIT = 0x10000 - GENERIC_NODE_BASE
+
+def node_id(name):
+    """Returns the numeric ID for a node name, or None if it has none."""
+    node = NODE_IDS.get(name)
+    if node is None and name.startswith("Node") and name[4:].isdigit():
+        index = int(name[4:])
+        if index < GENERIC_NODE_LIMIT:
+            node = GENERIC_NODE_BASE + index
+    return node
+
+def node_name(node):
+    """Returns the node name for a numeric ID."""
+    name = NODE_NAMES.get(node)
+    if name is None:
+        name = f"Node{node - GENERIC_NODE_BASE}" if node >= GENERIC_NODE_BASE else str(node)
+    return name
+
+def encode_payload(message):
+    """Returns (payload type, payload bytes) for a message string."""
+    key, sep, value = message.partition(":")
+    if sep:
+        if key == "Speed":
+            return SPEED, SPEED_PAYLOAD.pack(float(value))
+        if key == "Passengers":
+            return PASSENGERS, PASSENGERS_PAYLOAD.pack(int(value))
+        if key == "Station":
+            return STATION, STATION_PAYLOAD.pack(value == "Yes")
+        if key.startswith("Door") and key[4:].isdigit():
+            return DOOR, DOOR_PAYLOAD.pack(int(key[4:]), value == "Open")
+    return TEXT, message.encode("utf-8")
+
+def decode_payload(payload_type, payload):
+    """Rebuilds the message string carried by a typed payload."""
+    if payload_type == SPEED:
+        return f"Speed:{SPEED_PAYLOAD.unpack(payload)[0]:.1f}"
+    if payload_type == DOOR:
+        door, is_open = DOOR_PAYLOAD.unpack(payload)
+        return f"Door{door}:{'Open' if is_open else 'Closed'}"
+    if payload_type == PASSENGERS:
+        return f"Passengers:{PASSENGERS_PAYLOAD.unpack(payload)[0]}"
+    if payload_type == STATION:
+        return f"Station:{'Yes' if STATION_PAYLOAD.unpack(payload)[0] else 'No'}"
+    return bytes(payload).decode("utf-8")
+
+def process_data_label(port_count):
+    """Returns the message text shown for a process-data frame."""
+    return f"PD[{port_count}]"
+
+def encode_ports(ports):
+    """Packs [port name, message] pairs into one process-data payload."""
+    parts = [PORT_COUNT.pack(len(ports))]
+    for name, message in ports:
+        payload_type, payload = encode_payload(message)
+        port = node_id(name)
+        if port is None:
+            raise KeyError(name)
+        parts.append(PORT_HEADER.pack(port, payload_type, len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+def decode_ports(payload):
+    """Unpacks a process-data payload into [port name, message] pairs."""
+    (count,) = PORT_COUNT.unpack_from(payload)
+    offset = PORT_COUNT.size
+    ports = []
+    for _ in range(count):
+        port, payload_type, length = PORT_HEADER.unpack_from(payload, offset)
+        offset += PORT_HEADER.size
+        message = decode_payload(payload_type, payload[offset:offset + length])
+        ports.append([node_name(port), message])
+        offset += length
+    return ports
+
+def encode_frame(data):
+    """Encodes a frame dict as a binary telegram.
+
+    Returns None when a node name has no numeric ID or a message does not
+    fit its typed payload; callers then fall back to JSON for that frame.
+    """
+    sender = node_id(data["sender"])
+    target = node_id(data["target"])
+    real_target = node_id(data.get("real_target", data["target"]))
+    if sender is None or target is None or real_target is None:
+        return None
+    try:
+        if "ports" in data:
+            payload_type, payload = PROCESS_DATA, encode_ports(data["ports"])
+        else:
+            payload_type, payload = encode_payload(data["message"])
+    except (KeyError, ValueError, struct.error):
+        return None  # Unknown port, or a value the typed payload cannot hold
+    stamps = data.get("stamps")
+    if stamps is None:
+        return HEADER.pack(VERSION, payload_type, sender, target, real_target) + payload
+    return (HEADER.pack(VERSION, payload_type | STAMPED, sender, target, real_target)
+            + payload + STAMP_TRAILER.pack(*(UNSTAMPED if stamp is None else stamp for stamp in stamps)))
+
+def decode_frame(frame):
+    """Decodes a binary telegram into the same dict shape as a JSON frame."""
+    _, payload_type, sender, target, real_target = HEADER.unpack_from(frame)
+    payload = memoryview(frame)[HEADER.size:]
+    stamps = None
+    if payload_type & STAMPED:
+        payload_type &= ~STAMPED
+        stamps = [None if stamp == UNSTAMPED else stamp
+                  for stamp in STAMP_TRAILER.unpack_from(payload, len(payload) - STAMP_TRAILER.size)]
+        payload = payload[:-STAMP_TRAILER.size]
+    data = {
+        "sender": node_name(sender),
+        "target": node_name(target),
+        "real_target": node_name(real_target),
+    }
+    if payload_type == PROCESS_DATA:
+        data["ports"] = decode_ports(payload)
+        data["message"] = process_data_label(len(data["ports"]))
+    else:
+        data["message"] = decode_payload(payload_type, payload)
+    if stamps is not None:
+        data["stamps"] = stamps
+    return data
+
+def is_stamped(frame):
+    """Returns whether a telegram carries a latency stamp trailer."""
+    return bool(frame[1] & STAMPED)
+
+def set_stamp(frame, hop, value):
+    """Writes one hop's stamp into a stamped telegram held in a bytearray."""
+    STAMP_FIELD.pack_into(frame, len(frame) - STAMP_TRAILER.size + hop * STAMP_FIELD.size, value)
+
+def peek_route(frame):
+    """Returns the sender and target names of a telegram without decoding its payload."""
+    sender, target = ROUTE_FIELDS.unpack_from(frame, ROUTE_OFFSET)
+    return node_name(sender), node_name(target)
+
+def peek_ports(frame):
+    """Returns the port names of a process-data telegram without decoding them, or None for any other frame."""
+    if frame[1] & ~STAMPED != PROCESS_DATA:
+        return None
+    (count,) = PORT_COUNT.unpack_from(frame, HEADER.size)
+    offset = HEADER.size + PORT_COUNT.size
+    names = []
+    for _ in range(count):
+        port, _, length = PORT_HEADER.unpack_from(frame, offset)
+        names.append(node_name(port))
+        offset += PORT_HEADER.size + length
+    return names
+
+def peek_lane(frame):
+    """Returns (priority, coalesce key) of a telegram, as messages.frame_lane does for dicts.
+
+    Typed readings are classified from the header alone; only text payloads
+    are decoded.
+    """
+    payload_type = frame[1] & ~STAMPED
+    if payload_type == PROCESS_DATA:
+        return PRIORITY_PROCESS_DATA, None
+    if payload_type == TEXT:
+        end = len(frame) - STAMP_TRAILER.size if frame[1] & STAMPED else len(frame)
+        return message_priority(bytes(frame[HEADER.size:end]).decode("utf-8")), None
+    # Sender, target and real target plus the payload type name the reading's source
+    return PRIORITY_PROCESS_DATA, bytes(frame[ROUTE_OFFSET:HEADER.size]) + bytes((payload_type,))
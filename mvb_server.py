@@ -1,47 +1,559 @@
+import argparse
 import asyncio
+import heapq
+import itertools
+import multiprocessing
+import os
+import signal
+import struct
+import tempfile
 import websockets
 import json
 import random
+import time
+from mvb_codec import CODEC_NAME, decode_frame, peek_route, peek_lane, peek_ports, is_stamped, set_stamp
+from messages import frame_lane
+from priority_lanes import PriorityLanes
+from latency import SERVER_RECEIVE, SERVER_DELIVER
+from registry import NodeRegistry
+from rng_streams import component_rng
+from log_pipeline import get_logger, configure as configure_logging, install_fault_dump, LEVEL_MAP
 
 PACKET_LOSS_PROB = 0.1
 MIN_DELAY = 0.1
 MAX_DELAY = 0.5
+# Frames held per client and priority lane (safety, command, process data) before the oldest is dropped
+CLIENT_LANE_CAPACITIES = (256, 256, 512)
+SHARD_STOP_TIMEOUT = 5.0  # Seconds a shard gets to exit on shutdown before it is killed
 
-connected_clients = {}
+rng = random.Random()  # Packet loss and delay draws; seed for reproducible runs
+connected_clients = NodeRegistry()
+client_codecs = {}  # Wire format negotiated by each client at registration
+client_outboxes = {}  # client name -> ClientOutbox
+ALL_TOPICS = "*"  # Subscribes to every frame on the bus
+subscribers = {}  # topic -> names of local clients subscribed to it
+client_topics = {}  # client name -> topics it subscribes to
+shard_peers = None  # ShardPeers when running as one shard of a multi-process server
+log = get_logger("server")
+
+class DeliveryQueue:
+    """Server-wide timer queue that releases delayed frames at their deadline.
+
+    Frames sit in a heap ordered by deadline and a single loop timer is armed
+    for the earliest one, so receive loops never sleep on a frame's delay.
+    """
+
+    def __init__(self):
+        self.heap = []  # (deadline, seq, sender, target, message, lane)
+        self._seq = itertools.count()
+        self._timer = None
+
+    def schedule(self, delay, sender, target, message, lane):
+        """Queues a frame for delivery to target after delay seconds.
+
+        lane is the frame's (priority, coalesce key) from frame_lane or peek_lane.
+        """
+        loop = asyncio.get_running_loop()
+        entry = (loop.time() + delay, next(self._seq), sender, target, message, lane)
+        heapq.heappush(self.heap, entry)
+        if self.heap[0] is entry:
+            self._arm(loop)
+
+    def _arm(self, loop):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_at(self.heap[0][0], self._release, loop)
+
+    def _release(self, loop):
+        self._timer = None
+        now = loop.time()
+        while self.heap and self.heap[0][0] <= now:
+            _, _, sender, target, message, lane = heapq.heappop(self.heap)
+            if target in connected_clients:
+                client_outboxes[target].put(sender, message, lane)
+            elif shard_peers is not None and shard_peers.forward(sender, target, message):
+                pass
+            else:
+                log.debug("[Server] Target %s not connected.", target)
+            fan_out(sender, target, message, lane)
+            if shard_peers is not None:
+                shard_peers.publish(sender, target, message)
+        if self.heap:
+            self._arm(loop)
+
+delivery_queue = DeliveryQueue()
+
+class Publication:
+    """A released frame shared by every subscriber it fans out to.
+
+    The frame is serialised at most once per wire format, and the same
+    bytes are written to every subscriber socket using that format.
+    """
+
+    __slots__ = ("message", "_wire")
+
+    def __init__(self, message):
+        # Stamp once; every subscriber sees the fan-out time as its delivery time
+        if isinstance(message, dict):
+            message["stamps"][SERVER_DELIVER] = time.time_ns()
+            message = json.dumps(message)
+        elif isinstance(message, bytearray):
+            message = bytearray(message)
+            set_stamp(message, SERVER_DELIVER, time.time_ns())
+            message = bytes(message)
+        self.message = message
+        self._wire = {}  # codec -> (data, is text)
+
+    def wire(self, codec):
+        """Returns (data, is text) to send to a client that negotiated codec."""
+        wire = self._wire.get(codec)
+        if wire is None:
+            message = self.message
+            if isinstance(message, str):
+                wire = (message.encode("utf-8"), True)
+            elif codec == CODEC_NAME:
+                wire = (message, False)
+            else:
+                wire = (json.dumps(decode_frame(message)).encode("utf-8"), True)
+            self._wire[codec] = wire
+        return wire
+
+def subscribe(name, topics):
+    """Adds local client name as a subscriber of each topic."""
+    topics = [topic for topic in topics if isinstance(topic, str)]
+    for topic in topics:
+        subscribers.setdefault(topic, set()).add(name)
+        client_topics.setdefault(name, set()).add(topic)
+    if topics and shard_peers is not None:
+        shard_peers.announce_subscriptions(name, topics, True)
+
+def unsubscribe(name, topics=None):
+    """Removes name from each topic, or from all of its topics by default."""
+    held = client_topics.get(name, set())
+    topics = list(held) if topics is None else [topic for topic in topics if topic in held]
+    for topic in topics:
+        held.discard(topic)
+        names = subscribers.get(topic)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del subscribers[topic]
+    if not held:
+        client_topics.pop(name, None)
+    if topics and shard_peers is not None:
+        shard_peers.announce_subscriptions(name, topics, False)
+
+def frame_topics(sender, message):
+    """Returns the topics a released frame is published on.
+
+    The topic of a frame is its source port, the sending node's name, as on
+    a source-addressed MVB. A bus-master process-data frame is sent by
+    "BusMaster" but carries the ports of several sources, so it is also
+    published on each of those ports.
+    """
+    if isinstance(message, (bytes, bytearray)):
+        ports = peek_ports(message)
+        return (sender, *ports) if ports else (sender,)
+    if isinstance(message, str):
+        if '"ports"' not in message:
+            return (sender,)
+        message = json.loads(message)
+    ports = message.get("ports")
+    return (sender, *(name for name, _ in ports)) if ports else (sender,)
+
+def fan_out(sender, target, message, lane):
+    """Queues a released frame for every local subscriber of its topics.
+
+    See frame_topics; ALL_TOPICS subscribers get every frame, and each
+    subscriber gets a frame once however many of its topics it matches.
+    The point-to-point target already has its copy and is skipped.
+    """
+    if not subscribers:
+        return
+    names = set(subscribers.get(ALL_TOPICS, ()))
+    for topic in frame_topics(sender, message):
+        names.update(subscribers.get(topic, ()))
+    publication = None
+    for name in names:
+        if name != target and name in connected_clients:
+            if publication is None:
+                publication = Publication(message)
+            client_outboxes[name].put(sender, publication, lane)
+
+class ClientOutbox:
+    """Released frames waiting to be written to one client, in priority lanes.
+
+    One writer task per client sends the most urgent frame first, so a
+    backlog of process data on a slow client never delays a command. Under
+    overload, readings are coalesced and the oldest frame of a full lane is
+    dropped.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lanes = PriorityLanes(CLIENT_LANE_CAPACITIES)
+        self.ready = asyncio.Event()
+        self.writer = None
+
+    def put(self, sender, message, lane):
+        priority, key = lane
+        dropped = self.lanes.put(priority, (sender, message), key)
+        if dropped is not None:
+            log.warning("[Server] Outbox for %s full; dropped frame from %s.", self.name, dropped[0])
+        self.ready.set()
+        if self.writer is None:
+            self.writer = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        while True:
+            item = self.lanes.get()
+            if item is None:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            websocket = connected_clients.get(self.name)
+            if websocket is None:
+                log.debug("[Server] Target %s not connected.", self.name)
+                continue
+            sender, message = item
+            await deliver(websocket, sender, self.name, message)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.cancel()
+
+def message_lane(message):
+    """Returns (priority, coalesce key) for a frame in any of its queued forms."""
+    if isinstance(message, (bytes, bytearray)):
+        return peek_lane(message)
+    return frame_lane(message if isinstance(message, dict) else json.loads(message))
+
+async def deliver(websocket, sender, target, message):
+    """Sends one released frame to its target.
+
+    Latency-stamped frames arrive here still decoded (JSON) or as a mutable
+    bytearray (binary), so the delivery stamp can be added before sending.
+    A Publication is already serialised and is sent as is.
+    """
+    if isinstance(message, Publication):
+        data, text = message.wire(client_codecs.get(target))
+        try:
+            await websocket.send(data, text=text)
+            log.debug("[Server] Message from %s published to %s.", sender, target)
+        except websockets.exceptions.ConnectionClosed:
+            log.debug("[Server] Target %s disconnected before delivery.", target)
+        return
+    if isinstance(message, dict):
+        message["stamps"][SERVER_DELIVER] = time.time_ns()
+        message = json.dumps(message)
+    elif isinstance(message, bytearray):
+        set_stamp(message, SERVER_DELIVER, time.time_ns())
+        message = bytes(message)
+    if isinstance(message, bytes) and client_codecs.get(target) != CODEC_NAME:
+        message = json.dumps(decode_frame(message))
+    try:
+        await websocket.send(message)
+        log.debug("[Server] Message from %s delivered to %s.", sender, target)
+    except websockets.exceptions.ConnectionClosed:
+        log.debug("[Server] Target %s disconnected before delivery.", target)
+
+class ShardPeers:
+    """Unix-socket links from this shard to every other shard of the server.
+
+    Shards announce clients as they join and leave, so each one knows which
+    shard holds every remote client. A frame for a remote client is
+    forwarded to that shard once its delay has elapsed, and the receiving
+    shard delivers it at once. Subscriptions are announced the same way; a
+    published frame crosses to each shard with subscribers once, and that
+    shard fans it out to its own clients.
+    """
+
+    RECORD = struct.Struct("!BBI")  # record type, origin shard, payload length
+    JOIN, LEAVE, FRAME, SUBSCRIBE, UNSUBSCRIBE, PUBLISH = range(6)
+    TEXT, BINARY, STAMPED_JSON, STAMPED_BINARY = range(4)  # Forwarded frame kinds
+
+    def __init__(self, index, count, socket_dir):
+        self.index = index
+        self.count = count
+        self.socket_dir = socket_dir
+        self.writers = {}  # shard -> StreamWriter for records sent to it
+        self.remote_clients = {}  # client name -> shard holding it
+        self.remote_subscribers = {}  # topic -> {client name: shard holding it}
+
+    def socket_path(self, shard):
+        return os.path.join(self.socket_dir, f"shard{shard}.sock")
+
+    async def start(self):
+        """Listens for peer links, then connects to every other shard."""
+        await asyncio.start_unix_server(self._serve_peer, path=self.socket_path(self.index))
+        await asyncio.gather(*(self._connect(shard) for shard in range(self.count) if shard != self.index))
+
+    async def _connect(self, shard):
+        while True:
+            try:
+                _, writer = await asyncio.open_unix_connection(self.socket_path(shard))
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(0.05)
+        self.writers[shard] = writer
+        # Bring the new peer up to date with clients that joined before the link
+        for name in connected_clients.names():
+            self._send(writer, self.JOIN, name.encode("utf-8"))
+        for name, topics in client_topics.items():
+            self._send(writer, self.SUBSCRIBE, json.dumps([name, sorted(topics)]).encode("utf-8"))
+
+    def _send(self, writer, record_type, payload):
+        writer.write(self.RECORD.pack(record_type, self.index, len(payload)) + payload)
+
+    def _broadcast(self, record_type, payload):
+        for writer in self.writers.values():
+            self._send(writer, record_type, payload)
+
+    def announce_join(self, name):
+        self.remote_clients.pop(name, None)
+        self._broadcast(self.JOIN, name.encode("utf-8"))
+
+    def announce_leave(self, name):
+        self._broadcast(self.LEAVE, name.encode("utf-8"))
+
+    def announce_subscriptions(self, name, topics, subscribed):
+        record_type = self.SUBSCRIBE if subscribed else self.UNSUBSCRIBE
+        self._broadcast(record_type, json.dumps([name, list(topics)]).encode("utf-8"))
+
+    def forward(self, sender, target, message):
+        """Sends a released frame to the shard holding target; False if none does."""
+        shard = self.remote_clients.get(target)
+        writer = self.writers.get(shard)
+        if writer is None:
+            return False
+        self._send(writer, self.FRAME, self._frame_payload(sender, target, message))
+        return True
+
+    def publish(self, sender, target, message):
+        """Sends a released frame once to every other shard with subscribers of its topics."""
+        if not self.remote_subscribers:
+            return
+        shards = set()
+        for topic in (ALL_TOPICS, *frame_topics(sender, message)):
+            names = self.remote_subscribers.get(topic)
+            if names:
+                shards.update(names.values())
+        if not shards:
+            return
+        payload = self._frame_payload(sender, target, message)
+        for shard in shards:
+            writer = self.writers.get(shard)
+            if writer is not None:
+                self._send(writer, self.PUBLISH, payload)
+
+    def _frame_payload(self, sender, target, message):
+        if isinstance(message, dict):
+            kind, body = self.STAMPED_JSON, json.dumps(message).encode("utf-8")
+        elif isinstance(message, bytearray):
+            kind, body = self.STAMPED_BINARY, bytes(message)
+        elif isinstance(message, bytes):
+            kind, body = self.BINARY, message
+        else:
+            kind, body = self.TEXT, message.encode("utf-8")
+        names = json.dumps([sender, target]).encode("utf-8")
+        return struct.pack("!BH", kind, len(names)) + names + body
+
+    async def _serve_peer(self, reader, writer):
+        try:
+            while True:
+                record_type, shard, length = self.RECORD.unpack(await reader.readexactly(self.RECORD.size))
+                payload = await reader.readexactly(length)
+                if record_type == self.JOIN:
+                    self.remote_clients[payload.decode("utf-8")] = shard
+                elif record_type == self.LEAVE:
+                    name = payload.decode("utf-8")
+                    if self.remote_clients.get(name) == shard:
+                        del self.remote_clients[name]
+                    self._drop_subscriptions(name, shard, list(self.remote_subscribers))
+                elif record_type == self.SUBSCRIBE:
+                    name, topics = json.loads(payload)
+                    for topic in topics:
+                        self.remote_subscribers.setdefault(topic, {})[name] = shard
+                elif record_type == self.UNSUBSCRIBE:
+                    name, topics = json.loads(payload)
+                    self._drop_subscriptions(name, shard, topics)
+                elif record_type == self.FRAME:
+                    self._receive_frame(payload)
+                elif record_type == self.PUBLISH:
+                    self._receive_frame(payload, published=True)
+        except asyncio.IncompleteReadError:
+            pass
+
+    def _drop_subscriptions(self, name, shard, topics):
+        for topic in topics:
+            names = self.remote_subscribers.get(topic)
+            if names is not None and names.get(name) == shard:
+                del names[name]
+                if not names:
+                    del self.remote_subscribers[topic]
+
+    def _receive_frame(self, payload, published=False):
+        kind, names_length = struct.unpack_from("!BH", payload)
+        offset = struct.calcsize("!BH")
+        sender, target = json.loads(payload[offset:offset + names_length])
+        body = payload[offset + names_length:]
+        if kind == self.STAMPED_JSON:
+            message = json.loads(body)
+        elif kind == self.STAMPED_BINARY:
+            message = bytearray(body)
+        elif kind == self.BINARY:
+            message = bytes(body)
+        else:
+            message = body.decode("utf-8")
+        if published:
+            fan_out(sender, target, message, message_lane(message))
+        elif target in connected_clients:
+            client_outboxes[target].put(sender, message, message_lane(message))
+        else:
+            log.debug("[Server] Target %s not connected.", target)
+
+    def directory(self):
+        """Returns {client name: shard} for every client on any shard."""
+        view = dict(self.remote_clients)
+        view.update((name, self.index) for name in connected_clients.names())
+        return view
 
 async def handler(websocket, path=None):  # path now defaults to None
     register_message = await websocket.recv()
     reg_data = json.loads(register_message)
     node_name = reg_data.get("register")
     connected_clients[node_name] = websocket
-    print(f"[Server] {node_name} connected.")
+    if node_name not in client_outboxes:
+        client_outboxes[node_name] = ClientOutbox(node_name)
+    if "codec" in reg_data:
+        codec = CODEC_NAME if reg_data["codec"] == CODEC_NAME else "json"
+        client_codecs[node_name] = codec
+        await websocket.send(json.dumps({"codec": codec}))
+    if shard_peers is not None:
+        shard_peers.announce_join(node_name)
+    unsubscribe(node_name)  # A reconnect brings its own subscription list
+    subscribe(node_name, reg_data.get("subscribe", ()))
+    log.info("[Server] %s connected.", node_name)
 
     try:
         async for message in websocket:
-            data = json.loads(message)
+            # Binary telegrams are routed from their header alone
+            if isinstance(message, bytes):
+                sender, target = peek_route(message)
+                lane = peek_lane(message)
+                if is_stamped(message):
+                    message = bytearray(message)
+                    set_stamp(message, SERVER_RECEIVE, time.time_ns())
+            else:
+                data = json.loads(message)
+                # Subscription changes are for the server, not the bus
+                if "subscribe" in data or "unsubscribe" in data:
+                    subscribe(node_name, data.get("subscribe", ()))
+                    unsubscribe(node_name, data.get("unsubscribe", ()))
+                    continue
+                sender, target = data.get("sender"), data.get("target")
+                lane = frame_lane(data)
+                if "stamps" in data:
+                    data["stamps"][SERVER_RECEIVE] = time.time_ns()
+                    message = data
             # Simulate packet loss
-            if random.random() < PACKET_LOSS_PROB:
-                print(f"[Server] Packet dropped: {data}")
+            if rng.random() < PACKET_LOSS_PROB:
+                log.debug("[Server] Packet dropped: %s -> %s", sender, target)
                 continue
-            # Simulate network delay
-            delay = random.uniform(MIN_DELAY, MAX_DELAY)
-            await asyncio.sleep(delay)
-            target = data.get("target")
-            if target in connected_clients:
-                await connected_clients[target].send(message)
-                print(f"[Server] Message from {data.get('sender')} delivered to {target}.")
-            else:
-                print(f"[Server] Target {target} not connected.")
+            # Simulate network delay without stalling this receive loop
+            delay = rng.uniform(MIN_DELAY, MAX_DELAY)
+            delivery_queue.schedule(delay, sender, target, message, lane)
     except websockets.exceptions.ConnectionClosed:
-        print(f"[Server] {node_name} disconnected.")
+        log.info("[Server] %s disconnected.", node_name)
     finally:
-        if node_name in connected_clients:
-            del connected_clients[node_name]
+        # A reconnect under the same name may already have replaced this socket
+        if connected_clients.get(node_name) is websocket:
+            connected_clients.remove(node_name)
+            unsubscribe(node_name)
+            client_codecs.pop(node_name, None)
+            client_outboxes.pop(node_name).close()
+            if shard_peers is not None:
+                shard_peers.announce_leave(node_name)
+
+async def main(host="localhost", port=8765):
+    async with websockets.serve(handler, host, port):
+        log.info("[Server] MVB Server started on ws://%s:%d", host, port)
+        await asyncio.Future()  # run forever
 
-async def main():
-    async with websockets.serve(handler, "localhost", 8765):
-        print("[Server] MVB Server started on ws://localhost:8765")
+async def shard_main(index, count, host, port, socket_dir):
+    """Runs one shard: a websocket server sharing the port, plus its peer links."""
+    global shard_peers
+    shard_peers = ShardPeers(index, count, socket_dir)
+    async with websockets.serve(handler, host, port, reuse_port=True):
+        await shard_peers.start()
+        log.info("[Server] Shard %d/%d serving ws://%s:%d", index, count, host, port)
         await asyncio.Future()  # run forever
 
+def run_shard(index, count, host, port, socket_dir, loss, min_delay, max_delay, seed, log_level="INFO"):
+    """Process entry point for one shard."""
+    global PACKET_LOSS_PROB, MIN_DELAY, MAX_DELAY, rng
+    configure_logging(log_level)  # The parent's console sink thread does not survive the fork
+    PACKET_LOSS_PROB, MIN_DELAY, MAX_DELAY = loss, min_delay, max_delay
+    rng = component_rng(seed, f"server{index}")
+    asyncio.run(shard_main(index, count, host, port, socket_dir))
+
+def serve_sharded(workers, host, port, seed=None, log_level="INFO"):
+    """Runs the server as one process per worker, all accepting on the same port.
+
+    The kernel spreads new connections across shards via SO_REUSEPORT, and
+    the shards forward frames to each other over Unix sockets. Ctrl-C or
+    SIGTERM stops every shard and removes their socket directory.
+    """
+    with tempfile.TemporaryDirectory(prefix="mvb_shards_") as socket_dir:
+        shards = [
+            multiprocessing.Process(
+                target=run_shard,
+                args=(index, workers, host, port, socket_dir, PACKET_LOSS_PROB, MIN_DELAY, MAX_DELAY, seed, log_level),
+                daemon=True
+            )
+            for index in range(workers)
+        ]
+        for shard in shards:
+            shard.start()
+        # Installed after the shards start, so they keep the default SIGTERM behaviour
+        previous = signal.signal(signal.SIGTERM, _raise_shutdown)
+        try:
+            for shard in shards:
+                shard.join()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+            for shard in shards:
+                if shard.is_alive():
+                    shard.terminate()
+            for shard in shards:
+                shard.join(SHARD_STOP_TIMEOUT)
+                if shard.is_alive():
+                    shard.kill()
+                    shard.join()
+
+def _raise_shutdown(signum, frame):
+    raise SystemExit(0)
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="MVB bus relay server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, help="seed for packet loss and delay draws")
+    parser.add_argument("--loss", type=float, default=PACKET_LOSS_PROB, help="packet loss probability")
+    parser.add_argument("--min-delay", type=float, default=MIN_DELAY, help="minimum delivery delay in seconds")
+    parser.add_argument("--max-delay", type=float, default=MAX_DELAY, help="maximum delivery delay in seconds")
+    parser.add_argument("--workers", type=int, default=1, help="shard across this many processes")
+    parser.add_argument("--log-level", choices=LEVEL_MAP, default="INFO",
+                        help="DEBUG logs every delivered and dropped frame")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+    install_fault_dump()
+    PACKET_LOSS_PROB, MIN_DELAY, MAX_DELAY = args.loss, args.min_delay, args.max_delay
+    if args.workers > 1:
+        serve_sharded(args.workers, args.host, args.port, args.seed, args.log_level)
+    else:
+        if args.seed is not None:
+            rng.seed(args.seed)
+        asyncio.run(main(args.host, args.port))
@@ -1,5 +1,12 @@
 # network_bus.py
-"""Network communication module simulating an MVB bus using websockets."""
+"""Network communication module simulating an MVB bus using websockets.
+
+A bus URI of the form shm://<bus> selects the shared-memory transport
+instead, for nodes running as processes on the same host.
+
+The loss and delay model, the headless loopback bus and the bus master
+live in bus_model, which needs none of this module's network imports.
+"""
 
 import asyncio
 import json
@@ -7,69 +14,194 @@ import random
 import time
 import websockets
 import queue
-import pygame
 import logging
-from constants import RED, BLACK
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+from log_pipeline import get_logger, parse_level
+from mvb_codec import CODEC_NAME, encode_frame, decode_frame
+from latency import new_stamps, SEND, RECEIVE
+from messages import frame_lane, LANE_NAMES
+from priority_lanes import PriorityLanes
+from shm_transport import ShmConnection
+from bus_model import (PACKET_LOSS_PROB, MIN_DELAY, MAX_DELAY, SERVER_PACKET_LOSS_PROB, SERVER_MIN_DELAY,
+                       SERVER_MAX_DELAY)
 
-# Default configuration
-PACKET_LOSS_PROB = 0.05
-MIN_DELAY = 0.1
-MAX_DELAY = 0.5
+# Connection manager parameters
+# Frames held per priority lane (safety, command, process data) before the oldest is dropped
+OUTBOUND_LANE_CAPACITIES = (256, 256, 1024)
+RECONNECT_BASE_DELAY = 0.1  # Seconds; doubles per failed attempt
+RECONNECT_MAX_DELAY = 5.0
 
 class NetworkMVB_Bus:
-    """Manages network communication for the TCMS simulation."""
+    """Manages network communication for the TCMS simulation.
+
+    One connection manager task owns the connection: it connects, and after
+    a drop reconnects with exponential backoff and jitter. Sends never
+    connect themselves; once their simulated delay has passed, frames wait
+    in bounded priority lanes, and one writer task drains them, most urgent
+    first, whenever the bus is connected. Frames sent during a brief outage
+    are delivered after the reconnect.
+    """
     
-    def __init__(self, node_name, uri="ws://localhost:8765", debug_level="DEBUG"):
+    def __init__(self, node_name, uri="ws://localhost:8765", debug_level=None, codec="json", rng=None,
+                 instrument=False, lane_capacities=OUTBOUND_LANE_CAPACITIES, topics=()):
         self.node_name = node_name
+        self.rng = rng if rng is not None else random.Random()  # Packet loss, delay and backoff draws
+        self.instrument = instrument  # Stamp frames at each hop for latency tracking
         self.uri = uri
         self.websocket = None
+        self.codec = codec  # Wire format requested at registration
+        self.binary = False  # True once the server has accepted the binary codec
+        self.topics = set(topics)  # Source ports whose frames the server also sends here ("*" for all)
         self.transmissions = []  # For message animation
         self.received_messages = queue.Queue()  # Thread-safe queue for received messages
+        # Called with each received frame instead of queueing it, when the
+        # consumer runs on the bus's own event loop
+        self.on_message = None
+
+        # Connection manager state, bound to the event loop on first use
+        self.outbound = PriorityLanes(lane_capacities)  # Frames waiting for the writer
+        self._loop = None
+        self._outbound_ready = None  # Set while outbound holds frames
+        self._connected = None  # Set while self.websocket is usable
+        self._lost = None  # Set when the connection drops
+        self._manager = None  # Connection manager task
+        self._writer = None  # Writer task
+        self.stats = {"connects": 0, "disconnects": 0, "failed_attempts": 0, "sent": 0, "dropped": 0}
+        self.last_error = None
+        self.connected_since = None
+        self.backoff = 0.0  # Delay before the next reconnect attempt
         
-        # Setup logger for this instance
-        self.logger = logging.getLogger(f"NetworkBus.{node_name}")
+        # Setup logger for this instance; without a level it follows the log pipeline's
+        self.logger = get_logger(f"bus.{node_name}")
         self.set_debug_level(debug_level)
 
     def set_debug_level(self, level):
-        """Set the debug level for this instance."""
-        level_map = {
-            "DEBUG": logging.DEBUG,
-            "INFO": logging.INFO,
-            "WARNING": logging.WARNING,
-            "ERROR": logging.ERROR,
-            "CRITICAL": logging.CRITICAL,
-            "OFF": logging.CRITICAL + 10  # Higher than any standard level
-        }
-        
-        numeric_level = level_map.get(level.upper(), logging.INFO)
-        self.logger.setLevel(numeric_level)
-        self.debug_enabled = numeric_level <= logging.DEBUG
+        """Set the debug level for this instance (None to follow the log pipeline)."""
+        self.logger.setLevel(logging.NOTSET if level is None else parse_level(level))
+
+    @property
+    def debug_enabled(self):
+        """True if debug records are kept; guards building debug arguments on hot paths."""
+        return self.logger.isEnabledFor(logging.DEBUG)
         
     async def connect(self):
-        """Establishes a websocket connection to the server."""
+        """Makes one attempt to connect to the server, or join a shared-memory bus.
+
+        Returns True on success. Reconnecting is the connection manager's job;
+        other code should await wait_connected() instead.
+        """
         try:
+            if self.uri.startswith("shm://"):
+                # No relay process: the connection applies the server hop's loss and delay itself
+                self.websocket = ShmConnection(self.uri, self.node_name, SERVER_PACKET_LOSS_PROB,
+                                               SERVER_MIN_DELAY, SERVER_MAX_DELAY, rng=self.rng)
+                self.binary = True
+                self.logger.info("Joined shared-memory bus at %s", self.uri)
+                if self.topics:
+                    self.logger.warning("Subscriptions need the relay server; ignored on %s", self.uri)
+                return True
             self.websocket = await websockets.connect(self.uri)
-            await self.websocket.send(json.dumps({"register": self.node_name}))
-            self.logger.info(f"Connected to network bus at {self.uri}")
+            registration = {"register": self.node_name}
+            if self.topics:
+                registration["subscribe"] = sorted(self.topics)
+            if self.codec == CODEC_NAME:
+                registration["codec"] = self.codec
+                await self.websocket.send(json.dumps(registration))
+                ack = json.loads(await self.websocket.recv())
+                self.binary = ack.get("codec") == CODEC_NAME
+            else:
+                await self.websocket.send(json.dumps(registration))
+                self.binary = False
+            self.logger.info("Connected to network bus at %s (%s)", self.uri, CODEC_NAME if self.binary else "json")
+            return True
         except Exception as e:
-            self.logger.error(f"Connection error: {e}")
+            self.logger.error("Connection error: %s", e)
+            self.last_error = str(e)
             self.websocket = None
+            return False
+
+    def _start(self):
+        """Creates the queue and starts the manager and writer tasks on the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._outbound_ready = asyncio.Event()
+        if self.outbound:
+            self._outbound_ready.set()
+        self._connected = asyncio.Event()
+        self._lost = asyncio.Event()
+        self._manager = loop.create_task(self._manage_connection())
+        self._writer = loop.create_task(self._drain_outbound())
+
+    async def _manage_connection(self):
+        """Keeps the bus connected, backing off exponentially between failed attempts."""
+        attempt = 0
+        while True:
+            if self.websocket is not None:
+                attempt = 0
+                self.backoff = 0.0
+                self._lost.clear()
+                self._connected.set()
+                await self._lost.wait()
+                continue
+            if attempt:
+                # Full jitter keeps many clients from reconnecting in lockstep
+                self.backoff = self.rng.uniform(0, min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt))
+                self.logger.info("Reconnecting in %.2f sec (attempt %d)", self.backoff, attempt + 1)
+                await asyncio.sleep(self.backoff)
+            if await self.connect():
+                self.stats["connects"] += 1
+                self.connected_since = time.time()
+            else:
+                self.stats["failed_attempts"] += 1
+                attempt += 1
 
-    async def send_message(self, sender, target, message, real_target=None):
-        """Sends a message over the network with simulated delay and packet loss."""
-        if self.websocket is None:
-            await self.connect()
-        if self.websocket is None:
-            self.logger.warning("Unable to connect; message not sent.")
+    def _connection_lost(self, websocket):
+        """Marks websocket as dead; the first caller to notice starts the reconnect."""
+        if websocket is None or self.websocket is not websocket:
             return
+        self.websocket = None
+        self.connected_since = None
+        self.stats["disconnects"] += 1
+        self._connected.clear()
+        self._lost.set()
+
+    async def wait_connected(self):
+        """Waits until the connection manager has a usable connection."""
+        self._start()
+        await self._connected.wait()
+
+    def health(self):
+        """Returns a snapshot of connection state, queue depth and counters."""
+        if self.websocket is not None:
+            state = "connected"
+        elif self._manager is None:
+            state = "idle"
+        else:
+            state = "reconnecting"
+        return {
+            "state": state,
+            "uri": self.uri,
+            "codec": CODEC_NAME if self.binary else "json",
+            "connected_for": time.time() - self.connected_since if self.connected_since else 0.0,
+            "backoff": self.backoff,
+            "queued": dict(zip(LANE_NAMES, self.outbound.depths())),
+            "lane_dropped": dict(zip(LANE_NAMES, self.outbound.dropped)),
+            "lane_coalesced": dict(zip(LANE_NAMES, self.outbound.coalesced)),
+            "last_error": self.last_error,
+            **self.stats
+        }
+
+    def now_ns(self):
+        """Returns the time used for latency stamps, in nanoseconds."""
+        return time.time_ns()
+
+    async def send_message(self, sender, target, message, real_target=None, emitted_at=None):
+        """Sends a message over the network with simulated delay and packet loss.
 
+        emitted_at is when the caller produced the message (ns), so the
+        latency stamps include the handoff to this coroutine.
+        """
         effective_target = real_target if real_target is not None else target
         data = {
             "sender": sender,
@@ -80,57 +212,140 @@ class NetworkMVB_Bus:
 
         # Cache command messages locally for immediate processing
         if sender not in ["Speed", "Station", "Pass"]:
-            self.received_messages.put(data.copy())
+            self._deliver(data.copy())
 
-        if random.random() < PACKET_LOSS_PROB:
-            self.logger.debug(f"Packet lost: {data}")
+        if self.instrument:
+            data["stamps"] = new_stamps(emitted_at if emitted_at is not None else self.now_ns())
+        await self._transmit(data)
+
+    async def send_process_data(self, frame, emitted_at=None):
+        """Sends one bus-master cycle, built by process_data_frame, as a single frame."""
+        if self.instrument:
+            frame["stamps"] = new_stamps(emitted_at if emitted_at is not None else self.now_ns())
+        await self._transmit(frame)
+
+    async def _transmit(self, data):
+        """Applies packet loss and delay, then queues a frame in its priority lane for the writer."""
+        self._start()
+        if self.rng.random() < PACKET_LOSS_PROB:
+            self.logger.debug("Packet lost: %s", data)
             return
 
-        delay = random.uniform(MIN_DELAY, MAX_DELAY)
-        self.logger.debug(f"Delaying packet to {effective_target} by {delay:.2f} sec: {message}")
+        delay = self.rng.uniform(MIN_DELAY, MAX_DELAY)
+        self.logger.debug("Delaying packet to %s by %.2f sec: %s", data["real_target"], delay, data["message"])
         await asyncio.sleep(delay)
+        priority, key = frame_lane(data)
+        dropped = self.outbound.put(priority, data, key)
+        self._outbound_ready.set()
+        if dropped is not None:
+            self.stats["dropped"] += 1
+            self.logger.warning("Outbound %s lane full; dropped %s → %s: %s", LANE_NAMES[priority],
+                                dropped["sender"], dropped["real_target"], dropped["message"])
+
+    async def _drain_outbound(self):
+        """Writer task: sends queued frames by priority, holding the head frame across reconnects."""
+        while True:
+            data = self.outbound.get()
+            if data is None:
+                self._outbound_ready.clear()
+                await self._outbound_ready.wait()
+                continue
+            while True:
+                await self._connected.wait()
+                websocket = self.websocket
+                try:
+                    await self._write(websocket, data)
+                    break
+                except (websockets.ConnectionClosed, ConnectionError):
+                    self.logger.warning("Connection closed while sending message.")
+                    self._connection_lost(websocket)
+                except BufferError as e:
+                    self.stats["dropped"] += 1
+                    self.logger.warning("Message dropped: %s", e)
+                    break
+
+    async def _write(self, websocket, data):
+        sender, effective_target, message = data["sender"], data["real_target"], data["message"]
+        if "stamps" in data:
+            data["stamps"][SEND] = self.now_ns()
+        frame = encode_frame(data) if self.binary else None
+        await websocket.send(frame if frame is not None else json.dumps(data))
+        self.stats["sent"] += 1
+
+        self.logger.debug("Sent: %s → %s: %s", sender, effective_target, message)
+        self.transmissions.append({
+            "sender": sender,
+            "target": effective_target,
+            "message": message,
+            "progress": 0.0,
+            "start_x": None,
+            "end_x": None
+        })
+
+    async def subscribe(self, *topics):
+        """Asks the server for a copy of every frame sent from these ports.
+
+        Subscriptions are kept across reconnects; while disconnected they
+        are sent with the next registration.
+        """
+        await self._update_subscriptions("subscribe", set(topics) - self.topics)
+        self.topics.update(topics)
+
+    async def unsubscribe(self, *topics):
+        """Stops the copies of frames from these ports."""
+        await self._update_subscriptions("unsubscribe", self.topics & set(topics))
+        self.topics.difference_update(topics)
+
+    async def _update_subscriptions(self, change, topics):
+        websocket = self.websocket
+        if not topics or websocket is None or isinstance(websocket, ShmConnection):
+            return
         try:
-            await self.websocket.send(json.dumps(data))
-
-            self.logger.debug(f"Sent: {sender} → {effective_target}: {message}")
-            self.transmissions.append({
-                "sender": sender,
-                "target": effective_target,
-                "message": message,
-                "progress": 0.0,
-                "start_x": None,
-                "end_x": None
-            })
-        except websockets.ConnectionClosed:
-            self.logger.warning("Connection closed while sending message.")
-            self.websocket = None
+            await websocket.send(json.dumps({change: sorted(topics)}))
+        except (websockets.ConnectionClosed, ConnectionError):
+            self._connection_lost(websocket)  # Re-sent with the next registration
 
     async def receive_message(self):
-        """Receives a message from the websocket server."""
-        if self.websocket is None:
-            await self.connect()
-        if self.websocket is None:
-            return None
+        """Receives a message from the websocket server, waiting for a connection if needed."""
+        await self.wait_connected()
+        websocket = self.websocket
         try:
-            message = await self.websocket.recv()
-            data = json.loads(message)
-            self.logger.debug(f"Received: {data.get('sender', 'unknown')} → {data.get('real_target', data.get('target', 'unknown'))}: {data.get('message', '')}")
+            message = await websocket.recv()
+            data = decode_frame(message) if isinstance(message, bytes) else json.loads(message)
+            if "stamps" in data:
+                data["stamps"][RECEIVE] = self.now_ns()
+            if self.debug_enabled:
+                self.logger.debug("Received: %s → %s: %s", data.get("sender", "unknown"),
+                                  data.get("real_target", data.get("target", "unknown")), data.get("message", ""))
             return data
-        except websockets.ConnectionClosed:
+        except (websockets.ConnectionClosed, ConnectionError):
             self.logger.warning("Connection closed during recv().")
-            self.websocket = None
+            self._connection_lost(websocket)
             return None
 
+    def _deliver(self, data):
+        if self.on_message is not None:
+            self.on_message(data)
+        else:
+            self.received_messages.put(data)
+
     async def listen(self):
         """Continuously listens for incoming messages."""
         while True:
             msg = await self.receive_message()
             if msg:
-                self.received_messages.put(msg)
-            else:
-                self.logger.info("Attempting to reconnect...")
-                await asyncio.sleep(1)
-                await self.connect()
+                self._deliver(msg)
+
+    async def close(self):
+        """Stops the connection manager and writer and closes the connection."""
+        for task in (self._manager, self._writer):
+            if task is not None:
+                task.cancel()
+        self._manager = self._writer = None
+        self._loop = None
+        websocket, self.websocket = self.websocket, None
+        if websocket is not None:
+            await websocket.close()
 
     def update_transmissions(self, delta_time):
         """Updates the progress of message transmission animations."""
@@ -138,16 +353,5 @@ class NetworkMVB_Bus:
         for t in self.transmissions[:]:
             t["progress"] += delta_time / TRANSMISSION_TIME
             if t["progress"] >= 1.0:
-                self.logger.debug(f"Transmission complete: {t['sender']} → {t['target']}: {t['message']}")
+                self.logger.debug("Transmission complete: %s → %s: %s", t["sender"], t["target"], t["message"])
                 self.transmissions.remove(t)
-
-    def draw_transmissions(self, screen, font):
-        """Draws animated message transmissions on the screen."""
-        bus_y = 500
-        for t in self.transmissions:
-            if t["start_x"] is None or t["end_x"] is None:
-                continue
-            current_x = t["start_x"] + (t["end_x"] - t["start_x"]) * t["progress"]
-            pygame.draw.circle(screen, RED, (int(current_x), bus_y), 5)
-            label = font.render(t["message"], True, BLACK)
-            screen.blit(label, (current_x - 20, bus_y - 20))
\ No newline at end of file
@@ -1,9 +1,15 @@
 # nodes.py
-"""Node classes for sensors, actuators, and control unit in the TCMS simulation."""
+"""Node classes for sensors, actuators, and control unit in the TCMS simulation.
+
+The draw methods import pygame when first called, so headless runs never load it.
+"""
 
-import pygame
-import time
 from constants import NUM_DOORS, CRUISING_SPEED, BLUE, PURPLE, BLACK, RED, GRAY, MAX_PASSENGERS
+from sim_clock import WallClock
+from messages import decode_message, MessageDispatcher, SpeedReading, DoorState, PassengerCount, StationState
+from log_pipeline import get_logger
+
+log = get_logger("nodes")
 
 class Node:
     """Base class for all nodes in the simulation."""
@@ -15,6 +21,7 @@ class Node:
 
     def draw(self, screen, font):
         """Draws the node on the screen."""
+        import pygame
         node_y = 450
         pygame.draw.circle(screen, self.color, (int(self.x), node_y), 20)
         pygame.draw.line(screen, BLACK, (int(self.x), node_y), (int(self.x), node_y + 50), 2)
@@ -36,7 +43,7 @@ class SensorNode(Node):
             msg = self.read_state_func()
             if msg != self.last_value:
                 send_message_func(self.name, "Control", msg)
-                print(f"[Sensor {self.name}] Sent message: {msg}")
+                log.debug("[Sensor %s] Sent message: %s", self.name, msg)
                 self.last_value = msg
             self.last_send_time = current_time
 
@@ -50,16 +57,19 @@ class ActuatorNode(Node):
 
     def receive_message(self, message):
         """Processes received messages if they are new."""
+        if isinstance(message, str):
+            message = decode_message(message)
         if message != self.last_message:
-            print(f"[Actuator {self.name}] Received message: {message}")
+            log.debug("[Actuator %s] Received message: %s", self.name, message)
             self.set_state_func(message)
             self.last_message = message
 
 class ControlUnitNode(Node):
     """Node for user interaction and train control."""
     
-    def __init__(self, name):
+    def __init__(self, name, clock=None):
         super().__init__(name, color=PURPLE)
+        self.clock = clock if clock is not None else WallClock()
         self.current_speed = 0.0
         self.door_states = [False] * NUM_DOORS
         self.brakes_applied = False
@@ -70,24 +80,36 @@ class ControlUnitNode(Node):
         self.last_commands = {}
         self.approaching_station = False
         self.emergency_stops_count = 0
+        self.dispatcher = MessageDispatcher({
+            SpeedReading: self.on_speed,
+            DoorState: self.on_door_state,
+            PassengerCount: self.on_passenger_count,
+            StationState: self.on_station_state,
+        })
 
     def receive_message(self, message):
         """Updates control unit state based on received messages."""
-        print(f"[Control Unit {self.name}] Received message: {message}")
-        if "Speed:" in message:
-            self.current_speed = float(message.split(":")[1])
-        elif "Door" in message:
-            door_num = int(message.split(":")[0][-1])
-            self.door_states[door_num] = "Open" in message.split(":")[1]
-        elif "Passengers:" in message:
-            self.passengers = int(message.split(":")[1])
-        elif "Station:" in message:
-            self.at_station = "Yes" in message.split(":")[1]
+        if isinstance(message, str):
+            message = decode_message(message)
+        log.debug("[Control Unit %s] Received message: %s", self.name, message)
+        self.dispatcher.dispatch(message)
+
+    def on_speed(self, message):
+        self.current_speed = message.speed
+
+    def on_door_state(self, message):
+        self.door_states[message.door] = message.is_open
+
+    def on_passenger_count(self, message):
+        self.passengers = message.count
+
+    def on_station_state(self, message):
+        self.at_station = message.at_station
 
     def send_command(self, target, message, send_message_func):
         """Sends a command if not recently sent."""
         command_key = f"{target}:{message}"
-        current_time = pygame.time.get_ticks() / 1000.0
+        current_time = self.clock.now()
         if command_key not in self.last_commands or current_time - self.last_commands[command_key] > 1.0:
             send_message_func(self.name, target, message)
             self.last_commands[command_key] = current_time
@@ -104,8 +126,8 @@ class ControlUnitNode(Node):
                     if train.at_station:
                         train.at_station = False
                         train.leaving_station = True
-                        train.leaving_station_time = time.time()
-                        print("[Control] Manually leaving station, setting cooldown")
+                        train.leaving_station_time = train.clock.now()
+                        log.info("[Control] Manually leaving station, setting cooldown")
             else:
                 self.display_message = "Cannot start with doors open"
         elif button == "Apply Brakes":
@@ -142,12 +164,16 @@ class ControlUnitNode(Node):
                 self.emergency_stop = True
                 self.display_message = "EMERGENCY STOP ACTIVATED"
 
-    def draw_interface(self, screen, font, buttons):
-        """Draws the control unit interface with buttons and status."""
+    def draw_buttons(self, screen, font, buttons):
+        """Draws the control unit buttons."""
+        import pygame
         for name, rect in buttons.items():
             pygame.draw.rect(screen, GRAY, rect)
             label = font.render(name, True, BLACK)
             screen.blit(label, (rect.x + 10, rect.y + 5))
+
+    def draw_interface(self, screen, font):
+        """Draws the control unit status and returns the rects drawn."""
         status_texts = [
             f"Speed: {self.current_speed:.1f} km/h",
             f"Brakes: {'On' if self.brakes_applied else 'Off'}",
@@ -156,7 +182,8 @@ class ControlUnitNode(Node):
             f"Passengers: {self.passengers}/{MAX_PASSENGERS}",
             f"At Station: {'Yes' if self.at_station else 'No'}"
         ]
-        for i, text in enumerate(status_texts):
-            screen.blit(font.render(text, True, BLACK), (50, 50 + i * 30))
+        rects = [screen.blit(font.render(text, True, BLACK), (50, 50 + i * 30))
+                 for i, text in enumerate(status_texts)]
         if self.display_message:
-            screen.blit(font.render(self.display_message, True, RED), (50, 230))
\ No newline at end of file
+            rects.append(screen.blit(font.render(self.display_message, True, RED), (50, 230)))
+        return rects
@@ -0,0 +1,58 @@
+# priority_lanes.py
+"""Bounded priority lanes used by the bus client and server outbound queues.
+
+Frames are taken from the most urgent non-empty lane first and in FIFO
+order within a lane. Each lane has its own capacity, so a flood of process
+data can never crowd out a command. A frame put with a coalesce key
+replaces the queued frame with the same key in place, and a full lane
+drops its oldest frame to make room for the newest.
+"""
+
+from collections import deque
+
+class PriorityLanes:
+    """FIFO lanes indexed by priority (0 is most urgent)."""
+
+    def __init__(self, capacities):
+        self.capacities = tuple(capacities)
+        self.lanes = [deque() for _ in self.capacities]
+        self.keyed = {}  # coalesce key -> queued entry
+        self.dropped = [0] * len(self.capacities)
+        self.coalesced = [0] * len(self.capacities)
+
+    def put(self, priority, item, key=None):
+        """Queues item; returns the item dropped to make room, if any."""
+        if key is not None:
+            entry = self.keyed.get(key)
+            if entry is not None:
+                entry[1] = item
+                self.coalesced[priority] += 1
+                return None
+        lane = self.lanes[priority]
+        dropped = None
+        if len(lane) >= self.capacities[priority]:
+            old_key, dropped = lane.popleft()
+            if old_key is not None:
+                del self.keyed[old_key]
+            self.dropped[priority] += 1
+        entry = [key, item]
+        lane.append(entry)
+        if key is not None:
+            self.keyed[key] = entry
+        return dropped
+
+    def get(self):
+        """Removes and returns the most urgent item, or None when all lanes are empty."""
+        for lane in self.lanes:
+            if lane:
+                key, item = lane.popleft()
+                if key is not None:
+                    del self.keyed[key]
+                return item
+        return None
+
+    def depths(self):
+        return [len(lane) for lane in self.lanes]
+
+    def __len__(self):
+        return sum(len(lane) for lane in self.lanes)
@@ -0,0 +1,72 @@
+# registry.py
+"""Registry of bus participants indexed by name and numeric address."""
+
+from mvb_codec import node_id
+
+class NodeRegistry:
+    """Holds bus participants with O(1) lookup by name or numeric address.
+
+    The simulation registers its nodes here and the server registers client
+    websockets, so both route a frame with a single dictionary lookup.
+    Iterating a registry yields the registered entries in insertion order.
+    """
+
+    def __init__(self, entries=()):
+        self.by_name = {}
+        self.by_address = {}
+        self.addresses = {}  # name -> address it was registered under
+        for entry in entries:
+            self.add(entry.name, entry)
+
+    def add(self, name, entry, address=None):
+        """Registers entry under name and its numeric address (from mvb_codec by default)."""
+        if address is None:
+            address = node_id(name)
+        self.remove(name)
+        self.by_name[name] = entry
+        if address is not None:
+            self.by_address[address] = entry
+            self.addresses[name] = address
+
+    def remove(self, name, entry=None):
+        """Unregisters name, but only if it still maps to entry when one is given."""
+        current = self.by_name.get(name)
+        if current is None or (entry is not None and current is not entry):
+            return
+        del self.by_name[name]
+        address = self.addresses.pop(name, None)
+        # Another name may have taken the address over since
+        if address is not None and self.by_address.get(address) is current:
+            del self.by_address[address]
+
+    def get(self, name, default=None):
+        """Returns the entry registered under name."""
+        return self.by_name.get(name, default)
+
+    def get_by_address(self, address, default=None):
+        """Returns the entry registered under a numeric address."""
+        return self.by_address.get(address, default)
+
+    def names(self):
+        """Returns the registered names."""
+        return self.by_name.keys()
+
+    def __getitem__(self, name):
+        return self.by_name[name]
+
+    def __setitem__(self, name, entry):
+        self.add(name, entry)
+
+    def __delitem__(self, name):
+        if name not in self.by_name:
+            raise KeyError(name)
+        self.remove(name)
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __iter__(self):
+        return iter(self.by_name.values())
+
+    def __len__(self):
+        return len(self.by_name)
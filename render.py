@@ -0,0 +1,85 @@
+# render.py
+"""Render pipeline with a cached static layer, cached text and dirty-rect updates."""
+
+from collections import OrderedDict
+import pygame
+
+class CachedFont:
+    """Wraps a pygame font and keeps an LRU cache of rendered text surfaces.
+
+    render() has the same signature as pygame.font.Font.render, so drawing
+    code can take either one.
+    """
+
+    def __init__(self, font, maxsize=512):
+        self.font = font
+        self.maxsize = maxsize
+        self.surfaces = OrderedDict()
+
+    def render(self, text, antialias, color, background=None):
+        """Returns the surface for text, rendering it only on a cache miss."""
+        key = (text, antialias, tuple(color), background and tuple(background))
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.font.render(text, antialias, color, background)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.maxsize:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+    def size(self, text):
+        return self.font.size(text)
+
+class LayeredRenderer:
+    """Draws a frame as a cached static layer plus dynamic elements.
+
+    The static layer is rendered once into a background surface. Each frame,
+    the areas dynamic elements covered last frame are restored from it, the
+    dynamic elements are drawn, and only those rects are pushed to the
+    display.
+    """
+
+    def __init__(self, screen, font):
+        self.screen = screen
+        self.font = font if isinstance(font, CachedFont) else CachedFont(font)
+        self.background = None
+        self.dirty_rects = []
+        self.update_rects = None  # Rects present() pushes to the display; None for the whole screen
+
+    def invalidate(self):
+        """Forces the static layer to be redrawn on the next frame."""
+        self.background = None
+
+    def draw_frame(self, draw_static, draw_dynamic):
+        """Draws one frame and pushes it to the display."""
+        self.draw(draw_static, draw_dynamic)
+        self.present()
+
+    def draw(self, draw_static, draw_dynamic):
+        """Draws one frame onto the screen surface, without updating the display.
+
+        draw_static(surface, font) draws the static layer. draw_dynamic(surface,
+        font) draws everything else and returns the rects it touched.
+        """
+        if self.background is None:
+            self.background = pygame.Surface(self.screen.get_size()).convert()
+            draw_static(self.background, self.font)
+            self.screen.blit(self.background, (0, 0))
+            self.dirty_rects = draw_dynamic(self.screen, self.font)
+            self.update_rects = None
+            return
+
+        for rect in self.dirty_rects:
+            self.screen.blit(self.background, rect, rect)
+        rects = draw_dynamic(self.screen, self.font)
+        self.update_rects = self.dirty_rects + rects
+        self.dirty_rects = rects
+
+    def present(self):
+        """Pushes what the last draw() changed to the display."""
+        if self.update_rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.update_rects)
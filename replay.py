@@ -0,0 +1,103 @@
+# replay.py
+"""Compact append-only run log of operator button presses and delivered bus frames.
+
+The log starts with a magic string, then holds records of the form
+
+    record type (B) | time (d) | payload length (H) | payload
+
+The first record is a JSON header with the run parameters (seed, dt, ...).
+Button records carry the button name. Frame records carry a binary MVB
+telegram, or the frame's JSON when a node has no numeric ID.
+"""
+
+import json
+import struct
+from mvb_codec import encode_frame, decode_frame
+
+MAGIC = b"TCMSLOG1"
+RECORD = struct.Struct("!BdH")
+
+HEADER_RECORD = 0
+BUTTON_RECORD = 1
+FRAME_RECORD = 2
+
+def encode_logged_frame(frame):
+    """Returns the compact bytes stored for a delivered frame."""
+    telegram = encode_frame(frame)
+    return telegram if telegram is not None else json.dumps(frame).encode("utf-8")
+
+def decode_logged_frame(payload):
+    """Rebuilds a frame dict from its logged bytes."""
+    if payload[:1] == b"{":
+        return json.loads(payload)
+    return decode_frame(payload)
+
+class Recorder:
+    """Appends button presses and delivered frames to a run log."""
+
+    def __init__(self, path, metadata):
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self._write(HEADER_RECORD, 0.0, json.dumps(metadata).encode("utf-8"))
+
+    def _write(self, record_type, record_time, payload):
+        self.file.write(RECORD.pack(record_type, record_time, len(payload)))
+        self.file.write(payload)
+
+    def record_button(self, record_time, button):
+        """Logs an operator button press."""
+        self._write(BUTTON_RECORD, record_time, button.encode("utf-8"))
+
+    def record_frame(self, record_time, frame):
+        """Logs a frame handed to the nodes."""
+        self._write(FRAME_RECORD, record_time, encode_logged_frame(frame))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class MemoryRecorder:
+    """Recorder that keeps events in lists, used to check a replay against its log."""
+
+    def __init__(self):
+        self.buttons = []
+        self.frames = []
+
+    def record_button(self, record_time, button):
+        self.buttons.append((record_time, button))
+
+    def record_frame(self, record_time, frame):
+        # Store the logged encoding so comparisons match what a log would hold
+        self.frames.append((record_time, decode_logged_frame(encode_logged_frame(frame))))
+
+def read_log(path):
+    """Reads a run log and returns (metadata, buttons, frames).
+
+    buttons is a list of (time, button) and frames a list of (time, frame dict).
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a TCMS run log")
+
+    metadata, buttons, frames = None, [], []
+    offset = len(MAGIC)
+    while offset + RECORD.size <= len(data):
+        record_type, record_time, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if offset + length > len(data):
+            break  # Record cut short by a crash mid-write
+        payload = data[offset:offset + length]
+        offset += length
+        if record_type == HEADER_RECORD:
+            metadata = json.loads(payload)
+        elif record_type == BUTTON_RECORD:
+            buttons.append((record_time, payload.decode("utf-8")))
+        elif record_type == FRAME_RECORD:
+            frames.append((record_time, decode_logged_frame(payload)))
+    return metadata, buttons, frames
@@ -0,0 +1,15 @@
+# rng_streams.py
+"""Seeded random streams, one per simulation component."""
+
+import random
+
+def component_rng(seed, component):
+    """Returns a Random stream for component derived from a run seed.
+
+    Each component draws from its own stream, so adding draws in one place
+    does not shift the numbers another component sees. A seed of None gives
+    an unseeded stream.
+    """
+    if seed is None:
+        return random.Random()
+    return random.Random(f"{seed}:{component}")
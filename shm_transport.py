@@ -0,0 +1,287 @@
+# shm_transport.py
+"""Shared-memory bus transport for nodes running on the same host.
+
+Each node owns an inbox: a ring of fixed-size slots in a
+multiprocessing.shared_memory segment named after the bus and the node.
+Senders write binary telegrams straight into the target's inbox, with no
+socket and no relay process in between. The relay's packet loss and delay
+model is kept: the sender draws the loss and stamps each slot with a
+deliver-at time, and the receiver holds the frame until then.
+
+Ring layout (native byte order):
+
+    write index (Q) | read index (Q) | slot count (I) | slot size (I) | slots...
+
+and each slot is
+
+    deliver at (d, time.monotonic) | kind (B) | length (I) | frame bytes
+
+Any number of processes may write to an inbox; they serialise on a lock
+file whose descriptor each writer opens once. Only the owning node reads
+it. After each write the sender rings the inbox's doorbell, a FIFO the
+reader waits on with the event loop, so an idle reader costs nothing.
+The owner holds an exclusive lock on a third file for as long as the
+inbox is open, so a second node joining under the same name fails
+instead of resetting a live inbox.
+"""
+
+import asyncio
+import fcntl
+import heapq
+import itertools
+import json
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+from urllib.parse import urlparse
+from mvb_codec import peek_route
+
+RING_HEADER = struct.Struct("=QQII")
+SLOT_HEADER = struct.Struct("=dBI")
+WRITE_INDEX = struct.Struct("=Q")
+READ_INDEX_OFFSET = 8
+
+TEXT_FRAME = 0
+BINARY_FRAME = 1
+
+DEFAULT_SLOTS = 4096
+DEFAULT_SLOT_SIZE = 256
+IDLE_POLL = 0.25  # Seconds an idle reader waits before checking its inbox without a doorbell
+
+def attach_segment(name):
+    """Opens an existing segment without registering it with this process's resource tracker.
+
+    A registered segment is unlinked by the tracker when the process exits,
+    and unregistering it again afterwards would drop the owner's own
+    registration whenever the two processes share a tracker.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    tracker = shared_memory.resource_tracker
+    shared_memory.resource_tracker = SimpleNamespace(register=lambda name, rtype: None)
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        shared_memory.resource_tracker = tracker
+
+def claim_owner_lock(path):
+    """Takes the lock file marking a ring's owner for as long as the returned descriptor stays open.
+
+    Raises FileExistsError when another live process owns the ring. A
+    crashed owner's lock is released by the kernel, so its leftovers can
+    be taken over.
+    """
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise FileExistsError(f"Shared-memory ring {path} is owned by a live process") from None
+        try:
+            # The previous owner may have removed the file between our open and flock
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+class RingBuffer:
+    """A fixed-slot ring in a named shared-memory segment."""
+
+    def __init__(self, name, create=False, slots=DEFAULT_SLOTS, slot_size=DEFAULT_SLOT_SIZE):
+        self.name = name
+        size = RING_HEADER.size + slots * slot_size
+        self.owner_fd = None
+        if create:
+            self.owner_path = os.path.join(tempfile.gettempdir(), f"{name}.owner")
+            self.owner_fd = claim_owner_lock(self.owner_path)
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # No live owner holds the lock, so the segment was left behind by a
+                # process that did not shut down cleanly; reuse it
+                self.shm = shared_memory.SharedMemory(name=name)
+            RING_HEADER.pack_into(self.shm.buf, 0, 0, 0, slots, slot_size)
+        else:
+            self.shm = attach_segment(name)
+        _, _, self.slots, self.slot_size = RING_HEADER.unpack_from(self.shm.buf, 0)
+        self.owner = create
+        self.lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        self.lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.bell_path = os.path.join(tempfile.gettempdir(), f"{name}.bell")
+        self.bell_fd = None  # Writers open it on first use
+        if create:
+            try:
+                os.mkfifo(self.bell_path, 0o600)
+            except FileExistsError:
+                pass  # Left behind like the segment; reuse it so attached writers keep ringing it
+            # Read-write, so the FIFO never reports end of file while no writer has it open
+            self.bell_fd = os.open(self.bell_path, os.O_RDWR | os.O_NONBLOCK)
+
+    def put(self, deliver_at, kind, frame):
+        """Appends a frame and rings the doorbell; returns False if the ring is full."""
+        if SLOT_HEADER.size + len(frame) > self.slot_size:
+            raise BufferError(f"Frame of {len(frame)} bytes does not fit a {self.slot_size}-byte slot")
+        buf = self.shm.buf
+        fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+        try:
+            write_index, read_index, _, _ = RING_HEADER.unpack_from(buf, 0)
+            if write_index - read_index >= self.slots:
+                return False
+            offset = RING_HEADER.size + (write_index % self.slots) * self.slot_size
+            SLOT_HEADER.pack_into(buf, offset, deliver_at, kind, len(frame))
+            start = offset + SLOT_HEADER.size
+            buf[start:start + len(frame)] = frame
+            # Publish only after the slot is fully written
+            WRITE_INDEX.pack_into(buf, 0, write_index + 1)
+        finally:
+            fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+        self.ring_bell()
+        return True
+
+    def ring_bell(self):
+        if self.bell_fd is None:
+            try:
+                self.bell_fd = os.open(self.bell_path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                return  # No reader yet; it finds the frame on its next idle poll
+        try:
+            os.write(self.bell_fd, b"\0")
+        except BlockingIOError:
+            pass  # The pipe is full, so the reader is already woken
+        except OSError:
+            os.close(self.bell_fd)  # The reader went away; reopen for the next one
+            self.bell_fd = None
+
+    def clear_bell(self):
+        """Empties the doorbell; call before drain() so no later ring is lost."""
+        try:
+            while os.read(self.bell_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def drain(self):
+        """Yields (deliver_at, kind, frame) for every slot written since the last drain."""
+        buf = self.shm.buf
+        write_index, read_index, _, _ = RING_HEADER.unpack_from(buf, 0)
+        while read_index < write_index:
+            offset = RING_HEADER.size + (read_index % self.slots) * self.slot_size
+            deliver_at, kind, length = SLOT_HEADER.unpack_from(buf, offset)
+            start = offset + SLOT_HEADER.size
+            yield deliver_at, kind, bytes(buf[start:start + length])
+            read_index += 1
+            WRITE_INDEX.pack_into(buf, READ_INDEX_OFFSET, read_index)
+
+    def close(self):
+        self.shm.close()
+        os.close(self.lock_fd)
+        if self.bell_fd is not None:
+            os.close(self.bell_fd)
+            self.bell_fd = None
+        if self.owner:
+            self.shm.unlink()
+            # The owner lock goes last, so no new owner can start while the rest is removed
+            for path in (self.lock_path, self.bell_path, self.owner_path):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            os.close(self.owner_fd)
+            self.owner_fd = None
+
+class ShmConnection:
+    """Stands in for a websocket connection on a shared-memory bus.
+
+    Offers the send/recv/close calls NetworkMVB_Bus uses on a websocket.
+    send() applies the relay hop's loss and delay, then writes into the
+    target node's inbox.
+    """
+
+    def __init__(self, uri, node_name, loss_prob, min_delay, max_delay, rng=None, poll_interval=IDLE_POLL):
+        self.bus = urlparse(uri).netloc or "mvb"
+        self.node_name = node_name
+        self.loss_prob = loss_prob
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.rng = rng if rng is not None else random.Random()
+        self.poll_interval = poll_interval  # Longest wait without a doorbell, in case a ring was missed
+        self.inbox = RingBuffer(self.inbox_name(node_name), create=True)
+        self.outboxes = {}  # target name -> RingBuffer attached to its inbox
+        self.pending = []  # Heap of (deliver_at, seq, kind, frame) not yet due
+        self._seq = itertools.count()
+        self._bell = None  # asyncio.Event set when the inbox's doorbell rings
+        self._loop = None
+        self.closed = False
+
+    def inbox_name(self, node_name):
+        return f"mvb_{self.bus}_{node_name}"
+
+    def _outbox(self, target):
+        ring = self.outboxes.get(target)
+        if ring is None:
+            try:
+                ring = RingBuffer(self.inbox_name(target))
+            except FileNotFoundError:
+                return None  # Target not on the bus
+            self.outboxes[target] = ring
+        return ring
+
+    async def send(self, message):
+        """Routes one frame to its target's inbox, or drops it like the relay would."""
+        if isinstance(message, bytes):
+            kind, frame = BINARY_FRAME, message
+            _, target = peek_route(message)
+        else:
+            kind, frame = TEXT_FRAME, message.encode("utf-8")
+            target = json.loads(message).get("target")
+        if self.rng.random() < self.loss_prob:
+            return
+        ring = self._outbox(target)
+        if ring is None:
+            return
+        deliver_at = time.monotonic() + self.rng.uniform(self.min_delay, self.max_delay)
+        if not ring.put(deliver_at, kind, frame):
+            raise BufferError(f"Inbox of {target} is full")
+
+    async def recv(self):
+        """Returns the next frame that is due, sleeping until one is or the doorbell rings."""
+        if self._bell is None:
+            self._bell = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+            self._loop.add_reader(self.inbox.bell_fd, self._bell.set)
+        while not self.closed:
+            self._bell.clear()
+            self.inbox.clear_bell()
+            for deliver_at, kind, frame in self.inbox.drain():
+                heapq.heappush(self.pending, (deliver_at, next(self._seq), kind, frame))
+            now = time.monotonic()
+            if self.pending and self.pending[0][0] <= now:
+                _, _, kind, frame = heapq.heappop(self.pending)
+                return frame if kind == BINARY_FRAME else frame.decode("utf-8")
+            wait = self.poll_interval
+            if self.pending:
+                wait = min(wait, self.pending[0][0] - now)
+            try:
+                await asyncio.wait_for(self._bell.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        raise ConnectionError("Shared-memory connection closed")
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._bell is not None:
+            self._loop.remove_reader(self.inbox.bell_fd)
+            self._bell.set()  # Wake a waiting recv() so it reports the close
+        for ring in self.outboxes.values():
+            ring.close()
+        self.outboxes = {}
+        self.inbox.close()
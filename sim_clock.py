@@ -0,0 +1,26 @@
+# sim_clock.py
+"""Clock sources shared by the train, nodes and network delay model."""
+
+import time
+
+class WallClock:
+    """Clock that follows real time."""
+
+    def now(self):
+        """Returns the current time in seconds."""
+        return time.time()
+
+class SimulatedClock:
+    """Clock that only moves when advanced, for headless runs."""
+
+    def __init__(self, start=0.0):
+        self.time = start
+
+    def now(self):
+        """Returns the current simulated time in seconds."""
+        return self.time
+
+    def advance(self, delta_time):
+        """Moves the clock forward by delta_time seconds."""
+        self.time += delta_time
+        return self.time
@@ -1,57 +1,166 @@
 # simulation.py
-"""Main simulation module for the TCMS with networked MVB communication."""
+"""Main simulation module for the TCMS with networked MVB communication.
+
+This is the headless core: importing it opens no window, starts no thread
+and connects to nothing. Interactive runs call start_network() (or
+attach_network() on their own loop) to put the simulation on the bus
+server; the pygame display lives in interactive, imported only when a
+window is wanted. The command line is in tcms; `python simulation.py`
+hands over to it.
+"""
 
-import pygame
 import time
 import threading
-import asyncio
-from network_bus import NetworkMVB_Bus
+import math
+from bus_model import LoopbackMVB_Bus, BusMaster
+from sim_clock import SimulatedClock
 from train import Train
+from track import load_track
+from event_engine import next_event_delay, train_acceleration, advance_train
 from nodes import SensorNode, ActuatorNode, ControlUnitNode
+from registry import NodeRegistry
+from replay import MemoryRecorder, read_log
+from rng_streams import component_rng
+from latency import tracker as latency_tracker, DISPATCH
+from log_pipeline import get_logger
+from messages import decode_message, MessageDispatcher, SetTargetSpeed, BrakeCommand, EmergencyStop, DoorCommand
 from constants import *
 
-# Setup asyncio event loop in a separate thread
-async_loop = asyncio.new_event_loop()
+log = get_logger("simulation")
+
+DEFAULT_URI = "ws://localhost:8765"  # Bus server joined by interactive runs
+
+class ThreadHandoff:
+    """Hands bus calls from the simulation thread to the bus thread in one batch per frame.
+
+    submit() only appends to a list; flush() crosses threads once, with
+    call_soon_threadsafe, and the bus loop starts every queued call as a task.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.pending = []
+        self.tasks = set()  # Keeps running sends referenced until they finish
+
+    def submit(self, func, *args, **kwargs):
+        self.pending.append((func, args, kwargs))
+
+    def flush(self):
+        if self.pending:
+            batch, self.pending = self.pending, []
+            self.loop.call_soon_threadsafe(self._start, batch)
+
+    def _start(self, batch):
+        for func, args, kwargs in batch:
+            task = self.loop.create_task(func(*args, **kwargs))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+class LoopHandoff(ThreadHandoff):
+    """Starts bus calls straight away when the simulation runs on the bus's own loop."""
+
+    def submit(self, func, *args, **kwargs):
+        self._start([(func, args, kwargs)])
+
+    def flush(self):
+        pass
+
+# Bus the nodes send on: set by start_network or attach_network, or swapped in by run_headless
+network_bus = None
+bus_handoff = None  # How sends reach a NetworkMVB_Bus's event loop
+async_loop = None  # Event loop of the bus thread started by start_network
+bus_listener = None
+bus_master = None  # Latest BusMaster made by create_bus_master, for reporting its utilisation
 
 def start_async_loop(loop):
     """Start the asyncio event loop in a separate thread."""
+    import asyncio
     asyncio.set_event_loop(loop)
     loop.run_forever()
 
-threading.Thread(target=start_async_loop, args=(async_loop,), daemon=True).start()
-
-# Initialize network bus
-network_bus = NetworkMVB_Bus("SimulationBus")
-asyncio.run_coroutine_threadsafe(network_bus.listen(), async_loop)
+def start_network(uri=DEFAULT_URI, codec="json"):
+    """Connects the simulation to the bus server from a background event loop thread.
+
+    Returns the bus and its handoff; later calls return the running ones.
+    """
+    import asyncio  # Headless runs never need it
+    from network_bus import NetworkMVB_Bus
+    global network_bus, bus_handoff, async_loop, bus_listener
+    if async_loop is None:
+        async_loop = asyncio.new_event_loop()
+        threading.Thread(target=start_async_loop, args=(async_loop,), daemon=True).start()
+        network_bus = NetworkMVB_Bus("SimulationBus", uri, codec=codec)
+        bus_listener = asyncio.run_coroutine_threadsafe(network_bus.listen(), async_loop)
+        bus_handoff = ThreadHandoff(async_loop)
+    return network_bus, bus_handoff
+
+def stop_network(timeout=2.0):
+    """Closes the bus started by start_network and stops its event loop thread.
+
+    Closing releases the connection, so a shared-memory bus frees its
+    segments and lock files.
+    """
+    import asyncio
+    global network_bus, bus_handoff, async_loop, bus_listener
+    if async_loop is None:
+        return
+
+    async def shutdown():
+        # The listener, the bus's own tasks and any sends still waiting out their delay
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await network_bus.close()
+
+    asyncio.run_coroutine_threadsafe(shutdown(), async_loop).result(timeout)
+    async_loop.call_soon_threadsafe(async_loop.stop)
+    network_bus = bus_handoff = async_loop = bus_listener = None
+
+def attach_network(loop, uri=DEFAULT_URI, codec="json"):
+    """Connects the simulation to the bus server from loop, which also runs the simulation.
+
+    Use instead of start_network. Returns the bus and its handoff; the
+    caller starts the bus's listener on loop.
+    """
+    from network_bus import NetworkMVB_Bus
+    global network_bus, bus_handoff
+    network_bus = NetworkMVB_Bus("SimulationBus", uri, codec=codec)
+    bus_handoff = LoopHandoff(loop)
+    return network_bus, bus_handoff
 
 def send_network_message(sender, target, message):
     """Sends a network message asynchronously."""
-    asyncio.run_coroutine_threadsafe(
-        network_bus.send_message(sender, "SimulationBus", message, real_target=target), async_loop
-    )
-
-# Define button layout
-BUTTONS = {
-    "Start Moving": pygame.Rect(50, 10, 120, 30),
-    "Apply Brakes": pygame.Rect(180, 10, 120, 30),
-    "Release Brakes": pygame.Rect(310, 10, 120, 30),
-    "Open Doors": pygame.Rect(440, 10, 120, 30),
-    "Close Doors": pygame.Rect(570, 10, 120, 30),
-    "Emergency Stop": pygame.Rect(700, 10, 120, 30)
+    if isinstance(network_bus, LoopbackMVB_Bus):
+        network_bus.send_message(sender, "SimulationBus", message, real_target=target)
+        return
+    bus_handoff.submit(network_bus.send_message, sender, "SimulationBus", message, real_target=target,
+                       emitted_at=time.time_ns())
+
+def send_process_data(frame):
+    """Sends one bus-master cycle of process data asynchronously."""
+    if isinstance(network_bus, LoopbackMVB_Bus):
+        network_bus.send_process_data(frame)
+        return
+    bus_handoff.submit(network_bus.send_process_data, frame, emitted_at=time.time_ns())
+
+# Bus-master polling period per sensor port, in seconds
+PROCESS_DATA_PERIODS = {
+    "Speed": 0.064,
+    "Pass": 0.256,
+    "Station": 0.128,
 }
+DEFAULT_PROCESS_DATA_PERIOD = 0.128
+
+# Margin added to the stopping distance when deciding to brake for a station
+APPROACH_BUFFER = 20
 
-def initialize_pygame():
-    """Initialize pygame and setup the display."""
-    pygame.init()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("TCMS with Networked MVB Communication")
-    clock = pygame.time.Clock()
-    font = pygame.font.SysFont(None, 24)
-    return screen, clock, font
+# Control unit buttons, in display order
+BUTTON_NAMES = ("Start Moving", "Apply Brakes", "Release Brakes", "Open Doors", "Close Doors", "Emergency Stop")
 
-def create_train():
+def create_train(clock=None, rng=None, track=None):
     """Create and return a train instance."""
-    return Train()
+    return Train(clock, rng, track)
 
 def create_sensor_nodes(train):
     """Create and return all sensor nodes for the train."""
@@ -63,63 +172,68 @@ def create_sensor_nodes(train):
 
 def create_actuator_nodes(train):
     """Create and return all actuator nodes for the train."""
-    # Define actuator callbacks
+    # Define actuator handlers, keyed by message type
     def set_target_speed(msg):
-        if "Set Target Speed:" in msg:
-            train.target_speed = float(msg.split(":")[1])
-            print(f"[Traction] Setting target speed to {train.target_speed}")
+        train.target_speed = msg.speed
+        log.info("[Traction] Setting target speed to %s", train.target_speed)
 
     def set_brake_state(msg):
-        if msg == "Apply Brakes":
-            train.brakes_applied = True
-            print("[Brake] Brakes applied")
-        if msg == "Release Brakes":
-            train.brakes_applied = False
-            print("[Brake] Brakes released")
+        train.brakes_applied = msg.applied
+        log.info("[Brake] Brakes %s", "applied" if msg.applied else "released")
 
     def set_emergency_state(msg):
-        if  "Emergency Stop" in msg:
-            train.emergency_stop = True
-            train.target_speed = 0
-            print("[Emergency] Emergency stop activated")
+        train.emergency_stop = True
+        train.target_speed = 0
+        log.warning("[Emergency] Emergency stop activated")
 
     def set_door_state(msg, door_idx):
-        if f"Open Door{door_idx}" in msg:
-            train.doors[door_idx] = True
-            print(f"[Door{door_idx}] Door opened")
-        elif f"Close Door{door_idx}" in msg:
-            train.doors[door_idx] = False
-            print(f"[Door{door_idx}] Door closed")
-
-    traction_actuator = ActuatorNode("Traction", set_target_speed)
-    brake_actuator = ActuatorNode("Brake", set_brake_state)
-    emergency_actuator = ActuatorNode("Emerg", set_emergency_state)
-    door_actuators = [ActuatorNode(f"DoorActuator{i}", lambda msg, i=i: set_door_state(msg, i)) for i in range(NUM_DOORS)]
+        if msg.door != door_idx:
+            return
+        train.doors[door_idx] = msg.open
+        log.info("[Door%d] Door %s", door_idx, "opened" if msg.open else "closed")
+
+    traction_actuator = ActuatorNode("Traction", MessageDispatcher({SetTargetSpeed: set_target_speed}))
+    brake_actuator = ActuatorNode("Brake", MessageDispatcher({BrakeCommand: set_brake_state}))
+    emergency_actuator = ActuatorNode("Emerg", MessageDispatcher({EmergencyStop: set_emergency_state}))
+    door_actuators = [ActuatorNode(f"DoorActuator{i}", MessageDispatcher({DoorCommand: lambda msg, i=i: set_door_state(msg, i)}))
+                      for i in range(NUM_DOORS)]
     
     return traction_actuator, brake_actuator, emergency_actuator, door_actuators
 
-def create_control_unit():
+def create_control_unit(clock=None):
     """Create and return the control unit node."""
-    return ControlUnitNode("Control")
+    return ControlUnitNode("Control", clock)
 
-def position_nodes(nodes):
-    """Position all nodes along the bus line."""
-    bus_start = 50
-    bus_end = WIDTH - 50
-    spacing = (bus_end - bus_start) / (len(nodes) - 1)
-    for i, node in enumerate(nodes):
-        node.x = bus_start + i * spacing
+def create_nodes(train, clock=None):
+    """Create all nodes and return the sensors, control unit and node registry."""
+    speed_sensor, door_sensors, passenger_sensor, station_sensor = create_sensor_nodes(train)
+    traction_actuator, brake_actuator, emergency_actuator, door_actuators = create_actuator_nodes(train)
+    control_unit = create_control_unit(clock)
+
+    nodes = NodeRegistry([speed_sensor] + door_sensors + [passenger_sensor, station_sensor,
+                          traction_actuator, brake_actuator, emergency_actuator] + door_actuators + [control_unit])
+    sensors = (speed_sensor, door_sensors, passenger_sensor, station_sensor)
+    return sensors, control_unit, nodes
+
+def create_bus_master(sensors):
+    """Create a bus master polling every sensor as a process-data port."""
+    global bus_master
+    speed_sensor, door_sensors, passenger_sensor, station_sensor = sensors
+    bus_master = BusMaster(send_process_data)
+    for sensor in [speed_sensor] + door_sensors + [passenger_sensor, station_sensor]:
+        period = PROCESS_DATA_PERIODS.get(sensor.name, DEFAULT_PROCESS_DATA_PERIOD)
+        bus_master.register_port(sensor.name, sensor.read_state_func, period)
+    return bus_master
 
 def handle_station_approach(train, control_unit):
     """Handle automated station approach logic."""
     if not train.at_station and not train.emergency_stop and not train.leaving_station:
-        current_pos = train.distance_traveled % (STATION_DISTANCE * 3)
-        distances_to_stations = [(pos - current_pos) % (STATION_DISTANCE * 3) for pos in [0, STATION_DISTANCE, STATION_DISTANCE * 2]]
-        distance_to_next_stop = min([dist for dist in distances_to_stations if dist > 0], default=STATION_DISTANCE)
+        distance_to_next_stop = train.track.distance_to_next_station(train.distance_traveled)
+        if distance_to_next_stop is None:
+            return  # End of an open line
         stopping_distance = (train.speed ** 2) / (2 * DECELERATION)
-        buffer = 20
         
-        if distance_to_next_stop <= (stopping_distance + buffer) and train.speed > 2:
+        if distance_to_next_stop <= (stopping_distance + APPROACH_BUFFER) and train.speed > 2:
             if not control_unit.approaching_station:
                 control_unit.approaching_station = True
                 control_unit.send_command("Brake", "Apply Brakes", send_network_message)
@@ -133,20 +247,6 @@ def handle_station_approach(train, control_unit):
             control_unit.approaching_station = False
             control_unit.display_message = "Arrived at station"
 
-def handle_events(control_unit, train, current_time):
-    """Handle pygame events."""
-    message_timer = 0
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            return False, message_timer
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            pos = event.pos
-            for name, rect in BUTTONS.items():
-                if rect.collidepoint(pos):
-                    control_unit.on_button_click(name, train, send_network_message)
-                    message_timer = current_time + 2
-    return True, message_timer
-
 def update_sensors(speed_sensor, door_sensors, passenger_sensor, station_sensor, current_time):
     """Update all sensor nodes."""
     speed_sensor.update(current_time, send_network_message)
@@ -155,15 +255,30 @@ def update_sensors(speed_sensor, door_sensors, passenger_sensor, station_sensor,
     passenger_sensor.update(current_time, send_network_message)
     station_sensor.update(current_time, send_network_message)
 
-def process_network_messages(network_bus, nodes):
+def process_network_messages(network_bus, nodes, recorder=None, current_time=0.0, telemetry=None):
     """Process all pending network messages."""
     while not network_bus.received_messages.empty():
-        msg = network_bus.received_messages.get()
-        intended_target = msg.get("real_target", msg.get("target"))
-        for node in nodes:
-            if hasattr(node, 'receive_message') and node.name == intended_target:
-                node.receive_message(msg["message"])
-                break
+        dispatch_frame(network_bus, nodes, network_bus.received_messages.get(), recorder, current_time, telemetry)
+
+def dispatch_frame(network_bus, nodes, msg, recorder=None, current_time=0.0, telemetry=None):
+    """Hands one received frame to its target node."""
+    if recorder:
+        recorder.record_frame(current_time, msg)
+    if telemetry:
+        telemetry.record_frame(current_time, msg)
+    intended_target = msg.get("real_target", msg.get("target"))
+    receive_message = getattr(nodes.get(intended_target), "receive_message", None)
+    if receive_message is None:
+        return
+    stamps = msg.get("stamps")
+    if stamps:
+        stamps[DISPATCH] = network_bus.now_ns()
+        latency_tracker.record(msg["sender"], intended_target, stamps)
+    if "ports" in msg:
+        for _, message in msg["ports"]:
+            receive_message(decode_message(message))
+    else:
+        receive_message(decode_message(msg["message"]))
 
 def handle_station_actions(train, control_unit, previous_at_station):
     """Handle actions when arriving at stations."""
@@ -175,140 +290,106 @@ def handle_station_actions(train, control_unit, previous_at_station):
         train.board_passengers()
     return train.at_station
 
-def update_positions(train, network_bus, nodes):
-    """Update positions of train and message transmissions."""
-    train_x = 50 + (train.distance_traveled % (STATION_DISTANCE * 3))
-    network_bus.update_transmissions(min(1/60, 0.1))  # Cap delta_time at 1/60 for consistent animation
-    
-    # Update transmission positions
-    for t in network_bus.transmissions:
-        sender_node = next((n for n in nodes if n.name == t["sender"]), None)
-        target_node = next((n for n in nodes if n.name == t["target"]), None)
-        if sender_node and target_node:
-            t["start_x"] = sender_node.x
-            t["end_x"] = target_node.x
-        elif sender_node:
-            # Find control unit if real target not found
-            control_unit = next((n for n in nodes if n.name == "Control"), None)
-            if control_unit:
-                t["start_x"] = sender_node.x
-                t["end_x"] = control_unit.x
-    
-    return train_x
-
-def draw_environment(screen, font, train_x, train):
-    """Draw the simulation environment (track, stations, train)."""
-    screen.fill(WHITE)
-    # Draw bus line
-    pygame.draw.line(screen, BLACK, (50, 500), (WIDTH - 50, 500), 3)
-    # Draw track
-    pygame.draw.line(screen, BLACK, (50, 600), (WIDTH - 50, 600), 5)
-    
-    # Draw stations
-    for i in range(3):
-        station_x = 50 + i * STATION_DISTANCE
-        is_at_station = train.at_station and abs(train_x - station_x) < 15
-        color = YELLOW if is_at_station else GRAY
-        pygame.draw.rect(screen, color, (station_x - 10, 590, 20, 20))
-        screen.blit(font.render(f"Station {i+1}", True, BLACK), (station_x - 30, 610))
-    
-    # Draw train
-    pygame.draw.rect(screen, BLACK, (train_x, 550, 200, 50))
-    # Draw doors
-    door_positions = [train_x + 20 + i * 45 for i in range(NUM_DOORS)]
-    for i, pos in enumerate(door_positions):
-        color = RED if train.doors[i] else GREEN
-        pygame.draw.rect(screen, color, (pos, 550, 30, 50))
-    # Draw speed indicator
-    screen.blit(font.render(f"{train.speed:.1f} km/h", True, WHITE), (train_x + 50, 570))
-
-def draw_debug_info(screen, font, train_x, train):
-    """Draw debug information."""
-    debug_info = [
-        f"Speed: {train.speed:.2f}",
-        f"Target: {train.target_speed:.2f}",
-        f"Brakes: {'On' if train.brakes_applied else 'Off'}",
-        f"Emerg: {'On' if train.emergency_stop else 'Off'}",
-        f"At Station: {'Yes' if train.at_station else 'No'}",
-        f"Leaving Station: {'Yes' if train.leaving_station else 'No'}",
-        f"Distance: {train.distance_traveled:.2f}",
-        f"Passengers: {train.passengers}/{MAX_PASSENGERS}",
-        f"Doors: {sum(train.doors)} Open, {NUM_DOORS - sum(train.doors)} Closed"
-    ]
-    for i, text in enumerate(debug_info):
-        screen.blit(font.render(text, True, BLACK), (train_x + 50, 770 - (i+1) * 20))
-
-def main():
-    """Runs the TCMS simulation."""
-    screen, clock, font = initialize_pygame()
-    train = create_train()
-    
-    # Create nodes
-    speed_sensor, door_sensors, passenger_sensor, station_sensor = create_sensor_nodes(train)
-    traction_actuator, brake_actuator, emergency_actuator, door_actuators = create_actuator_nodes(train)
-    control_unit = create_control_unit()
-    
-    # Compile all nodes into a list
-    nodes = [speed_sensor] + door_sensors + [passenger_sensor, station_sensor, 
-             traction_actuator, brake_actuator, emergency_actuator] + door_actuators + [control_unit]
-    
-    # Position nodes along the bus
-    position_nodes(nodes)
-    
-    running = True
-    message_timer = 0
-    previous_at_station = False
-    last_frame_time = time.time()
-
-    while running:
-        current_time = pygame.time.get_ticks() / 1000.0
-        now = time.time()
-        delta_time = min(now - last_frame_time, 0.1)  # Cap delta_time to avoid physics issues
-        last_frame_time = now
-
-        # Handle station approach logic
-        handle_station_approach(train, control_unit)
-
-        # Handle events
-        running, new_message_timer = handle_events(control_unit, train, current_time)
-        if new_message_timer > 0:
-            message_timer = new_message_timer
-
-        # Update sensors
-        update_sensors(speed_sensor, door_sensors, passenger_sensor, station_sensor, current_time)
-
-        # Process network messages
-        process_network_messages(network_bus, nodes)
-
-        # Update train and handle station actions
-        train.update(delta_time)
-        previous_at_station = handle_station_actions(train, control_unit, previous_at_station)
-
-        # Clear message display if timer expired
-        if current_time > message_timer:
-            control_unit.display_message = ""
-
-        # Update positions of train and message transmissions
-        train_x = update_positions(train, network_bus, nodes)
-
-        # Draw everything
-        draw_environment(screen, font, train_x, train)
-        draw_debug_info(screen, font, train_x, train)
-        
-        # Draw network communication
-        network_bus.draw_transmissions(screen, font)
-        
-        # Draw all nodes
-        for node in nodes:
-            node.draw(screen, font)
-        
-        # Draw control interface
-        control_unit.draw_interface(screen, font, BUTTONS)
-
-        pygame.display.flip()
-        clock.tick(60)
-
-    pygame.quit()
+def run_headless(duration, dt=1/60, script=(), clock=None, use_bus_master=False, seed=None, recorder=None,
+                 instrument=False, track=None, event_driven=False, telemetry=None, bus=None):
+    """Runs the simulation without a display on a fixed timestep.
+
+    The train, nodes and bus share one simulated clock that advances by dt
+    per tick, so the run goes as fast as the CPU allows. script is an
+    iterable of (time, button) presses applied to the control unit. With a
+    seed, the train and bus draw from their own seeded streams and the run
+    is repeatable; a recorder receives every press and delivered frame.
+    instrument stamps frames with simulated hop times for the latency tracker.
+    track is the line to run on (default: the three-station loop).
+    event_driven jumps over quiet spans (see event_engine) instead of
+    ticking through them; the run keeps the same sequence of events but
+    not the fixed-step loop's exact timing, so it is not bit-exact.
+    A telemetry recorder receives the train state every tick (skipped spans
+    leave no rows) and every delivered bus frame. bus is the LoopbackMVB_Bus
+    to run on, for callers that read its counters afterwards (default: a new
+    one on clock, seeded from seed).
+    Returns the train, control unit and clock once duration has elapsed.
+    """
+    global network_bus
+    clock = clock if clock is not None else SimulatedClock()
+    train = create_train(clock, component_rng(seed, "train"), track)
+    sensors, control_unit, nodes = create_nodes(train, clock)
+    speed_sensor, door_sensors, passenger_sensor, station_sensor = sensors
+    all_sensors = [speed_sensor, *door_sensors, passenger_sensor, station_sensor]
+    bus_master = create_bus_master(sensors) if use_bus_master else None
+    presses = sorted(script)
+    next_press = 0
+
+    websocket_bus = network_bus
+    network_bus = bus if bus is not None else LoopbackMVB_Bus("SimulationBus", clock, rng=component_rng(seed, "bus"),
+                                                              instrument=instrument)
+    try:
+        previous_at_station = False
+        end_time = clock.now() + duration
+        while clock.now() < end_time:
+            current_time = clock.now()
+            handle_station_approach(train, control_unit)
+
+            while next_press < len(presses) and presses[next_press][0] <= current_time:
+                press_time, button = presses[next_press]
+                if recorder:
+                    recorder.record_button(press_time, button)
+                control_unit.on_button_click(button, train, send_network_message)
+                next_press += 1
+
+            if bus_master:
+                bus_master.poll(current_time)
+            else:
+                update_sensors(speed_sensor, door_sensors, passenger_sensor, station_sensor, current_time)
+            network_bus.deliver_due()
+            process_network_messages(network_bus, nodes, recorder, current_time, telemetry)
+
+            train.update(dt)
+            if telemetry:
+                telemetry.record_tick(current_time, train)
+            previous_at_station = handle_station_actions(train, control_unit, previous_at_station)
+            clock.advance(dt)
+
+            if event_driven:
+                next_press_time = presses[next_press][0] if next_press < len(presses) else math.inf
+                delay = next_event_delay(train, control_unit, all_sensors, network_bus, clock.now(),
+                                         next_press_time, APPROACH_BUFFER, bus_master)
+                ticks = int(min(delay, end_time - clock.now()) / dt)
+                if ticks > 1:
+                    advance_train(train, train_acceleration(train), ticks * dt, ticks)
+                    clock.advance(ticks * dt)
+    finally:
+        network_bus = websocket_bus
+    return train, control_unit, clock
+
+def replay_log(path):
+    """Re-runs a recorded run headless at full speed from its log.
+
+    Returns the train, control unit and whether the delivered frames
+    matched the log exactly. An interactive log was paced by the wall
+    clock and the live server, so it replays only as an approximate
+    script and the match is None.
+    """
+    metadata, buttons, frames = read_log(path)
+    duration = metadata.get("duration")
+    if duration is None:
+        # Interactive logs have no fixed length; run until just past the last event
+        duration = max((event_time for event_time, _ in buttons + frames), default=0.0) + 1.0
+    recorder = MemoryRecorder()
+    track = load_track(metadata["track"]) if metadata.get("track") else None
+    train, control_unit, _ = run_headless(duration, metadata.get("dt", 1/60), buttons,
+                                          use_bus_master=metadata.get("bus_master", False),
+                                          seed=metadata.get("seed"), recorder=recorder, track=track,
+                                          event_driven=metadata.get("event_driven", False),
+                                          instrument=metadata.get("instrument", False))
+    if metadata.get("mode") == "interactive":
+        return train, control_unit, None
+    return train, control_unit, recorder.frames == frames
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # The command line lives in tcms; hand over to it, reusing this module
+    # rather than loading simulation a second time under its own name
+    import runpy
+    import sys
+    sys.modules["simulation"] = sys.modules[__name__]
+    runpy.run_module("tcms", run_name="__main__")
@@ -0,0 +1,229 @@
+# sweep.py
+"""Parameter sweep runner for stopping accuracy and bus robustness.
+
+Runs the headless simulation once per point of a parameter grid and seed,
+fanned out over a process pool, and streams one CSV row per run as runs
+finish:
+
+    python sweep.py --param packet_loss=0,0.05,0.2 --param approach_buffer=10,20,30 --seeds 4
+
+Swept parameters (unswept ones keep their module defaults):
+
+- packet_loss, min_delay, max_delay: the client hop of the bus loss and
+  delay model (bus_model.PACKET_LOSS_PROB, MIN_DELAY, MAX_DELAY);
+- server_packet_loss: the server hop's loss (bus_model.SERVER_PACKET_LOSS_PROB),
+  so packet_loss=0,server_packet_loss=0 gives a lossless bus;
+- deceleration: the braking rate handle_station_approach plans its
+  stopping distance with (the train's brakes keep their own rate);
+- approach_buffer: the margin added to that stopping distance.
+
+Every run drives the train station to station with a fixed script and
+hits Emergency Stop while cruising on every EMERGENCY_EVERY-th leg. Each
+row reports the signed stopping error at every stop (positive past the
+station), the time from each emergency press to standstill, and how many
+Control commands and frames in total the bus lost.
+
+The parameters are module globals, so each worker records their defaults
+when it starts and each run sets all of them before it begins. Workers
+rely on simulation and bus_model importing without side effects: no bus
+thread, connection or network stack is started in a worker. Sweeps use
+the fixed-step loop; the event-driven engine assumes the default braking
+rate.
+"""
+
+import argparse
+import csv
+import itertools
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+PARAMETERS = ("packet_loss", "min_delay", "max_delay", "server_packet_loss", "deceleration", "approach_buffer")
+RESULT_FIELDS = [
+    *PARAMETERS, "seed", "stops", "mean_abs_stop_error", "max_overshoot", "max_undershoot",
+    "emergency_stops", "mean_time_to_stop", "max_time_to_stop",
+    "commands_sent", "commands_lost", "frames_sent", "frames_lost", "wall_time"
+]
+
+LEG_INTERVAL = 30.0  # Seconds per scripted station-to-station leg
+EMERGENCY_EVERY = 4  # Every nth leg ends in an emergency stop
+EMERGENCY_DELAY = 5.0  # Seconds after Start Moving, when the train is cruising
+
+defaults = None  # Module values of the swept parameters, captured by init_worker
+
+def default_parameters():
+    """Returns the current module values of every swept parameter."""
+    import bus_model
+    import simulation
+    return {
+        "packet_loss": bus_model.PACKET_LOSS_PROB,
+        "min_delay": bus_model.MIN_DELAY,
+        "max_delay": bus_model.MAX_DELAY,
+        "server_packet_loss": bus_model.SERVER_PACKET_LOSS_PROB,
+        "deceleration": simulation.DECELERATION,
+        "approach_buffer": simulation.APPROACH_BUFFER,
+    }
+
+def apply_parameters(parameters):
+    """Sets the swept module globals in this process."""
+    import bus_model
+    import simulation
+    bus_model.PACKET_LOSS_PROB = parameters["packet_loss"]
+    bus_model.MIN_DELAY = parameters["min_delay"]
+    bus_model.MAX_DELAY = parameters["max_delay"]
+    bus_model.SERVER_PACKET_LOSS_PROB = parameters["server_packet_loss"]
+    simulation.DECELERATION = parameters["deceleration"]
+    simulation.APPROACH_BUFFER = parameters["approach_buffer"]
+
+def leg_script(duration):
+    """Returns the scripted presses and the times of the emergency presses."""
+    presses, emergencies = [], []
+    for leg, start in enumerate(itertools.takewhile(lambda t: t < duration,
+                                                   itertools.count(1.0, LEG_INTERVAL))):
+        presses += [(start, "Release Brakes"), (start + 1, "Close Doors"), (start + 6, "Start Moving")]
+        if leg % EMERGENCY_EVERY == EMERGENCY_EVERY - 1:
+            emergencies.append(start + 6 + EMERGENCY_DELAY)
+            presses.append((emergencies[-1], "Emergency Stop"))
+    return presses, emergencies
+
+def stop_error(track, distance):
+    """Returns the signed distance from the nearest station: negative short of it, positive past it."""
+    nearest = track.nearest_station_distance(distance)
+    ahead = track.distance_to_next_station(distance)
+    if ahead is not None and math.isclose(ahead, nearest, abs_tol=1e-9):
+        return -nearest
+    return nearest
+
+class RunProbe:
+    """Telemetry hook that measures stops and emergency stops as a run goes.
+
+    Plugs into run_headless's telemetry argument; record_tick sees the
+    train after each tick's update.
+    """
+
+    def __init__(self, track, dt, emergency_times):
+        self.track = track
+        self.dt = dt
+        self.emergency_times = list(emergency_times)
+        self.next_emergency = 0
+        self.emergency_pressed = None  # Press time of the emergency stop in progress
+        self.previous_speed = 0.0
+        self.stop_errors = []
+        self.times_to_stop = []
+
+    def record_tick(self, record_time, train):
+        speed = train.speed
+        if (self.next_emergency < len(self.emergency_times)
+                and record_time >= self.emergency_times[self.next_emergency]):
+            if self.previous_speed > 0:
+                self.emergency_pressed = self.emergency_times[self.next_emergency]
+            self.next_emergency += 1
+        if speed == 0 and self.previous_speed > 0:
+            if self.emergency_pressed is not None:
+                # State is read after the update, so the train stopped by the end of the tick
+                self.times_to_stop.append(record_time + self.dt - self.emergency_pressed)
+                self.emergency_pressed = None
+            else:
+                self.stop_errors.append(stop_error(self.track, train.distance_traveled))
+        self.previous_speed = speed
+
+    def record_frame(self, record_time, frame):
+        pass
+
+def run_point(task):
+    """Worker entry point: runs one (overrides, seed, duration, track path) task and returns its row."""
+    overrides, seed, duration, track_path = task
+    import simulation
+    from bus_model import LoopbackMVB_Bus
+    from rng_streams import component_rng
+    from sim_clock import SimulatedClock
+    from track import load_track, default_track
+
+    parameters = dict(defaults, **overrides)
+    apply_parameters(parameters)
+    started = time.perf_counter()
+    clock = SimulatedClock()
+    dt = 1/60
+    track = load_track(track_path) if track_path else default_track()
+    presses, emergencies = leg_script(duration)
+    probe = RunProbe(track, dt, emergencies)
+    bus = LoopbackMVB_Bus("SimulationBus", clock, rng=component_rng(seed, "bus"))
+    simulation.run_headless(duration, dt, presses, clock=clock, seed=seed, track=track, telemetry=probe, bus=bus)
+
+    errors = probe.stop_errors
+    stops = probe.times_to_stop
+    return {
+        **parameters,
+        "seed": seed,
+        "stops": len(errors),
+        "mean_abs_stop_error": sum(map(abs, errors)) / len(errors) if errors else None,
+        "max_overshoot": max((e for e in errors if e > 0), default=0.0),
+        "max_undershoot": max((-e for e in errors if e < 0), default=0.0),
+        "emergency_stops": len(stops),
+        "mean_time_to_stop": sum(stops) / len(stops) if stops else None,
+        "max_time_to_stop": max(stops, default=None),
+        "commands_sent": bus.sent["Control"],
+        "commands_lost": bus.lost["Control"],
+        "frames_sent": sum(bus.sent.values()),
+        "frames_lost": sum(bus.lost.values()),
+        "wall_time": time.perf_counter() - started,
+    }
+
+def init_worker():
+    """Prepares a worker process before its first run.
+
+    The worker's log goes to the ring buffer only, so runs stay quiet.
+    """
+    global defaults
+    from log_pipeline import configure
+    configure("WARNING", console_level="OFF")
+    defaults = default_parameters()
+
+def grid_points(grid):
+    """Yields the overrides for every combination of the grid, skipping min_delay > max_delay."""
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        overrides = dict(zip(names, values))
+        if overrides.get("min_delay", -math.inf) <= overrides.get("max_delay", math.inf):
+            yield overrides
+
+def sweep(grid, seeds, duration, track_path=None, workers=None):
+    """Runs every grid point for every seed across a process pool, yielding rows as they finish."""
+    tasks = [(overrides, seed, duration, track_path) for overrides in grid_points(grid) for seed in seeds]
+    with multiprocessing.Pool(workers or os.cpu_count(), initializer=init_worker) as pool:
+        yield from pool.imap_unordered(run_point, tasks)
+
+def parse_param(value):
+    """Parses a NAME=V1,V2,... command-line argument."""
+    name, sep, values = value.partition("=")
+    if not sep or name not in PARAMETERS:
+        raise argparse.ArgumentTypeError(f"expected NAME=V1,V2,... with NAME one of {', '.join(PARAMETERS)}")
+    return name, [float(v) for v in values.split(",")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parameter sweep over headless simulation runs")
+    parser.add_argument("--param", type=parse_param, action="append", default=[],
+                        help="parameter values to sweep as NAME=V1,V2,...; repeat per parameter")
+    parser.add_argument("--seeds", type=int, default=1, help="runs per grid point, seeded 0..N-1")
+    parser.add_argument("--duration", type=float, default=600.0, help="simulated seconds per run")
+    parser.add_argument("--track", metavar="PATH", help="line file to run on")
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--output", help="write the CSV here instead of stdout")
+    args = parser.parse_args()
+
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    writer = csv.DictWriter(output, RESULT_FIELDS)
+    writer.writeheader()
+    started = time.perf_counter()
+    try:
+        for count, row in enumerate(sweep(dict(args.param), range(args.seeds), args.duration, args.track,
+                                          args.workers), 1):
+            writer.writerow(row)
+            output.flush()
+            print(f"\r{count} runs, {time.perf_counter() - started:.1f} s", end="", file=sys.stderr)
+    finally:
+        print(file=sys.stderr)
+        if output is not sys.stdout:
+            output.close()
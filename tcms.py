@@ -0,0 +1,128 @@
+# tcms.py
+"""Command-line entry point for the TCMS simulation.
+
+Runs the simulation headless on a simulated clock, replays a recorded
+log, or opens the interactive window on the bus server. The simulation
+itself lives in simulation and the display in interactive; keeping the
+command line here means each is imported once, under its own name.
+"""
+
+import argparse
+import random
+import time
+import simulation
+from simulation import run_headless, replay_log, BUTTON_NAMES, DEFAULT_URI
+from replay import Recorder
+from track import load_track
+from mvb_codec import CODEC_NAME
+from latency import tracker as latency_tracker
+from log_pipeline import configure as configure_logging, install_fault_dump, LEVEL_MAP
+
+def parse_press(value):
+    """Parses a TIME:BUTTON command-line argument."""
+    press_time, button = value.split(":", 1)
+    if button not in BUTTON_NAMES:
+        raise argparse.ArgumentTypeError(f"unknown button {button!r}")
+    return float(press_time), button
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TCMS simulation")
+    parser.add_argument("--headless", action="store_true", help="run without a display on a simulated clock")
+    parser.add_argument("--duration", type=float, default=3600.0, help="simulated seconds to run headless")
+    parser.add_argument("--dt", type=float, default=1/60, help="fixed timestep in seconds")
+    parser.add_argument("--press", type=parse_press, action="append", default=[],
+                        help="scripted button press as TIME:BUTTON, e.g. 1:'Start Moving'")
+    parser.add_argument("--bus-master", action="store_true", help="poll sensors cyclically through the bus master")
+    parser.add_argument("--seed", type=int, help="seed for the per-component random streams")
+    parser.add_argument("--record", metavar="PATH", help="log button presses and delivered frames to PATH")
+    parser.add_argument("--replay", metavar="PATH", help="re-run a recorded log headless and check it matches")
+    parser.add_argument("--latency", metavar="PATH", help="stamp frames per hop and dump latency histograms to PATH")
+    parser.add_argument("--track", metavar="PATH", help="line file with stations, gradients and speed limits")
+    parser.add_argument("--event-driven", action="store_true", help="headless: jump between events instead of ticking")
+    parser.add_argument("--uri", default=DEFAULT_URI,
+                        help="interactive: bus to join, a ws:// server or a shm://NAME shared-memory bus")
+    parser.add_argument("--codec", choices=["json", CODEC_NAME], default="json",
+                        help="interactive: wire format asked of the bus server")
+    parser.add_argument("--single-loop", action="store_true",
+                        help="interactive: run the simulation and the bus on one event loop instead of two threads")
+    parser.add_argument("--telemetry", metavar="DIR", help="record per-tick train state and every frame as columns in DIR")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="interactive: time each frame phase and write mean/p99 and budget overruns to PATH "
+                             "(F3 shows the live breakdown)")
+    parser.add_argument("--log-level", choices=LEVEL_MAP, default="INFO",
+                        help="records kept in the in-memory history and dumped on a fault")
+    parser.add_argument("--console-level", choices=LEVEL_MAP, help="records written to the console (default: --log-level)")
+    args = parser.parse_args()
+    configure_logging(args.log_level, args.console_level)
+    install_fault_dump()
+    if args.telemetry:
+        from telemetry import TelemetryRecorder
+    instrument = args.latency is not None
+    track = load_track(args.track) if args.track else None
+    # Recorded in every log, so any run can be re-run with the same random streams
+    seed = args.seed if args.seed is not None else random.randrange(2**32)
+    if args.replay:
+        started = time.perf_counter()
+        train, control_unit, matched = replay_log(args.replay)
+        if matched is None:
+            outcome = "approximate script (interactive log, frames not compared)"
+        else:
+            outcome = "frames match" if matched else "frames DIFFER from log"
+        print(f"Replayed {args.replay} in {time.perf_counter() - started:.2f} s: "
+              f"{outcome}, distance {train.distance_traveled:.1f}")
+    elif args.headless:
+        metadata = {"mode": "headless", "seed": seed, "dt": args.dt, "duration": args.duration,
+                    "bus_master": args.bus_master, "track": args.track, "event_driven": args.event_driven,
+                    "instrument": instrument}
+        recorder = Recorder(args.record, metadata) if args.record else None
+        telemetry = TelemetryRecorder(args.telemetry, metadata) if args.telemetry else None
+        started = time.perf_counter()
+        try:
+            train, control_unit, sim_clock = run_headless(args.duration, args.dt, args.press,
+                                                       use_bus_master=args.bus_master,
+                                                       seed=seed, recorder=recorder, instrument=instrument,
+                                                       track=track, event_driven=args.event_driven,
+                                                       telemetry=telemetry)
+        finally:
+            if recorder:
+                recorder.close()
+            if telemetry:
+                telemetry.close()
+        if instrument:
+            latency_tracker.dump(args.latency)
+        elapsed = time.perf_counter() - started
+        ticks = round(args.duration / args.dt)
+        print(f"Simulated {sim_clock.now():.1f} s in {elapsed:.2f} s ({ticks / elapsed:.0f} ticks/s), "
+              f"distance {train.distance_traveled:.1f}")
+        if args.bus_master:
+            print(simulation.bus_master.report())
+    else:
+        import asyncio
+        from interactive import main, main_single_loop, FRAME_PHASES
+        from frame_profiler import FrameProfiler
+        metadata = {"mode": "interactive", "seed": seed, "bus_master": args.bus_master, "track": args.track}
+        recorder = Recorder(args.record, metadata) if args.record else None
+        telemetry = TelemetryRecorder(args.telemetry, metadata) if args.telemetry else None
+        profiler = FrameProfiler(FRAME_PHASES) if args.profile else None
+        if instrument:
+            latency_tracker.start_periodic_dump(args.latency)
+        try:
+            if args.single_loop:
+                asyncio.run(main_single_loop(use_bus_master=args.bus_master, seed=seed, recorder=recorder,
+                                             instrument=instrument, track=track, telemetry=telemetry,
+                                             profiler=profiler, codec=args.codec, uri=args.uri))
+            else:
+                main(use_bus_master=args.bus_master, seed=seed, recorder=recorder, instrument=instrument,
+                     track=track, telemetry=telemetry, profiler=profiler, codec=args.codec, uri=args.uri)
+        finally:
+            if recorder:
+                recorder.close()
+            if telemetry:
+                telemetry.close()
+            if profiler:
+                profiler.dump(args.profile)
+            if instrument:
+                latency_tracker.stop_periodic_dump()
+                latency_tracker.dump(args.latency)
+            if args.bus_master and simulation.bus_master is not None:
+                print(simulation.bus_master.report())
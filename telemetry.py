@@ -0,0 +1,262 @@
+# telemetry.py
+"""Columnar telemetry recorder for long runs, stored in memory-mapped NumPy files.
+
+A recording is a directory holding two tables:
+
+- ticks: the train state once per tick (time, speed, target speed,
+  distance, brakes, emergency stop, door bitmap, passengers, at station);
+- frames: every delivered bus frame (time, sender and target node IDs,
+  payload type, and where its bytes sit in the payload heap).
+
+Each column is a series of fixed-size chunk files, <table>/<column>.<n>.npy,
+created with numpy.lib.format.open_memmap. Appending a row writes one scalar
+per column into the current chunk's mapping, so the cost per tick stays
+constant however long the run gets; only a full chunk costs a file create.
+Frame bytes are stored in the same compact form as the run log (a binary
+telegram, or JSON for nodes without a numeric ID) in chunked byte heaps.
+No frame spans two heap chunks.
+
+telemetry.json lists the schema and the row and byte counts. It is
+rewritten whenever a chunk fills and on close, so after a crash at most
+the rows of the last chunk are lost.
+
+TelemetryReader maps the chunks read-only, so analysis works straight
+from the page cache without copying the data.
+"""
+
+import json
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+from constants import NUM_DOORS
+from mvb_codec import node_id, STAMPED
+from replay import encode_logged_frame, decode_logged_frame
+
+INDEX_FILE = "telemetry.json"
+CHUNK_ROWS = 65536  # Rows per column chunk file
+HEAP_CHUNK_BYTES = 1 << 22  # Bytes per payload heap chunk
+NO_NODE = 0xFFFF  # Node ID column value for nodes without a numeric ID
+JSON_PAYLOAD = 0xFF  # Payload type column value for frames stored as JSON
+
+TICK_COLUMNS = [
+    ("time", "f8"),
+    ("speed", "f8"),
+    ("target_speed", "f8"),
+    ("distance", "f8"),
+    ("brakes", "u1"),
+    ("emergency", "u1"),
+    ("doors", "u1" if NUM_DOORS <= 8 else "u4"),  # Bit i set while door i is open
+    ("passengers", "u2"),
+    ("at_station", "u1"),
+]
+
+FRAME_COLUMNS = [
+    ("time", "f8"),
+    ("sender", "u2"),
+    ("target", "u2"),
+    ("payload_type", "u1"),
+    ("offset", "u8"),  # Start of the frame bytes in the payload heap
+    ("length", "u2"),
+]
+
+def chunk_path(directory, table, column, chunk):
+    return os.path.join(directory, table, f"{column}.{chunk:05d}.npy")
+
+class ColumnWriter:
+    """Appends fixed-width rows to one table of chunked memory-mapped column files."""
+
+    def __init__(self, directory, table, columns, chunk_rows=CHUNK_ROWS, on_chunk=None):
+        self.directory = directory
+        self.table = table
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self.on_chunk = on_chunk  # Called after each new chunk is opened
+        self.rows = 0
+        self.chunks = 0
+        self.arrays = None
+        self.fill = chunk_rows  # Rows used in the current chunk; forces a chunk on first append
+        os.makedirs(os.path.join(directory, table), exist_ok=True)
+
+    def new_chunk(self):
+        self.flush()
+        self.arrays = [open_memmap(chunk_path(self.directory, self.table, name, self.chunks), mode="w+",
+                                   dtype=dtype, shape=(self.chunk_rows,))
+                       for name, dtype in self.columns]
+        self.chunks += 1
+        self.fill = 0
+        if self.on_chunk:
+            self.on_chunk()
+
+    def append(self, *values):
+        """Writes one row; values come in column order."""
+        if self.fill == self.chunk_rows:
+            self.new_chunk()
+        fill = self.fill
+        for array, value in zip(self.arrays, values):
+            array[fill] = value
+        self.fill = fill + 1
+        self.rows += 1
+
+    def flush(self):
+        if self.arrays:
+            for array in self.arrays:
+                array.flush()
+
+    def close(self):
+        self.flush()
+        self.arrays = None
+
+class ByteHeap:
+    """Appends variable-length byte strings to chunked memory-mapped uint8 files."""
+
+    def __init__(self, directory, table, chunk_bytes=HEAP_CHUNK_BYTES, on_chunk=None):
+        self.writer = ColumnWriter(directory, table, [("heap", "u1")], chunk_bytes, on_chunk)
+        self.size = 0  # Global offset of the next byte, padding included
+
+    def append(self, payload):
+        """Stores payload and returns its global offset."""
+        writer = self.writer
+        if len(payload) > writer.chunk_rows:
+            raise ValueError(f"Payload of {len(payload)} bytes exceeds the {writer.chunk_rows}-byte heap chunk")
+        if writer.fill + len(payload) > writer.chunk_rows:
+            self.size += writer.chunk_rows - writer.fill  # Pad out the chunk so a payload never spans two
+            writer.new_chunk()
+        start = writer.fill
+        writer.arrays[0][start:start + len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+        writer.fill = start + len(payload)
+        offset = self.size
+        self.size += len(payload)
+        return offset
+
+    def close(self):
+        self.writer.close()
+
+class TelemetryRecorder:
+    """Streams per-tick train state and delivered frames into a telemetry directory."""
+
+    def __init__(self, directory, metadata=None, chunk_rows=CHUNK_ROWS, heap_chunk_bytes=HEAP_CHUNK_BYTES):
+        self.directory = directory
+        self.metadata = metadata or {}
+        os.makedirs(directory, exist_ok=True)
+        self.ticks = ColumnWriter(directory, "ticks", TICK_COLUMNS, chunk_rows, self.write_index)
+        self.frames = ColumnWriter(directory, "frames", FRAME_COLUMNS, chunk_rows, self.write_index)
+        self.heap = ByteHeap(directory, "frames", heap_chunk_bytes, self.write_index)
+        self.write_index()
+
+    def record_tick(self, record_time, train):
+        """Appends the train's state for one tick."""
+        doors = 0
+        for i, is_open in enumerate(train.doors):
+            if is_open:
+                doors |= 1 << i
+        self.ticks.append(record_time, train.speed, train.target_speed, train.distance_traveled,
+                          train.brakes_applied, train.emergency_stop, doors, train.passengers, train.at_station)
+
+    def record_frame(self, record_time, frame):
+        """Appends a frame handed to the nodes."""
+        payload = encode_logged_frame(frame)
+        if payload[:1] == b"{":
+            payload_type = JSON_PAYLOAD
+        else:
+            payload_type = payload[1] & ~STAMPED
+        sender = node_id(frame["sender"])
+        target = node_id(frame.get("real_target", frame["target"]))
+        offset = self.heap.append(payload)
+        self.frames.append(record_time, NO_NODE if sender is None else sender,
+                           NO_NODE if target is None else target, payload_type, offset, len(payload))
+
+    def write_index(self):
+        """Rewrites telemetry.json with the schema and current row counts."""
+        index = {
+            "metadata": self.metadata,
+            "tables": {writer.table: {"columns": writer.columns, "rows": writer.rows, "chunk_rows": writer.chunk_rows}
+                       for writer in (self.ticks, self.frames)},
+            "heap": {"bytes": self.heap.size, "chunk_bytes": self.heap.writer.chunk_rows}
+        }
+        temporary = os.path.join(self.directory, INDEX_FILE + ".tmp")
+        with open(temporary, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(temporary, os.path.join(self.directory, INDEX_FILE))
+
+    def close(self):
+        self.ticks.close()
+        self.frames.close()
+        self.heap.close()
+        self.write_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class TableReader:
+    """Read-only, zero-copy view of one recorded table."""
+
+    def __init__(self, directory, table, columns, rows, chunk_rows):
+        self.directory = directory
+        self.table = table
+        self.dtypes = dict(columns)
+        self.rows = rows
+        self.chunk_rows = chunk_rows
+        self._chunks = {}  # column -> mapped chunk arrays
+
+    def __len__(self):
+        return self.rows
+
+    def chunks(self, column):
+        """Returns the column as a list of read-only memory-mapped arrays, one per chunk."""
+        if column not in self.dtypes:
+            raise KeyError(column)
+        arrays = self._chunks.get(column)
+        if arrays is None:
+            arrays = self._chunks[column] = [
+                np.load(chunk_path(self.directory, self.table, column, chunk), mmap_mode="r")[:self.rows - start]
+                for chunk, start in enumerate(range(0, self.rows, self.chunk_rows))
+            ]
+        return arrays
+
+    def column(self, column):
+        """Returns the whole column; zero-copy when it fits one chunk, concatenated otherwise."""
+        arrays = self.chunks(column)
+        if len(arrays) == 1:
+            return arrays[0]
+        if not arrays:
+            return np.empty(0, dtype=self.dtypes[column])
+        return np.concatenate(arrays)
+
+    def __getitem__(self, column):
+        return self.column(column)
+
+class TelemetryReader:
+    """Opens a telemetry directory for analysis."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.metadata = index["metadata"]
+        self.ticks = self._table("ticks", index["tables"]["ticks"])
+        self.frames = self._table("frames", index["tables"]["frames"])
+        heap = index["heap"]
+        self.heap = TableReader(directory, "frames", [("heap", "u1")], heap["bytes"], heap["chunk_bytes"])
+
+    def _table(self, table, spec):
+        return TableReader(self.directory, table, [tuple(column) for column in spec["columns"]],
+                           spec["rows"], spec["chunk_rows"])
+
+    def payload(self, index):
+        """Returns the stored bytes of frame index as a zero-copy memoryview."""
+        chunk, row = divmod(index, self.frames.chunk_rows)
+        offset = int(self.frames.chunks("offset")[chunk][row])
+        length = int(self.frames.chunks("length")[chunk][row])
+        heap_chunk, start = divmod(offset, self.heap.chunk_rows)
+        return memoryview(self.heap.chunks("heap")[heap_chunk][start:start + length])
+
+    def frame(self, index):
+        """Decodes frame index back into a frame dict."""
+        return decode_logged_frame(bytes(self.payload(index)))
+
+    def door_open(self, door):
+        """Returns a boolean array of whether door was open at each tick."""
+        return (self.ticks["doors"] & (1 << door)) != 0
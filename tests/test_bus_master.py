@@ -0,0 +1,66 @@
+# tests/test_bus_master.py
+"""The bus master's polling schedule and its utilisation numbers."""
+
+import pytest
+from bus_model import BusMaster, BASIC_PERIOD, MVB_BIT_RATE, frame_size, process_data_frame
+
+def make_master():
+    sent = []
+    master = BusMaster(sent.append)
+    master.register_port("Speed", lambda: "Speed:12.5", BASIC_PERIOD)
+    master.register_port("DoorS0", lambda: "Door0:Open", BASIC_PERIOD * 2)
+    master.register_port("Pass", lambda: "Passengers:40", BASIC_PERIOD * 4)
+    return master, sent
+
+def due(frame):
+    return [name for name, _ in frame["ports"]]
+
+def test_ports_are_polled_on_their_period_in_table_order():
+    master, sent = make_master()
+    for cycle in range(8):
+        master.poll(cycle * BASIC_PERIOD + BASIC_PERIOD / 2)
+
+    assert [due(frame) for frame in sent] == [
+        ["Speed", "DoorS0", "Pass"],
+        ["Speed"],
+        ["Speed", "DoorS0"],
+        ["Speed"],
+        ["Speed", "DoorS0", "Pass"],
+        ["Speed"],
+        ["Speed", "DoorS0"],
+        ["Speed"],
+    ]
+    assert sent[0] == process_data_frame("Control", [["Speed", "Speed:12.5"], ["DoorS0", "Door0:Open"],
+                                                     ["Pass", "Passengers:40"]])
+
+def test_a_cycle_runs_once_and_missed_cycles_fold_into_one_frame():
+    master, sent = make_master()
+    master.poll(0.0)
+    assert master.poll(BASIC_PERIOD / 2) is None  # Same cycle
+    master.poll(5 * BASIC_PERIOD)  # Cycles 1-4 missed
+    assert len(sent) == 2
+    assert due(sent[1]) == ["Speed", "DoorS0", "Pass"]
+    assert master.next_poll_time() == pytest.approx(6 * BASIC_PERIOD)
+
+def test_period_must_be_a_power_of_two_multiple():
+    master, _ = make_master()
+    with pytest.raises(ValueError):
+        master.register_port("Station", lambda: "Station:No", BASIC_PERIOD * 3)
+
+def test_budget_and_utilisation():
+    master, sent = make_master()
+    capacity_bits = MVB_BIT_RATE * BASIC_PERIOD
+    full_frame = process_data_frame("Control", [["Speed", "Speed:12.5"], ["DoorS0", "Door0:Open"],
+                                                ["Pass", "Passengers:40"]])
+    assert master.budget() == pytest.approx(frame_size(full_frame) * 8 / capacity_bits)
+
+    for cycle in range(4):
+        master.poll(cycle * BASIC_PERIOD)
+    sizes = [frame_size(frame) for frame in sent]
+    measured = master.utilisation()
+    assert measured["cycles"] == 4
+    assert measured["frames"] == 4
+    assert measured["mean"] == pytest.approx(sum(sizes) * 8 / (capacity_bits * 4))
+    assert measured["peak"] == pytest.approx(max(sizes) * 8 / capacity_bits)
+    assert measured["peak"] == pytest.approx(master.budget())
+    assert "budget" in master.report()
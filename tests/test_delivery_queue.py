@@ -0,0 +1,74 @@
+# tests/test_delivery_queue.py
+"""The order in which mvb_server's DeliveryQueue releases delayed frames."""
+
+import asyncio
+import pytest
+import mvb_server
+from mvb_server import DeliveryQueue
+from registry import NodeRegistry
+
+LANE = (1, None)
+
+class RecordingOutbox:
+    def __init__(self):
+        self.frames = []
+
+    def put(self, sender, message, lane):
+        self.frames.append(message)
+
+@pytest.fixture
+def clients(monkeypatch):
+    """Outboxes of the connected clients, by name; shard_peers unset as on a single server."""
+    monkeypatch.setattr(mvb_server, "connected_clients", NodeRegistry())
+    monkeypatch.setattr(mvb_server, "client_outboxes", {})
+    monkeypatch.setattr(mvb_server, "subscribers", {})
+    monkeypatch.setattr(mvb_server, "client_topics", {})
+    monkeypatch.setattr(mvb_server, "shard_peers", None)
+    for name in ("Control", "Display"):
+        mvb_server.connected_clients[name] = object()
+        mvb_server.client_outboxes[name] = RecordingOutbox()
+    return mvb_server.client_outboxes
+
+def run(schedule):
+    """Schedules frames on a fresh queue with schedule(queue) and waits until all are released."""
+    async def scenario():
+        queue = DeliveryQueue()
+        schedule(queue)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + 5.0
+        while queue.heap:
+            assert loop.time() < deadline, "frames never released"
+            await asyncio.sleep(0.005)
+        return queue
+
+    return asyncio.run(scenario())
+
+def test_frames_are_released_in_due_time_order(clients):
+    def schedule(queue):
+        for delay, message in [(0.06, "third"), (0.02, "first"), (0.04, "second")]:
+            queue.schedule(delay, "Speed", "Control", message, LANE)
+
+    run(schedule)
+    assert clients["Control"].frames == ["first", "second", "third"]
+
+def test_equal_due_times_keep_arrival_order(clients, monkeypatch):
+    # A frozen clock gives every frame the same deadline
+    monkeypatch.setattr(asyncio.BaseEventLoop, "time", lambda self: 100.0)
+
+    def schedule(queue):
+        for i in range(5):
+            queue.schedule(0.0, "Speed", "Control", f"frame {i}", LANE)
+
+    run(schedule)
+    assert clients["Control"].frames == [f"frame {i}" for i in range(5)]
+
+def test_frame_to_disconnected_target_is_dropped_without_stalling(clients):
+    def schedule(queue):
+        queue.schedule(0.01, "Speed", "Gone", "lost", LANE)
+        queue.schedule(0.02, "Speed", "Control", "to control", LANE)
+        queue.schedule(0.03, "Speed", "Display", "to display", LANE)
+
+    queue = run(schedule)
+    assert clients["Control"].frames == ["to control"]
+    assert clients["Display"].frames == ["to display"]
+    assert queue.heap == [] and queue._timer is None
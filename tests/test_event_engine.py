@@ -0,0 +1,66 @@
+# tests/test_event_engine.py
+"""The event-driven engine against the fixed-step loop it stands in for."""
+
+import pytest
+import bus_model
+import simulation
+
+DT = 1 / 60
+DURATION = 300.0
+LEG_INTERVAL = 30.0
+
+def leg_script():
+    """Station to station every leg, with an emergency stop while cruising on every fourth."""
+    presses = []
+    for leg in range(int(DURATION // LEG_INTERVAL)):
+        start = 1.0 + leg * LEG_INTERVAL
+        presses += [(start, "Release Brakes"), (start + 1, "Close Doors"), (start + 6, "Start Moving")]
+        if leg % 4 == 3:
+            presses.append((start + 11, "Emergency Stop"))
+    return presses
+
+class StopProbe:
+    """Telemetry hook counting ticks run and recording (time, distance) at every standstill."""
+
+    def __init__(self):
+        self.ticks = 0  # Spans the event-driven engine skips leave no ticks
+        self.stops = []
+        self.previous_speed = 0.0
+
+    def record_tick(self, record_time, train):
+        self.ticks += 1
+        if train.speed == 0 and self.previous_speed > 0:
+            self.stops.append((record_time, train.distance_traveled))
+        self.previous_speed = train.speed
+
+    def record_frame(self, record_time, frame):
+        pass
+
+def run(event_driven, use_bus_master, seed):
+    probe = StopProbe()
+    train, _, clock = simulation.run_headless(DURATION, DT, leg_script(), seed=seed, use_bus_master=use_bus_master,
+                                              event_driven=event_driven, telemetry=probe)
+    return train, clock, probe
+
+@pytest.fixture
+def lossless_bus(monkeypatch):
+    # Without losses the runs differ only in timing, not in which commands arrive
+    monkeypatch.setattr(bus_model, "PACKET_LOSS_PROB", 0.0)
+    monkeypatch.setattr(bus_model, "SERVER_PACKET_LOSS_PROB", 0.0)
+
+@pytest.mark.parametrize("use_bus_master", [False, True])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_event_driven_matches_fixed_step(lossless_bus, use_bus_master, seed):
+    fixed_train, fixed_clock, fixed = run(False, use_bus_master, seed)
+    event_train, event_clock, event = run(True, use_bus_master, seed)
+    fixed_stops, event_stops = fixed.stops, event.stops
+
+    assert event_clock.now() == pytest.approx(fixed_clock.now())
+    # An engine that never jumps would match trivially
+    assert event.ticks < 0.9 * fixed.ticks
+    assert len(fixed_stops) > 5
+    assert len(event_stops) == len(fixed_stops)
+    for (fixed_time, fixed_distance), (event_time, event_distance) in zip(fixed_stops, event_stops):
+        assert event_time == pytest.approx(fixed_time, abs=2 * DT)
+        assert event_distance == pytest.approx(fixed_distance, abs=1.0)
+    assert event_train.distance_traveled == pytest.approx(fixed_train.distance_traveled, abs=1.0)
@@ -0,0 +1,69 @@
+# tests/test_fleet.py
+"""The vectorized fleet against the scalar Train it stands in for."""
+
+import numpy as np
+import pytest
+from fleet import Fleet
+from sim_clock import SimulatedClock
+from track import Track, default_track
+from train import Train
+
+DT = 1 / 60
+
+class StillAir:
+    """Wind source that never blows, so both engines see the same (zero) draws."""
+
+    def uniform(self, low, high, size=None):
+        return 0.0 if size is None else np.zeros(size)
+
+# Per train: target speed, and the (time, attribute, value) commands it gets
+SCENARIOS = [
+    (22.22, []),
+    (22.22, [(10.0, "brakes_applied", True), (15.0, "brakes_applied", False)]),
+    (22.22, [(8.0, "emergency_stop", True)]),
+    (10.0, [(29.5, "brakes_applied", True), (35.0, "brakes_applied", False)]),  # Stops near the second station
+    (22.22, [(12.0, "brakes_applied", True), (20.0, "brakes_applied", False), (21.0, "target_speed", 22.22)]),
+]
+
+def graded_line():
+    """Open line with uneven stations, up- and downhill sections and speed limits."""
+    return Track([("A", 0), ("B", 280), ("C", 900), ("D", 1500)], 2000, loop=False,
+                 gradients=[(100, 0.01), (400, -0.005), (800, 0.02), (1300, 0.0)],
+                 speed_limits=[(0, 15.0), (500, 22.22), (1200, 10.0)])
+
+def graded_loop():
+    return Track([("A", 50), ("B", 320), ("C", 700)], 1000, gradients=[(0, 0.005), (600, -0.01)],
+                 speed_limits=[(200, 12.0), (650, 20.0)])
+
+@pytest.mark.parametrize("make_track", [default_track, graded_line, graded_loop])
+def test_fleet_matches_scalar_trains(make_track):
+    clock = SimulatedClock()
+    track = make_track()
+    trains = [Train(clock, StillAir(), track) for _ in SCENARIOS]
+    fleet = Fleet(len(SCENARIOS), clock, track=track)
+    fleet.rng = StillAir()
+    for i, (target_speed, _) in enumerate(SCENARIOS):
+        trains[i].target_speed = fleet.target_speed[i] = target_speed
+    commands = sorted((when, i, name, value) for i, (_, script) in enumerate(SCENARIOS)
+                      for when, name, value in script)
+
+    stopped_at_station = set()
+    for tick in range(round(60 / DT)):
+        while commands and commands[0][0] <= clock.now():
+            _, i, name, value = commands.pop(0)
+            setattr(trains[i], name, value)
+            getattr(fleet, name)[i] = value
+        for train in trains:
+            train.update(DT)
+        fleet.update(DT)
+        clock.advance(DT)
+
+        for i, train in enumerate(trains):
+            assert fleet.speed[i] == pytest.approx(train.speed, abs=1e-9), (tick, i)
+            assert fleet.distance_traveled[i] == pytest.approx(train.distance_traveled, abs=1e-6), (tick, i)
+            assert fleet.at_station[i] == train.at_station, (tick, i)
+            assert fleet.leaving_station[i] == train.leaving_station, (tick, i)
+            assert fleet.emergency_stop[i] == train.emergency_stop, (tick, i)
+            if train.at_station:
+                stopped_at_station.add(i)
+    assert stopped_at_station  # The scenarios exercise dwelling and departing, not only driving
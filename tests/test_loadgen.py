@@ -0,0 +1,25 @@
+# tests/test_loadgen.py
+"""A short load run against a server spawned by loadgen."""
+
+import asyncio
+import os
+import pytest
+import loadgen
+from test_sharded_server import free_port, children, alive, wait_for
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="reads child processes from /proc")
+def test_spawned_sharded_server_is_fully_stopped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The server script is found from any directory
+    monkeypatch.setenv("TMPDIR", str(tmp_path))
+    port = free_port()
+    server = loadgen.spawn_server(port, 0.0, 0.0, 0.0, workers=2)
+    shards = children(server.pid)
+    try:
+        report = asyncio.run(loadgen.run_load(f"ws://localhost:{port}", 10, 10.0, 0.5, drain=0.5, seed=1))
+    finally:
+        loadgen.stop_server(server, port)
+
+    assert report["connected"] == 10
+    assert report["received"] == report["sent"] > 0
+    assert wait_for(lambda: not any(alive(pid) for pid in shards))
+    assert not list(tmp_path.glob("mvb_shards_*"))
@@ -0,0 +1,31 @@
+# tests/test_log_pipeline.py
+"""The logging pipeline's ring and the process-wide switches it sets."""
+
+import io
+import logging
+import log_pipeline
+
+def test_shutdown_restores_logging_switches():
+    saved = (logging._srcfile, logging.logProcesses, logging.logMultiprocessing)
+    log_pipeline.configure("INFO", stream=io.StringIO())
+    log_pipeline.configure("DEBUG", stream=io.StringIO())  # Replacing a pipeline must not lose the originals
+    assert logging._srcfile is None
+    assert logging.logProcesses is False
+
+    log_pipeline.shutdown()
+    assert (logging._srcfile, logging.logProcesses, logging.logMultiprocessing) == saved
+
+def test_ring_keeps_rendered_messages():
+    stream = io.StringIO()
+    log_pipeline.configure("DEBUG", console_level="OFF", capacity=2, stream=stream)
+    try:
+        log = log_pipeline.get_logger("test")
+        ports = ["Speed"]
+        for i in range(3):
+            log.debug("frame %d on %s", i, ports)
+        ports.append("Pass")
+        assert [record.getMessage() for record in log_pipeline.recent()] == [
+            "frame 1 on ['Speed']", "frame 2 on ['Speed']"]
+    finally:
+        log_pipeline.shutdown()
+    assert stream.getvalue() == ""
@@ -0,0 +1,43 @@
+# tests/test_messages.py
+"""Decoding wire strings into typed messages and dispatching them."""
+
+import pytest
+from messages import (decode_message, MessageDispatcher, SpeedReading, DoorState, PassengerCount, StationState,
+                      SetTargetSpeed, BrakeCommand, EmergencyStop, DoorCommand, TextMessage)
+
+@pytest.mark.parametrize("text, expected", [
+    ("Speed:12.5", SpeedReading(12.5)),
+    ("Door2:Open", DoorState(2, True)),
+    ("Door0:Closed", DoorState(0, False)),
+    ("Passengers:42", PassengerCount(42)),
+    ("Station:Yes", StationState(True)),
+    ("Station:No", StationState(False)),
+    ("Set Target Speed:22.22", SetTargetSpeed(22.22)),
+    ("Apply Brakes", BrakeCommand(True)),
+    ("Release Brakes", BrakeCommand(False)),
+    ("Emergency Stop", EmergencyStop(0)),
+    ("Emergency Stop 3", EmergencyStop(3)),
+    ("Open Door1", DoorCommand(1, True)),
+    ("Close Door3", DoorCommand(3, False)),
+])
+def test_decode_message(text, expected):
+    assert decode_message(text) == expected
+
+@pytest.mark.parametrize("text", ["Speed:12.5", "Door2:Open", "Passengers:42", "Station:No",
+                                  "Apply Brakes", "Emergency Stop 3", "Close Door3", "Hello bus"])
+def test_str_gives_back_the_wire_text(text):
+    assert str(decode_message(text)) == text
+
+@pytest.mark.parametrize("text", ["Speed:fast", "Passengers:many", "Emergency Stop now", "Open DoorX", "Hello bus"])
+def test_unparseable_text_is_a_text_message(text):
+    assert decode_message(text) == TextMessage(text)
+
+def test_dispatcher_calls_the_handler_for_the_type():
+    received = []
+    dispatcher = MessageDispatcher({SpeedReading: received.append})
+    dispatcher.register(DoorCommand, received.append)
+
+    assert dispatcher(decode_message("Speed:3.0"))
+    assert dispatcher(decode_message("Open Door1"))
+    assert not dispatcher(decode_message("Apply Brakes"))
+    assert received == [SpeedReading(3.0), DoorCommand(1, True)]
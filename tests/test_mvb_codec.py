@@ -0,0 +1,69 @@
+# tests/test_mvb_codec.py
+"""Round trips through the binary telegram format."""
+
+import json
+import pytest
+from bus_model import frame_size, process_data_frame
+from latency import new_stamps, HOPS, SEND, SERVER_RECEIVE
+from mvb_codec import encode_frame, decode_frame, is_stamped, set_stamp
+
+def frame(message, sender="Speed", target="SimulationBus", real_target="Control"):
+    return {"sender": sender, "target": target, "real_target": real_target, "message": message}
+
+@pytest.mark.parametrize("message", [
+    "Speed:12.5",
+    "Door2:Open",
+    "Door0:Closed",
+    "Passengers:42",
+    "Station:Yes",
+    "Station:No",
+    "Set Target Speed:22.22",
+    "Apply Brakes",
+])
+def test_message_round_trip(message):
+    data = frame(message)
+    assert decode_frame(encode_frame(data)) == data
+
+def test_generated_node_names_round_trip():
+    data = frame("Speed:3.0", sender="Node7", target="Node1234", real_target="Node1234")
+    assert decode_frame(encode_frame(data)) == data
+
+def test_process_data_round_trip():
+    data = process_data_frame("Control", [["Speed", "Speed:8.0"], ["DoorS1", "Door1:Open"], ["Pass", "Passengers:3"]])
+    assert decode_frame(encode_frame(data)) == data
+
+def test_unstamped_frame_has_no_trailer():
+    telegram = encode_frame(frame("Speed:1.0"))
+    assert not is_stamped(telegram)
+    assert "stamps" not in decode_frame(telegram)
+
+def test_stamp_trailer_keeps_zero_and_missing_stamps():
+    data = frame("Speed:1.0")
+    data["stamps"] = new_stamps(0)  # A simulated clock starts at t=0
+    data["stamps"][SEND] = 5
+    telegram = encode_frame(data)
+    assert is_stamped(telegram)
+    assert decode_frame(telegram)["stamps"] == [0, 5] + [None] * (len(HOPS) - 2)
+
+def test_set_stamp_fills_the_trailer_in_place():
+    data = frame("Door1:Open", sender="DoorS1")
+    data["stamps"] = new_stamps(100)
+    telegram = bytearray(encode_frame(data))
+    set_stamp(telegram, SERVER_RECEIVE, 250)
+    decoded = decode_frame(telegram)
+    assert decoded["stamps"][SERVER_RECEIVE] == 250
+    assert decoded["message"] == "Door1:Open"
+
+def test_unknown_node_falls_back_to_json():
+    data = frame("Speed:1.0", sender="Visitor")
+    assert encode_frame(data) is None
+    assert frame_size(data) == len(json.dumps(data))
+
+@pytest.mark.parametrize("message", ["Speed:abc", "Passengers:70000", "Passengers:-1", "Door300:Open"])
+def test_unencodable_value_falls_back_to_json(message):
+    assert encode_frame(frame(message)) is None
+    assert encode_frame(process_data_frame("Control", [["Speed", message]])) is None
+
+def test_frame_size_is_the_telegram_length():
+    data = process_data_frame("Control", [["Speed", "Speed:8.0"]])
+    assert frame_size(data) == len(encode_frame(data))
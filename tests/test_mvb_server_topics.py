@@ -0,0 +1,55 @@
+# tests/test_mvb_server_topics.py
+"""Which subscribers mvb_server fans a released frame out to."""
+
+import json
+import pytest
+import mvb_server
+from bus_model import process_data_frame
+from mvb_codec import encode_frame
+from registry import NodeRegistry
+
+PORTS = [["Speed", "Speed:12.5"], ["DoorS0", "Door0:Open"], ["Pass", "Passengers:40"]]
+
+class RecordingOutbox:
+    def __init__(self):
+        self.frames = []
+
+    def put(self, sender, message, lane):
+        self.frames.append((sender, message))
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(mvb_server, "connected_clients", NodeRegistry())
+    monkeypatch.setattr(mvb_server, "client_outboxes", {})
+    monkeypatch.setattr(mvb_server, "subscribers", {})
+    monkeypatch.setattr(mvb_server, "client_topics", {})
+    return mvb_server
+
+def connect(server, name, topics):
+    server.connected_clients[name] = object()
+    server.client_outboxes[name] = RecordingOutbox()
+    server.subscribe(name, topics)
+    return server.client_outboxes[name]
+
+@pytest.mark.parametrize("form", ["json", "dict", "binary"])
+def test_process_data_frame_is_published_on_its_ports(form):
+    data = process_data_frame("Control", PORTS)
+    message = {"json": json.dumps(data), "dict": data, "binary": encode_frame(data)}[form]
+    assert mvb_server.frame_topics("BusMaster", message) == ("BusMaster", "Speed", "DoorS0", "Pass")
+
+def test_plain_frame_is_published_on_its_sender():
+    message = json.dumps({"sender": "Speed", "target": "SimulationBus", "message": "Speed:3.0"})
+    assert mvb_server.frame_topics("Speed", message) == ("Speed",)
+    assert mvb_server.frame_topics("Speed", encode_frame(json.loads(message))) == ("Speed",)
+
+def test_port_subscriber_receives_bus_master_frames(server):
+    speed = connect(server, "Display", ["Speed"])
+    both = connect(server, "Logger", ["Speed", "Pass"])
+    brakes = connect(server, "Monitor", ["Brake"])
+    message = json.dumps(process_data_frame("Control", PORTS))
+
+    server.fan_out("BusMaster", "SimulationBus", message, (2, None))
+
+    assert len(speed.frames) == 1
+    assert len(both.frames) == 1  # Once, however many of its ports the frame carries
+    assert brakes.frames == []
@@ -0,0 +1,133 @@
+# tests/test_network_bus.py
+"""NetworkMVB_Bus's connection manager: queueing while down, reconnects and backoff."""
+
+import asyncio
+import json
+import pytest
+import websockets
+import network_bus
+from network_bus import NetworkMVB_Bus
+from test_sharded_server import free_port
+
+@pytest.fixture(autouse=True)
+def no_line_faults(monkeypatch):
+    """Sends go straight to the lanes, and reconnect attempts follow each other quickly."""
+    monkeypatch.setattr(network_bus, "PACKET_LOSS_PROB", 0.0)
+    monkeypatch.setattr(network_bus, "MIN_DELAY", 0.0)
+    monkeypatch.setattr(network_bus, "MAX_DELAY", 0.0)
+    monkeypatch.setattr(network_bus, "RECONNECT_BASE_DELAY", 0.01)
+    monkeypatch.setattr(network_bus, "RECONNECT_MAX_DELAY", 0.05)
+
+class RecordingServer:
+    """A websocket server that records the messages of every frame it receives."""
+
+    def __init__(self, port):
+        self.port = port
+        self.messages = []
+        self.server = None
+
+    async def handle(self, websocket):
+        json.loads(await websocket.recv())  # Registration
+        async for frame in websocket:
+            self.messages.append(json.loads(frame)["message"])
+
+    async def start(self):
+        self.server = await websockets.serve(self.handle, "localhost", self.port)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+async def wait_for(condition, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+async def send_all(bus, messages):
+    for message in messages:
+        await bus.send_message("Control", "Speed", message)  # Commands are never coalesced
+
+def test_sends_queue_while_disconnected_and_flush_in_order():
+    async def scenario():
+        port = free_port()
+        bus = NetworkMVB_Bus("Node", uri=f"ws://localhost:{port}")
+        await send_all(bus, ["Set Target Speed:1", "Set Target Speed:2", "Set Target Speed:3"])
+        await wait_for(lambda: bus.stats["failed_attempts"] >= 2)
+        health = bus.health()
+        assert health["state"] == "reconnecting"
+        assert sum(health["queued"].values()) == 2  # The writer holds the first until it connects
+        assert bus.stats["sent"] == 0
+
+        server = RecordingServer(port)
+        await server.start()
+        try:
+            await wait_for(lambda: len(server.messages) == 3)
+            assert server.messages == ["Set Target Speed:1", "Set Target Speed:2", "Set Target Speed:3"]
+            assert bus.health()["state"] == "connected"
+        finally:
+            await bus.close()
+            await server.stop()
+
+    asyncio.run(scenario())
+
+def test_reconnects_after_server_drop():
+    async def scenario():
+        port = free_port()
+        server = RecordingServer(port)
+        await server.start()
+        bus = NetworkMVB_Bus("Node", uri=f"ws://localhost:{port}")
+        listener = asyncio.create_task(bus.listen())  # Notices the drop, as the simulation's listener does
+        try:
+            await send_all(bus, ["Set Target Speed:1"])
+            await wait_for(lambda: server.messages == ["Set Target Speed:1"])
+
+            await server.stop()
+            await wait_for(lambda: bus.stats["disconnects"] == 1)
+            await send_all(bus, ["Set Target Speed:2"])
+            assert bus.stats["sent"] == 1
+
+            server = RecordingServer(port)
+            await server.start()
+            await wait_for(lambda: server.messages == ["Set Target Speed:2"])
+            assert bus.stats["connects"] == 2
+            assert bus.stats["dropped"] == 0
+        finally:
+            listener.cancel()
+            await bus.close()
+            await server.stop()
+
+    asyncio.run(scenario())
+
+class CeilingRng:
+    """Draws the top of every range and records the backoff ranges asked for."""
+
+    def __init__(self):
+        self.ranges = []
+
+    def random(self):
+        return 1.0
+
+    def uniform(self, low, high):
+        self.ranges.append((low, high))
+        return high
+
+def test_backoff_doubles_up_to_cap_and_uses_bus_rng():
+    async def scenario():
+        rng = CeilingRng()
+        bus = NetworkMVB_Bus("Node", uri="ws://localhost:1", rng=rng)
+
+        async def refuse():
+            return False
+
+        bus.connect = refuse
+        bus._start()
+        try:
+            await wait_for(lambda: bus.stats["failed_attempts"] >= 6)
+        finally:
+            await bus.close()
+        return rng.ranges
+
+    ranges = asyncio.run(scenario())
+    assert ranges[:5] == [(0, 0.02), (0, 0.04), (0, 0.05), (0, 0.05), (0, 0.05)]
@@ -0,0 +1,54 @@
+# tests/test_priority_lanes.py
+"""Ordering, coalescing and overflow of the outbound priority lanes."""
+
+from priority_lanes import PriorityLanes
+
+def drain(lanes):
+    items = []
+    while (item := lanes.get()) is not None:
+        items.append(item)
+    return items
+
+def test_most_urgent_lane_first_then_fifo():
+    lanes = PriorityLanes((4, 4, 4))
+    lanes.put(2, "pd1")
+    lanes.put(1, "cmd1")
+    lanes.put(0, "safety")
+    lanes.put(2, "pd2")
+    lanes.put(1, "cmd2")
+    assert lanes.depths() == [1, 2, 2]
+    assert drain(lanes) == ["safety", "cmd1", "cmd2", "pd1", "pd2"]
+    assert len(lanes) == 0
+
+def test_coalescing_replaces_in_place():
+    lanes = PriorityLanes((4, 4, 4))
+    lanes.put(2, "speed 1", key="Speed")
+    lanes.put(2, "doors", key="DoorS0")
+    lanes.put(2, "speed 2", key="Speed")
+    assert lanes.coalesced == [0, 0, 1]
+    assert drain(lanes) == ["speed 2", "doors"]
+
+def test_key_is_released_once_taken():
+    lanes = PriorityLanes((4, 4, 4))
+    lanes.put(2, "speed 1", key="Speed")
+    assert lanes.get() == "speed 1"
+    lanes.put(2, "speed 2", key="Speed")
+    assert lanes.coalesced == [0, 0, 0]
+    assert drain(lanes) == ["speed 2"]
+
+def test_full_lane_drops_its_oldest():
+    lanes = PriorityLanes((2, 2, 2))
+    lanes.put(1, "a", key="A")
+    lanes.put(1, "b")
+    assert lanes.put(1, "c") == "a"
+    assert lanes.dropped == [0, 1, 0]
+    # The dropped frame's key no longer coalesces
+    lanes.put(1, "a2", key="A")
+    assert drain(lanes) == ["c", "a2"]
+
+def test_full_lane_leaves_other_lanes_alone():
+    lanes = PriorityLanes((1, 1, 1))
+    lanes.put(0, "stop")
+    lanes.put(2, "pd1")
+    assert lanes.put(2, "pd2") == "pd1"
+    assert drain(lanes) == ["stop", "pd2"]
@@ -0,0 +1,69 @@
+# tests/test_registry.py
+"""NodeRegistry lookups and frame dispatch through it."""
+
+import queue
+from types import SimpleNamespace
+import simulation
+from messages import SetTargetSpeed
+from mvb_codec import node_id
+from registry import NodeRegistry
+
+class Node:
+    def __init__(self, name):
+        self.name = name
+        self.received = []
+
+    def receive_message(self, message):
+        self.received.append(message)
+
+def test_lookup_by_name_and_address():
+    speed, generated = Node("Speed"), Node("Node7")
+    registry = NodeRegistry([speed, generated])
+
+    assert registry["Speed"] is speed
+    assert registry.get_by_address(node_id("Speed")) is speed
+    assert registry.get_by_address(node_id("Node7")) is generated
+    assert list(registry) == [speed, generated]
+    assert "Visitor" not in registry and registry.get("Visitor") is None
+
+def test_reregistering_a_name_replaces_its_entry():
+    old, new = Node("Speed"), Node("Speed")
+    registry = NodeRegistry([old])
+    registry["Speed"] = new
+
+    assert registry["Speed"] is new
+    assert registry.get_by_address(node_id("Speed")) is new
+    assert len(registry) == 1
+
+def test_remove_only_the_entry_still_registered():
+    old, new = Node("Speed"), Node("Speed")
+    registry = NodeRegistry([old])
+    registry["Speed"] = new
+    registry.remove("Speed", old)  # A stale connection closing must not evict its replacement
+    assert registry["Speed"] is new
+
+    registry.remove("Speed", new)
+    assert "Speed" not in registry
+    assert registry.get_by_address(node_id("Speed")) is None
+
+def test_remove_keeps_an_address_taken_over_by_another_name():
+    first, second = Node("Speed"), Node("Tachometer")
+    registry = NodeRegistry([first])
+    registry.add("Tachometer", second, address=node_id("Speed"))
+    registry.remove("Speed")
+    assert registry.get_by_address(node_id("Speed")) is second
+
+def test_process_network_messages_dispatches_by_real_target():
+    nodes = NodeRegistry(Node(f"Node{i}") for i in range(64))
+    bus = SimpleNamespace(received_messages=queue.Queue())
+    for i in (5, 63, 5):
+        bus.received_messages.put({"sender": "Control", "target": "SimulationBus", "real_target": f"Node{i}",
+                                   "message": f"Set Target Speed:{i}"})
+    bus.received_messages.put({"sender": "Control", "target": "SimulationBus", "real_target": "Visitor",
+                               "message": "Set Target Speed:1"})
+
+    simulation.process_network_messages(bus, nodes)
+
+    assert nodes["Node5"].received == [SetTargetSpeed(5.0), SetTargetSpeed(5.0)]
+    assert nodes["Node63"].received == [SetTargetSpeed(63.0)]
+    assert sum(len(node.received) for node in nodes) == 3
@@ -0,0 +1,38 @@
+# tests/test_replay.py
+"""Recording a headless run and replaying it from the log."""
+
+import pytest
+import simulation
+from replay import Recorder, read_log
+
+SCRIPT = [(1.0, "Release Brakes"), (2.0, "Close Doors"), (7.0, "Start Moving")]
+
+def record(path, **options):
+    metadata = {"mode": "headless", "seed": 7, "dt": 1/60, "duration": 90.0,
+                "bus_master": options.get("use_bus_master", False), "track": None, "event_driven": False,
+                "instrument": options.get("instrument", False)}
+    with Recorder(path, metadata) as recorder:
+        train, _, _ = simulation.run_headless(90.0, 1/60, SCRIPT, seed=7, recorder=recorder, **options)
+    return train
+
+@pytest.mark.parametrize("use_bus_master", [False, True])
+def test_replay_matches_recording(tmp_path, use_bus_master):
+    path = tmp_path / "run.log"
+    recorded = record(path, use_bus_master=use_bus_master)
+    metadata, buttons, frames = read_log(path)
+
+    assert metadata["seed"] == 7
+    assert buttons == SCRIPT
+    assert frames
+    train, _, matched = simulation.replay_log(path)
+    assert matched is True
+    assert train.distance_traveled == recorded.distance_traveled
+
+def test_instrumented_run_replays(tmp_path):
+    path = tmp_path / "run.log"
+    record(path, instrument=True)
+    _, _, frames = read_log(path)
+
+    assert any("stamps" in frame for _, frame in frames)
+    _, _, matched = simulation.replay_log(path)
+    assert matched is True
@@ -0,0 +1,77 @@
+# tests/test_sharded_server.py
+"""Starting and stopping the multi-process sharded server."""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(not os.path.isdir("/proc"), reason="reads child processes from /proc")
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("localhost", 0))
+        return probe.getsockname()[1]
+
+def children(pid):
+    """Returns the pids whose parent is pid."""
+    found = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+                found.append(int(entry))
+    return found
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+def accepting(port):
+    try:
+        socket.create_connection(("localhost", port), timeout=0.2).close()
+    except OSError:
+        return False
+    return True
+
+@pytest.mark.parametrize("stop_signal", [signal.SIGTERM, signal.SIGINT])
+def test_stopping_sharded_server_leaves_nothing_behind(tmp_path, stop_signal):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "mvb_server.py"), "--port", str(port),
+                               "--workers", "2", "--log-level", "OFF"],
+                              env={**os.environ, "TMPDIR": str(tmp_path)},
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        assert wait_for(lambda: accepting(port) and len(children(server.pid)) >= 2)
+        shards = children(server.pid)
+        assert list(tmp_path.glob("mvb_shards_*"))
+
+        server.send_signal(stop_signal)
+        assert server.wait(timeout=10) is not None
+        assert wait_for(lambda: not any(alive(pid) for pid in shards))
+        assert not list(tmp_path.glob("mvb_shards_*"))
+        assert not accepting(port)
+    finally:
+        if server.poll() is None:
+            server.kill()
+            server.wait()
@@ -0,0 +1,64 @@
+# tests/test_shm_transport.py
+"""Shared-memory rings: ownership and the resource tracker."""
+
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(code):
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+
+def test_attach_in_owner_process_keeps_owner_registration():
+    name = f"mvb_test{os.getpid()}_Same"
+    result = run(f"from shm_transport import RingBuffer\n"
+                 f"owner = RingBuffer({name!r}, create=True)\n"
+                 f"RingBuffer({name!r}).close()\n"
+                 f"owner.close()\n")
+    assert result.returncode == 0, result.stderr
+    assert "KeyError" not in result.stderr
+    assert "leaked" not in result.stderr
+
+def test_attacher_exit_leaves_segment_in_place():
+    from shm_transport import RingBuffer
+    name = f"mvb_test{os.getpid()}_Other"
+    owner = RingBuffer(name, create=True)
+    try:
+        result = run(f"from shm_transport import RingBuffer\n"
+                     f"ring = RingBuffer({name!r})\n"
+                     f"ring.put(0.0, 0, b'frame')\n"
+                     f"ring.close()\n")
+        assert result.returncode == 0, result.stderr
+        assert [frame for _, _, frame in owner.drain()] == [b"frame"]
+    finally:
+        owner.close()
+
+def test_second_owner_of_a_live_ring_fails_without_resetting_it():
+    from shm_transport import RingBuffer
+    name = f"mvb_test{os.getpid()}_Twice"
+    owner = RingBuffer(name, create=True)
+    try:
+        owner.put(0.0, 0, b"queued")
+        with pytest.raises(FileExistsError):
+            RingBuffer(name, create=True)
+        assert [frame for _, _, frame in owner.drain()] == [b"queued"]
+    finally:
+        owner.close()
+    RingBuffer(name, create=True).close()  # Free again once the owner has gone
+
+def test_ring_left_by_a_crashed_owner_is_taken_over():
+    name = f"mvb_test{os.getpid()}_Crashed"
+    result = run(f"import os\n"
+                 f"from shm_transport import RingBuffer\n"
+                 f"ring = RingBuffer({name!r}, create=True)\n"
+                 f"ring.put(0.0, 0, b'stale')\n"
+                 f"os._exit(0)\n")
+    assert result.returncode == 0, result.stderr
+    from shm_transport import RingBuffer
+    ring = RingBuffer(name, create=True)
+    try:
+        assert list(ring.drain()) == []
+    finally:
+        ring.close()
@@ -0,0 +1,77 @@
+# tests/test_telemetry.py
+"""Writing telemetry in small chunks and reading it back."""
+
+import numpy as np
+import pytest
+import simulation
+from replay import MemoryRecorder
+from telemetry import TelemetryRecorder, TelemetryReader, JSON_PAYLOAD, NO_NODE
+
+SCRIPT = [(1.0, "Release Brakes"), (2.0, "Close Doors"), (7.0, "Start Moving")]
+
+class TickLog:
+    """Telemetry hook keeping the ticks it sees, to compare with what was stored."""
+
+    def __init__(self, telemetry):
+        self.telemetry = telemetry
+        self.ticks = []
+
+    def record_tick(self, record_time, train):
+        self.ticks.append((record_time, train.speed, train.distance_traveled, train.at_station))
+        self.telemetry.record_tick(record_time, train)
+
+    def record_frame(self, record_time, frame):
+        self.telemetry.record_frame(record_time, frame)
+
+def test_headless_run_reads_back_across_chunks(tmp_path):
+    directory = tmp_path / "telemetry"
+    recorder = MemoryRecorder()
+    # Small chunks, so the run spans many column and heap chunk files
+    with TelemetryRecorder(str(directory), {"seed": 3}, chunk_rows=256, heap_chunk_bytes=512) as telemetry:
+        hook = TickLog(telemetry)
+        simulation.run_headless(60.0, 1/60, SCRIPT, seed=3, recorder=recorder, telemetry=hook)
+
+    reader = TelemetryReader(str(directory))
+    assert reader.metadata == {"seed": 3}
+    assert len(reader.ticks) == len(hook.ticks) > 256
+    assert len(reader.ticks.chunks("speed")) > 1
+    times, speeds, distances, at_station = (np.array(column) for column in zip(*hook.ticks))
+    np.testing.assert_array_equal(reader.ticks["time"], times)
+    np.testing.assert_array_equal(reader.ticks["speed"], speeds)
+    np.testing.assert_array_equal(reader.ticks["distance"], distances)
+    np.testing.assert_array_equal(reader.ticks["at_station"], at_station)
+
+    assert len(reader.frames) == len(recorder.frames) > 0
+    assert len(reader.heap.chunks("heap")) > 1
+    for index, (record_time, frame) in enumerate(recorder.frames):
+        assert reader.frames["time"][index] == record_time
+        assert reader.frame(index) == frame
+
+def test_frame_from_node_without_id_is_stored_as_json(tmp_path):
+    directory = str(tmp_path / "telemetry")
+    frame = {"sender": "Visitor", "target": "SimulationBus", "real_target": "Control", "message": "Hello"}
+    with TelemetryRecorder(directory) as telemetry:
+        telemetry.record_frame(0.5, frame)
+
+    reader = TelemetryReader(directory)
+    assert reader.frames["payload_type"][0] == JSON_PAYLOAD
+    assert reader.frames["sender"][0] == NO_NODE
+    assert reader.frame(0) == frame
+
+def test_door_bitmap(tmp_path):
+    class Doors:
+        speed = target_speed = distance_traveled = 0.0
+        brakes_applied = emergency_stop = at_station = False
+        passengers = 0
+        doors = [True, False, True, False]
+
+    directory = str(tmp_path / "telemetry")
+    with TelemetryRecorder(directory) as telemetry:
+        telemetry.record_tick(0.0, Doors)
+    reader = TelemetryReader(directory)
+    assert [bool(reader.door_open(door)[0]) for door in range(4)] == [True, False, True, False]
+
+def test_oversized_payload_is_refused(tmp_path):
+    with TelemetryRecorder(str(tmp_path / "telemetry"), heap_chunk_bytes=16) as telemetry:
+        with pytest.raises(ValueError):
+            telemetry.heap.append(b"x" * 17)
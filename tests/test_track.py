@@ -0,0 +1,37 @@
+# tests/test_track.py
+"""Station lookups on looped and open lines."""
+
+import pytest
+from track import Track, default_track
+
+@pytest.fixture
+def loop():
+    return default_track()  # Stations at 0, 300 and 600 on a 900-long loop
+
+@pytest.fixture
+def line():
+    return Track([("A", 100), ("B", 400), ("C", 700)], 800, loop=False)
+
+@pytest.mark.parametrize("distance, expected", [
+    (0, 0), (100, 100), (250, 50), (450, 150), (880, 20), (900 + 310, 10),
+])
+def test_nearest_station_on_a_loop(loop, distance, expected):
+    assert loop.nearest_station_distance(distance) == pytest.approx(expected)
+
+@pytest.mark.parametrize("distance, expected", [
+    (0, 300), (299, 1), (300, 300), (700, 200), (900 + 10, 290),
+])
+def test_next_station_on_a_loop_is_strictly_ahead(loop, distance, expected):
+    assert loop.distance_to_next_station(distance) == pytest.approx(expected)
+
+@pytest.mark.parametrize("distance, expected", [
+    (0, 100), (300, 100), (790, 90),
+])
+def test_nearest_station_on_an_open_line_does_not_wrap(line, distance, expected):
+    assert line.nearest_station_distance(distance) == pytest.approx(expected)
+
+def test_next_station_on_an_open_line(line):
+    assert line.distance_to_next_station(0) == 100
+    assert line.distance_to_next_station(400) == 300
+    assert line.distance_to_next_station(700) is None
+    assert line.distance_to_next_station(2000) is None  # Clamped to the end of the line
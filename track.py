@@ -0,0 +1,120 @@
+# track.py
+"""Line model: station positions, gradients and speed limits along the track.
+
+Positions are in the same units as Train.distance_traveled. Stations,
+gradient sections and speed-limit sections are kept in sorted position
+lists, so every lookup is a bisect rather than a scan. A looped line wraps
+at its length; an open line ends there.
+
+A line file is JSON:
+
+    {
+        "length": 900,
+        "loop": true,
+        "stations": [{"name": "Station 1", "position": 0}, ...],
+        "gradients": [{"start": 0, "gradient": 0.0}, ...],
+        "speed_limits": [{"start": 0, "limit": 22.22}, ...]
+    }
+
+Gradients are rise over run (positive is uphill) and speed limits are in
+the train's speed units; each section runs until the next one starts.
+"""
+
+import json
+import math
+from bisect import bisect_left, bisect_right
+from constants import STATION_DISTANCE
+
+class Track:
+    """Stations and per-section gradients and speed limits of one line."""
+
+    def __init__(self, stations, length, loop=True, gradients=(), speed_limits=()):
+        stations = sorted(stations, key=lambda station: station[1])
+        if not stations:
+            raise ValueError("A track needs at least one station")
+        self.station_names = [name for name, _ in stations]
+        self.station_positions = [position for _, position in stations]
+        if self.station_positions[0] < 0 or self.station_positions[-1] > length:
+            raise ValueError("Station positions must lie within the track length")
+        self.length = length
+        self.loop = loop
+        gradients = sorted(gradients)
+        self.gradient_starts = [start for start, _ in gradients]
+        self.gradients = [gradient for _, gradient in gradients]
+        speed_limits = sorted(speed_limits)
+        self.limit_starts = [start for start, _ in speed_limits]
+        self.limits = [limit for _, limit in speed_limits]
+
+    def position(self, distance):
+        """Returns where on the line a train that has travelled distance is."""
+        return distance % self.length if self.loop else min(distance, self.length)
+
+    def nearest_station_distance(self, distance):
+        """Returns the distance to the closest station, ahead or behind."""
+        position = self.position(distance)
+        positions = self.station_positions
+        index = bisect_left(positions, position)
+        # The closest station is one of the two neighbours of the insertion point
+        if self.loop:
+            return min(min(abs(position - station), self.length - abs(position - station))
+                       for station in (positions[index % len(positions)], positions[index - 1]))
+        return min(abs(position - station) for station in positions[max(index - 1, 0):index + 1])
+
+    def distance_to_next_station(self, distance):
+        """Returns the distance to the next station strictly ahead, or None at the end of an open line."""
+        position = self.position(distance)
+        index = bisect_right(self.station_positions, position)
+        if index < len(self.station_positions):
+            return self.station_positions[index] - position
+        if self.loop:
+            return (self.station_positions[0] - position) % self.length
+        return None
+
+    def distance_to_next_section(self, distance):
+        """Returns the distance to the next gradient or speed-limit change, or None if there is none ahead."""
+        position = self.position(distance)
+        ahead = []
+        for starts in (self.gradient_starts, self.limit_starts):
+            index = bisect_right(starts, position)
+            if index < len(starts):
+                ahead.append(starts[index] - position)
+            elif starts and self.loop:
+                ahead.append(starts[0] + self.length - position)
+        if self.loop:
+            ahead.append(self.length - position)  # Sections restart at the wrap
+        return min(ahead, default=None)
+
+    def stations_between(self, start, end):
+        """Returns (name, position) for every station with start <= position < end."""
+        first = bisect_left(self.station_positions, start)
+        last = bisect_left(self.station_positions, end)
+        return list(zip(self.station_names[first:last], self.station_positions[first:last]))
+
+    @staticmethod
+    def _section_value(starts, values, position, default):
+        index = bisect_right(starts, position) - 1
+        return values[index] if index >= 0 else default
+
+    def gradient_at(self, distance):
+        """Returns the gradient (rise over run) under a train that has travelled distance."""
+        return self._section_value(self.gradient_starts, self.gradients, self.position(distance), 0.0)
+
+    def speed_limit_at(self, distance):
+        """Returns the speed limit for a train that has travelled distance (inf where unlimited)."""
+        return self._section_value(self.limit_starts, self.limits, self.position(distance), math.inf)
+
+def default_track():
+    """Returns the original three-station loop."""
+    return Track([(f"Station {i + 1}", i * STATION_DISTANCE) for i in range(3)], STATION_DISTANCE * 3)
+
+def load_track(path):
+    """Reads a line file (see the module docstring) into a Track."""
+    with open(path) as f:
+        spec = json.load(f)
+    return Track(
+        [(station.get("name", f"Station {i + 1}"), station["position"]) for i, station in enumerate(spec["stations"])],
+        spec["length"],
+        spec.get("loop", True),
+        [(section["start"], section["gradient"]) for section in spec.get("gradients", [])],
+        [(section["start"], section["limit"]) for section in spec.get("speed_limits", [])]
+    )
@@ -2,13 +2,22 @@
 """Train module managing the state and behavior of the train."""
 
 import random
-import time
-from constants import NUM_DOORS, MAX_PASSENGERS, STATION_DISTANCE
+from constants import NUM_DOORS, MAX_PASSENGERS, DECELERATION
+from sim_clock import WallClock
+from track import default_track
+from log_pipeline import get_logger
+
+log = get_logger("train")
+
+GRAVITY = 9.81  # m/s^2
 
 class Train:
     """Represents the train with its state and movement logic."""
     
-    def __init__(self):
+    def __init__(self, clock=None, rng=None, track=None):
+        self.clock = clock if clock is not None else WallClock()
+        self.rng = rng if rng is not None else random.Random()
+        self.track = track if track is not None else default_track()
         self.speed = 0.0
         self.target_speed = 0.0
         self.brakes_applied = False
@@ -25,7 +34,11 @@ class Train:
 
     def update(self, delta_time):
         """Updates the train's state based on control inputs and physics."""
-        wind_effect = random.uniform(-0.01, 0.01)
+        wind_effect = self.rng.uniform(-0.01, 0.01)
+        # Gravity along the track slows the train uphill and speeds it up downhill
+        gradient_effect = GRAVITY * self.track.gradient_at(self.distance_traveled)
+        speed_limit = self.track.speed_limit_at(self.distance_traveled)
+        target_speed = min(self.target_speed, speed_limit)
         if self.emergency_stop:
             self.speed = max(0, self.speed - 24.0 * delta_time)
             self.target_speed = 0
@@ -36,34 +49,33 @@ class Train:
         elif self.at_station:
             self.speed = 0
             self.target_speed = 0
-        elif self.speed < self.target_speed:
-            self.speed = min(self.target_speed, self.speed + 6.0 * delta_time + wind_effect * delta_time)
+        elif self.speed > speed_limit:
+            self.speed = max(speed_limit, self.speed - DECELERATION * delta_time)
+        elif self.speed < target_speed:
+            self.speed = min(target_speed, self.speed + 6.0 * delta_time + wind_effect * delta_time
+                             - gradient_effect * delta_time)
         else:
-            self.speed = max(0, self.speed - 0.01 * delta_time + wind_effect * delta_time)
+            self.speed = max(0, self.speed - 0.01 * delta_time + wind_effect * delta_time
+                             - gradient_effect * delta_time)
 
         self.distance_traveled += self.speed * delta_time
-        total_loop = STATION_DISTANCE * 3
-        current_pos = self.distance_traveled % total_loop
-        station_positions = [0, STATION_DISTANCE, STATION_DISTANCE * 2]
-
-        nearest_station = min(station_positions, key=lambda s: min(abs(current_pos - s), total_loop - abs(current_pos - s)))
-        nearest_distance = min(abs(current_pos - nearest_station), total_loop - abs(current_pos - nearest_station))
+        nearest_distance = self.track.nearest_station_distance(self.distance_traveled)
 
-        if self.leaving_station and time.time() - self.leaving_station_time >= self.LEAVING_COOLDOWN:
+        if self.leaving_station and self.clock.now() - self.leaving_station_time >= self.LEAVING_COOLDOWN:
             self.leaving_station = False
-            print("[Train] No longer in leaving_station state")
+            log.debug("[Train] No longer in leaving_station state")
 
         if self.at_station and self.speed > 0.1:
             self.at_station = False
             self.leaving_station = True
-            self.leaving_station_time = time.time()
+            self.leaving_station_time = self.clock.now()
             self.station_stop_time = None
-            print("[Train] Leaving station, setting cooldown")
+            log.info("[Train] Leaving station, setting cooldown")
 
         if nearest_distance < 50 and self.speed < 0.1 and not self.leaving_station:
             if self.station_stop_time is None:
-                self.station_stop_time = time.time()
-            if time.time() - self.station_stop_time >= self.DWELL_TIME:
+                self.station_stop_time = self.clock.now()
+            if self.clock.now() - self.station_stop_time >= self.DWELL_TIME:
                 self.at_station = True
                 self.target_speed = 0
         elif nearest_distance > 50 and not self.leaving_station: